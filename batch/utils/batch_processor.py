@@ -2,7 +2,8 @@ import os
 import gc
 from batch.utils.settings_check import check_settings
 from batch.utils.video_processor import process_video
-from core.utils.config_utils import load_key, update_key
+from core.utils.config_utils import config_overlay
+from core.utils.local_llm_server import llm_server_session
 import pandas as pd
 from rich.console import Console
 from rich.panel import Panel
@@ -11,28 +12,29 @@ import shutil
 
 console = Console()
 
-def record_and_update_config(source_language, target_language, enable_audio_trim=None):
-    original_source_lang = load_key('whisper.language')
-    original_target_lang = load_key('target_language')
-    try:
-        original_audio_trim = load_key('enable_audio_trim')
-    except KeyError:
-        original_audio_trim = None
-    
+def build_task_config(source_language, target_language, enable_audio_trim=None):
+    """Collect per-task config overrides, applied in memory through `config_overlay`."""
+    overrides = {}
     if source_language and not pd.isna(source_language):
-        update_key('whisper.language', source_language)
+        overrides['whisper.language'] = source_language
     if target_language and not pd.isna(target_language):
-        update_key('target_language', target_language)
-    if enable_audio_trim is not None and original_audio_trim is not None:
-        update_key('enable_audio_trim', bool(enable_audio_trim))
-    
-    return original_source_lang, original_target_lang, original_audio_trim
+        overrides['target_language'] = target_language
+    if enable_audio_trim is not None:
+        overrides['enable_audio_trim'] = bool(enable_audio_trim)
+    return overrides
 
 def process_batch():
     if not check_settings():
         raise Exception("Settings check failed")
 
     df = pd.read_excel('batch/tasks_setting.xlsx')
+    with llm_server_session("batch"):
+        _process_rows(df)
+
+    console.print(Panel("All tasks processed!\nCheck out in `batch/output`!", 
+                       title="[bold green]Batch Processing Complete", expand=False))
+
+def _process_rows(df):
     for index, row in df.iterrows():
         if pd.isna(row['Status']) or 'Error' in str(row['Status']):
             total_tasks = len(df)
@@ -73,30 +75,17 @@ def process_batch():
             source_language = row['Source Language']
             target_language = row['Target Language']
             
-            original_source_lang = None
-            original_target_lang = None
-            original_audio_trim = None
             try:
                 dubbing = 0 if pd.isna(row['Dubbing']) else int(row['Dubbing'])
                 is_retry = not pd.isna(row['Status']) and 'Error' in str(row['Status'])
-                original_source_lang, original_target_lang, original_audio_trim = record_and_update_config(
-                    source_language,
-                    target_language,
-                    enable_audio_trim=bool(dubbing),
-                )
-                status, error_step, error_message = process_video(video_file, dubbing, is_retry)
+                task_config = build_task_config(source_language, target_language, enable_audio_trim=bool(dubbing))
+                with config_overlay(task_config):
+                    status, error_step, error_message = process_video(video_file, dubbing, is_retry)
                 status_msg = "Done" if status else f"Error: {error_step} - {error_message}"
             except Exception as e:
                 status_msg = f"Error: Unhandled exception - {str(e)}"
                 console.print(f"[bold red]Error processing {video_file}: {status_msg}")
             finally:
-                if original_source_lang is not None:
-                    update_key('whisper.language', original_source_lang)
-                if original_target_lang is not None:
-                    update_key('target_language', original_target_lang)
-                if original_audio_trim is not None:
-                    update_key('enable_audio_trim', original_audio_trim)
-                
                 df.at[index, 'Status'] = status_msg
                 df.to_excel('batch/tasks_setting.xlsx', index=False)
                 
@@ -106,8 +95,5 @@ def process_batch():
         else:
             print(f"Skipping task: {row['Video File']} - Status: {row['Status']}")
 
-    console.print(Panel("All tasks processed!\nCheck out in `batch/output`!", 
-                       title="[bold green]Batch Processing Complete", expand=False))
-
 if __name__ == "__main__":
     process_batch()
@@ -1,12 +1,14 @@
 import os
 import gc
 import shutil
+from contextlib import ExitStack
 from functools import partial
 
 from rich.console import Console
 from rich.panel import Panel
 
 from core.utils import load_key
+from core.utils.local_llm_server import llm_server_session
 from core.utils.onekeycleanup import cleanup
 
 console = Console()
@@ -74,8 +76,17 @@ def process_video(file, dubbing=False, is_retry=False):
         text_steps.extend(dubbing_steps)
     
     current_step = ""
+    llm_session, held = ExitStack(), False
     for step_name, step_func in text_steps:
         current_step = step_name
+        # one warm local LLM server for the consecutive LLM steps, released before whisper / TTS need the GPU
+        if step_func in LLM_STEPS:
+            if not held:
+                llm_session.enter_context(llm_server_session("video"))
+                held = True
+        elif held:
+            llm_session.close()
+            held = False
         for attempt in range(3):
             try:
                 console.print(Panel(
@@ -95,6 +106,7 @@ def process_video(file, dubbing=False, is_retry=False):
                         border_style="red"
                     )
                     console.print(error_panel)
+                    llm_session.close()
                     cleanup(ERROR_OUTPUT_DIR)
                     return False, current_step, str(e)
                 console.print(Panel(
@@ -102,6 +114,7 @@ def process_video(file, dubbing=False, is_retry=False):
                     border_style="yellow"
                 ))
     
+    llm_session.close()
     console.print(Panel("[bold green]All steps completed successfully! 🎉[/]", border_style="green"))
     cleanup(SAVE_DIR)
     return True, "", ""
@@ -146,3 +159,5 @@ def gen_audio_tasks():
     from core import _8_2_dub_chunks
     _8_1_audio_task.gen_audio_task_main()
     _8_2_dub_chunks.gen_dub_chunks()
+
+LLM_STEPS = (split_sentences, summarize_and_translate, process_and_align_subtitles)
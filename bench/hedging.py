@@ -0,0 +1,59 @@
+import random
+import tempfile
+import time
+
+from rich import print as rprint
+
+from bench.llm_stub import StubServer
+from core.utils import gpt_cache
+from core.utils.ask_gpt import ask_gpt_async
+from core.utils.config_utils import config_overlay
+from core.utils.llm_engine import llm_map
+from core.utils.llm_metrics import LLM_METRICS, _percentile
+
+# ------------
+# wall time and tail latency with and without hedging, against a local stub server
+# ------------
+
+def _tail_responder(slow_share, slow_seconds):
+    def responder(prompt):
+        # a few requests get stuck behind a busy replica, the rest answer quickly
+        if random.random() < slow_share:
+            time.sleep(slow_seconds)
+        return '```json\n{"result": "ok"}\n```'
+    return responder
+
+def benchmark_hedging(total=200, slow_share=0.03, slow_seconds=5.0, base_latency=0.1):
+    """Wall time and p99 of a stage with a heavy latency tail, without and with hedging."""
+    rows = {}
+    with StubServer(responder=_tail_responder(slow_share, slow_seconds), base_latency=base_latency) as stub, \
+            tempfile.TemporaryDirectory() as tmp:
+        gpt_cache._CACHE = gpt_cache.GPTCache(f"{tmp}/cache.db")
+        for enabled in (False, True):
+            overrides = {"api.base_url": stub.base_url, "api.key": "stub", "api.endpoints": [], "max_workers": 16,
+                         "llm_concurrency.mode": "fixed", "llm_hedge.enabled": enabled, "llm_hedge.min_delay": 0.2}
+
+            async def one(i):
+                started = time.monotonic()
+                await ask_gpt_async(f"hedge={enabled} line {i}", resp_type='json', log_title='bench_hedge')
+                return time.monotonic() - started
+
+            with config_overlay(overrides):
+                LLM_METRICS.reset()
+                start = time.monotonic()
+                latencies = llm_map(one, range(total))
+                elapsed = time.monotonic() - start
+                stage = LLM_METRICS.snapshot()["bench_hedge"]
+            rows["hedged" if enabled else "plain"] = {
+                "seconds": elapsed, "p50": _percentile(latencies, 0.5), "p99": _percentile(latencies, 0.99),
+                "requests_sent": stub.requests, "hedges": stage["hedges"], "hedge_wins": stage["hedge_wins"],
+            }
+            stub.requests = 0
+        gpt_cache._CACHE.close()
+        gpt_cache._CACHE = None
+    return rows
+
+if __name__ == '__main__':
+    for label, row in benchmark_hedging().items():
+        rprint(f"{label}: {row['seconds']:.1f}s wall, p50 {row['p50']:.2f}s, p99 {row['p99']:.2f}s, "
+               f"{row['requests_sent']} requests sent, {row['hedges']} hedged ({row['hedge_wins']} won)")
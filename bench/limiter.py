@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from rich import print as rprint
+
+from bench.llm_stub import StubServer
+from core.utils.llm_concurrency import AIMDLimiter, limiter_slot
+
+# ------------
+# fixed vs adaptive concurrency against a local stub server
+# ------------
+
+async def _drive(url, limiter, total):
+    import httpx
+    errors = 0
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=limiter.maximum), timeout=60) as client:
+        async def one():
+            nonlocal errors
+            for _ in range(8):
+                try:
+                    async with limiter_slot(limiter):
+                        resp = await client.post(url, content=b"{}")
+                        resp.raise_for_status()
+                    return
+                except Exception:
+                    errors += 1
+                    await asyncio.sleep(0.05)
+
+        start = time.monotonic()
+        await asyncio.gather(*[one() for _ in range(total)])
+        return total / (time.monotonic() - start), errors
+
+def benchmark_limiter(fixed=1, capacity=8, base_latency=0.05, total=400, maximum=64):
+    """Stub slows down past `capacity` overlapping requests and answers 429 past 2x capacity."""
+    with StubServer(base_latency=base_latency, capacity=capacity, reject_over=capacity * 2) as stub:
+        url = f"{stub.base_url}/chat/completions"
+        fixed_rps, fixed_errors = asyncio.run(_drive(url, AIMDLimiter(fixed, fixed, fixed, adaptive=False, name="fixed"), total))
+        adaptive = AIMDLimiter(fixed, 1, maximum, name="adaptive")
+        adaptive_rps, adaptive_errors = asyncio.run(_drive(url, adaptive, total))
+    return {
+        "fixed": {"level": fixed, "rps": fixed_rps, "errors": fixed_errors},
+        "adaptive": {"final_level": adaptive.level, "rps": adaptive_rps, "errors": adaptive_errors},
+    }
+
+if __name__ == '__main__':
+    result = benchmark_limiter()
+    rprint(f"fixed x{result['fixed']['level']}: {result['fixed']['rps']:.1f} req/s, {result['fixed']['errors']} errors")
+    rprint(f"adaptive (settled at {result['adaptive']['final_level']}): {result['adaptive']['rps']:.1f} req/s, "
+           f"{result['adaptive']['errors']} errors")
@@ -0,0 +1,110 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ------------
+# OpenAI-compatible stub server for local benchmarks
+# ------------
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    # a burst of concurrent benchmark requests overflows the default listen backlog of 5
+    request_queue_size = 1024
+
+class StubServer:
+    """Minimal `/v1/chat/completions` + `/v1/models` server running in a background thread.
+
+    `responder(prompt)` returns the answer text (default: an empty JSON object), with
+    `with_request=True` it is called as `responder(prompt, request)` with the decoded body. Latency is
+    `base_latency + per_token_latency * (prompt + answer chars / 4)`, stretched by the
+    overlap factor once more than `capacity` requests run at once; past `reject_over`
+    concurrent requests the server answers 429.
+    """
+
+    def __init__(self, responder=None, base_latency=0.05, per_token_latency=0.0, capacity=None, reject_over=None, with_request=False):
+        self.responder = responder or (lambda prompt: '```json\n{}\n```')
+        self.with_request = with_request
+        self.base_latency = base_latency
+        self.per_token_latency = per_token_latency
+        self.capacity = capacity
+        self.reject_over = reject_over
+        self.requests = 0
+        self.prompt_chars = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def _handle(self, body):
+        with self._lock:
+            self.active += 1
+            self.requests += 1
+            active = self.active
+        try:
+            if self.reject_over and active > self.reject_over:
+                return 429, {"error": {"message": "server busy"}}
+            request = json.loads(body or b"{}")
+            prompt = ''.join(str(m.get("content", "")) for m in request.get("messages", []))
+            with self._lock:
+                self.prompt_chars += len(prompt)
+            content = self.responder(prompt, request) if self.with_request else self.responder(prompt)
+            tokens = (len(prompt) + len(content)) / 4
+            stretch = max(1.0, active / self.capacity) if self.capacity else 1.0
+            time.sleep((self.base_latency + self.per_token_latency * tokens) * stretch)
+            return 200, {
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": tokens},
+            }
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._reply(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    self._reply(*stub._handle(body))
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up on this request (timeout, cancelled hedge)
+                    pass
+
+        self._server = _StubHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
@@ -0,0 +1,46 @@
+import threading
+import time
+
+from rich import print as rprint
+
+from core.utils.config_utils import ConfigSnapshot, _read_config, load_key, lock
+
+# ------------
+# load_key calls per second, parsing config.yaml every call vs the cached snapshot
+# ------------
+
+def _load_key_uncached(key):
+    """The previous implementation: parse config.yaml under the global lock on every call."""
+    with lock:
+        data = _read_config()
+    return ConfigSnapshot(data, None).get(key)
+
+def benchmark_load_key(keys=("api.model", "max_workers", "whisper.language", "target_language"), seconds=2.0, threads=1):
+    def calls_per_second(func):
+        counts = [0] * threads
+        deadline = time.perf_counter() + seconds
+
+        def worker(slot):
+            n = 0
+            while time.perf_counter() < deadline:
+                for key in keys:
+                    func(key)
+                n += len(keys)
+            counts[slot] = n
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return sum(counts) / seconds
+
+    before = calls_per_second(_load_key_uncached)
+    after = calls_per_second(load_key)
+    return {"threads": threads, "before": before, "after": after, "speedup": after / before if before else float('inf')}
+
+if __name__ == "__main__":
+    for n_threads in (1, 4):
+        result = benchmark_load_key(threads=n_threads)
+        rprint(f"load_key x{n_threads} threads: before {result['before']:.0f} calls/s, "
+               f"after {result['after']:.0f} calls/s ({result['speedup']:.0f}x)")
@@ -0,0 +1,75 @@
+import sys
+import time
+
+from rich import print as rprint
+
+from core.utils.ask_gpt import ask_gpt_async
+from core.utils.config_utils import config_overlay, load_key
+from core.utils.llm_engine import llm_map
+from core.utils.llm_metrics import LLM_METRICS
+from core.utils.local_llm_server import local_llm_server
+
+# ------------
+# serial llama_cpp.server vs llama-server slots, through the managed server
+# ------------
+
+def _benchmark_prompts(total):
+    lines = ["Well, I think we should head back before it gets dark.", "The market opens at six, so let's meet there.",
+             "Did you remember to bring the map this time?", "Honestly, that was the best ramen I've had in years."]
+    return [f"Translate into {load_key('target_language')}, answer with the translation only:\n"
+            + '\n'.join(f"{i}. {line}" for line in lines) for i in range(total)]
+
+def _benchmark_run(label, overrides, prompts):
+    """Start the managed server under `overrides`, send every prompt uncached; (seconds, completion tokens)."""
+    async def _translate(prompt):
+        return await ask_gpt_async(prompt, log_title="bench_local", use_cache=False)
+
+    with config_overlay(overrides), local_llm_server(f"benchmark ({label})"):
+        LLM_METRICS.reset()
+        start = time.monotonic()
+        llm_map(_translate, prompts)
+        elapsed = time.monotonic() - start
+        tokens = LLM_METRICS.snapshot().get("bench_local", {}).get("completion_tokens", 0)
+    return elapsed, tokens
+
+def benchmark_parallel_slots(total=16, n_parallel=4):
+    """Translate-sized prompts through the managed server: serial llama_cpp.server vs llama-server with slots.
+
+    Returns (mode, seconds, requests/s, completion tokens/s) rows. Both runs start their own server and
+    bypass the response cache, so expect one model load per mode on top of the timings.
+    """
+    prompts = _benchmark_prompts(total)
+    modes = [
+        ("serial", {"local_llm.backend": "llama_cpp_python", "max_workers": 1, "llm_concurrency.mode": "fixed"}),
+        (f"{n_parallel} slots", {"local_llm.backend": "llama_server", "local_llm.n_parallel": n_parallel,
+                                 "llm_concurrency.mode": "fixed"}),
+    ]
+    rows = []
+    for mode, overrides in modes:
+        elapsed, tokens = _benchmark_run(mode, overrides, prompts)
+        rows.append((mode, elapsed, total / elapsed, tokens / elapsed))
+    return rows
+
+# ------------
+# scaling of the llama-cpp-python process pool
+# ------------
+
+def benchmark_instances(counts=(1, 2, 4), total=32):
+    """Scaling of the process pool: completion tokens/s per instance count, and the efficiency
+    tokens/s(n) / (n * tokens/s(1)). Returns (instances, seconds, tokens/s, efficiency) rows."""
+    prompts = _benchmark_prompts(total)
+    rows, single = [], None
+    for count in counts:
+        elapsed, tokens = _benchmark_run(f"{count} instances", {"local_llm.instances": count, "llm_concurrency.mode": "fixed"}, prompts)
+        tokens_per_s = tokens / elapsed
+        single = single or tokens_per_s / count
+        rows.append((count, elapsed, tokens_per_s, tokens_per_s / (count * single)))
+    return rows
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "instances":
+        for count, elapsed, tokens_per_s, efficiency in benchmark_instances():
+            rprint(f"{count:>2} instances: {elapsed:6.1f}s, {tokens_per_s:6.1f} completion tokens/s, {efficiency:.0%} scaling efficiency")
+    else:
+        for mode, elapsed, requests_per_s, tokens_per_s in benchmark_parallel_slots():
+            rprint(f"{mode:>10}: {elapsed:6.1f}s, {requests_per_s:5.2f} requests/s, {tokens_per_s:6.1f} completion tokens/s")
@@ -0,0 +1,60 @@
+import json
+import re
+import tempfile
+import time
+
+from rich import print as rprint
+
+from bench.llm_stub import StubServer
+from core.utils import gpt_cache
+from core.utils.ask_gpt import ask_gpt_async
+from core.utils.config_utils import config_overlay
+from core.utils.llm_engine import run_sync
+from core.utils.llm_pack import pack_requests
+
+# ------------
+# items/s and prompt chars per pack size against a local stub server
+# ------------
+
+def _stub_responder(prompt):
+    ids = re.findall(r'<item id="(\d+)">', prompt)
+    return '```json\n' + json.dumps({i: {"result": "ok"} for i in ids}) + '\n```'
+
+def benchmark_packing(total=200, pack_sizes=(1, 4, 8, 16), base_latency=0.3, instruction_chars=2000):
+    """Round trips dominate small prompts: compare items/s and prompt chars sent for several pack sizes."""
+    instructions = "## Role\n" + "Follow the subtitle rules carefully. " * (instruction_chars // 37)
+
+    def build_prompt(pack):
+        body = '\n'.join(f'<item id="{i}">{text}</item>' for i, text in enumerate(pack, 1))
+        return f"{instructions}\n{body}"
+
+    def valid_item(answer):
+        return {"status": "success" if "result" in answer else "error", "message": ""}
+
+    rows = []
+    with StubServer(responder=_stub_responder, base_latency=base_latency, per_token_latency=0.0005) as stub:
+        overrides = {"api.base_url": stub.base_url, "api.key": "stub", "max_workers": 8, "llm_concurrency.mode": "fixed"}
+        with tempfile.TemporaryDirectory() as tmp, config_overlay(overrides):
+            gpt_cache._CACHE = gpt_cache.GPTCache(f"{tmp}/cache.db")
+            for pack_size in pack_sizes:
+                items = [f"run{pack_size} subtitle line {i}" for i in range(total)]
+                requests_before, chars_before = stub.requests, stub.prompt_chars
+
+                async def single(text):
+                    response_data = await ask_gpt_async(build_prompt([text]), resp_type='json', log_title='bench_single')
+                    return response_data["1"]
+
+                async def run_all():
+                    return await pack_requests(items, build_prompt, valid_item, 'bench', single, pack_size=pack_size)
+
+                start = time.monotonic()
+                run_sync(run_all())
+                elapsed = time.monotonic() - start
+                rows.append((pack_size, total / elapsed, stub.requests - requests_before, stub.prompt_chars - chars_before))
+            gpt_cache._CACHE.close()
+            gpt_cache._CACHE = None
+    return rows
+
+if __name__ == '__main__':
+    for pack_size, items_per_s, requests, prompt_chars in benchmark_packing():
+        rprint(f"pack_size={pack_size:>2}: {items_per_s:7.1f} items/s, {requests:4d} requests, {prompt_chars:8d} prompt chars")
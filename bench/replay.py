@@ -0,0 +1,280 @@
+import argparse
+import heapq
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
+import requests
+from rich import print as rprint
+from rich.console import Console
+from rich.table import Table
+
+from core.utils.config_utils import config_overlay, load_key
+from core.utils.gpt_cache import CACHE_DB
+from core.utils.llm_client import normalize_base_url
+from core.utils.llm_engine import _inflight_limit, estimate_tokens, llm_map
+
+TRANSLATE_TITLES = ("translate_faithfulness", "translate_expressiveness")
+
+# ------------
+# recorded prompts
+# ------------
+
+def load_recorded_prompts(db_path=CACHE_DB, titles=None, limit=None):
+    """(log_title, prompt, resp_type) of a finished run in the order they were first asked."""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"{db_path} not found, run the pipeline once before benchmarking")
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT log_title, prompt, resp_type FROM responses ORDER BY created_at").fetchall()
+    finally:
+        conn.close()
+    rows = [row for row in rows if titles is None or row[0] in titles]
+    if not rows:
+        raise ValueError(f"{db_path} has no cached responses for {', '.join(titles or ['any stage'])}")
+    return rows[:limit] if limit else rows
+
+# ------------
+# prompt prefix reuse on the server
+# ------------
+
+def prompt_eval_counts(payload):
+    """(prompt tokens, tokens reused from the KV cache, prompt eval ms) reported by one completion response.
+
+    OpenAI-style servers report `usage.prompt_tokens_details.cached_tokens`, llama-server `timings.cache_n`
+    or only `timings.prompt_n`, the tokens it actually evaluated. Unknown values are None.
+    """
+    usage = payload.get("usage") or {}
+    timings = payload.get("timings") or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached is None:
+        cached = timings.get("cache_n")
+    if cached is None and prompt_tokens is not None and timings.get("prompt_n") is not None:
+        cached = max(prompt_tokens - timings["prompt_n"], 0)
+    if prompt_tokens is None and timings.get("prompt_n") is not None:
+        prompt_tokens = timings["prompt_n"] + (cached or 0)
+    return prompt_tokens, cached, timings.get("prompt_ms")
+
+def replay_prefix(prompts, cache_prompt, base_url=None):
+    """Send `prompts` one after another, as a single slot sees them, and sum what the server reports."""
+    base_url = normalize_base_url(base_url or load_key("api.base_url"))
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {load_key('api.key')}"
+    totals = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "prompt_ms": 0.0, "seconds": 0.0, "reported": True}
+    for _, prompt, _ in prompts:
+        # one answer token is enough, only the prompt evaluation is measured
+        body = {"model": load_key("api.model"), "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": 1, "cache_prompt": cache_prompt}
+        started = time.monotonic()
+        response = session.post(f"{base_url}/chat/completions", json=body, timeout=300)
+        response.raise_for_status()
+        totals["seconds"] += time.monotonic() - started
+        prompt_tokens, cached, prompt_ms = prompt_eval_counts(response.json())
+        totals["requests"] += 1
+        totals["prompt_tokens"] += prompt_tokens or 0
+        totals["cached_tokens"] += cached or 0
+        totals["prompt_ms"] += prompt_ms or 0.0
+        totals["reported"] = totals["reported"] and cached is not None
+    return totals
+
+def bench_prefix(prompts):
+    rows = {}
+    for cache_prompt in (False, True):
+        rows["cache_prompt" if cache_prompt else "no cache"] = replay_prefix(prompts, cache_prompt)
+    table = Table(title="♻️ Prompt prefix reuse")
+    for column in ("Mode", "Requests", "Prompt tokens", "Reused", "Prompt eval ms", "Wall s"):
+        table.add_column(column, justify="left" if column == "Mode" else "right")
+    for mode, row in rows.items():
+        reused = f"{row['cached_tokens']} ({row['cached_tokens'] / row['prompt_tokens']:.0%})" if row["reported"] and row["prompt_tokens"] else "not reported"
+        table.add_row(mode, str(row["requests"]), str(row["prompt_tokens"]), reused, f"{row['prompt_ms']:.0f}", f"{row['seconds']:.1f}")
+    Console().print(table)
+    if not all(row["reported"] for row in rows.values()):
+        rprint("[yellow]The server does not report cached prompt tokens (llama-cpp-python), compare the wall time instead[/yellow]")
+    return rows
+
+# ------------
+# constrained decoding: validation failures with and without the schema
+# ------------
+
+def _missing_key(value, schema, path=""):
+    """First required key (dotted path) absent from `value`, following nested objects and array items."""
+    if schema.get("type") == "object":
+        if not isinstance(value, dict):
+            return path.rstrip(".") or "answer"
+        for key in schema.get("required", []):
+            if key not in value:
+                return f"{path}{key}"
+            missing = _missing_key(value[key], schema["properties"][key], f"{path}{key}.")
+            if missing:
+                return missing
+    elif schema.get("type") == "array" and isinstance(schema.get("items"), dict):
+        if not isinstance(value, list):
+            return path.rstrip(".")
+        for i, item in enumerate(value):
+            missing = _missing_key(item, schema["items"], f"{path}{i}.")
+            if missing:
+                return missing
+    return None
+
+def _shape_validator(schema):
+    # stages whose validator is not importable (summary) or that have none (tts) are held to their schema's keys
+    def valid(response):
+        missing = _missing_key(response, schema)
+        if missing:
+            return {"status": "error", "message": f"Missing `{missing}`"}
+        return {"status": "success", "message": ""}
+    return valid
+
+def stage_contract(log_title, prompt):
+    """(schema, validator) the pipeline sends with a recorded prompt of `log_title`, None for other stages."""
+    from core import prompts
+    if log_title == "split_by_meaning":
+        from core._3_2_split_meaning import valid_split
+        return prompts.get_split_schema(), valid_split
+    if log_title in TRANSLATE_TITLES:
+        from core.translate_lines import valid_translate_result
+        keys = sorted(set(re.findall(r'^\s*"(\d+)": \{', prompt, re.M)), key=int)
+        if log_title == "translate_faithfulness":
+            return prompts.get_faithfulness_schema(len(keys)), lambda r: valid_translate_result(r, keys, ["direct"])
+        return prompts.get_expressiveness_schema(len(keys)), lambda r: valid_translate_result(r, keys, ["free"])
+    if log_title == "align_subs":
+        from core._5_split_sub import valid_align
+        return prompts.get_align_schema(len(set(re.findall(r'"target_part_(\d+)"', prompt)))), valid_align
+    if log_title == "sub_trim":
+        from core._8_1_audio_task import valid_trim
+        return prompts.get_trim_schema(), valid_trim
+    if log_title == "summary":
+        return prompts.get_summary_schema(), _shape_validator(prompts.get_summary_schema())
+    if log_title == "tts_correct_text":
+        return prompts.get_correct_text_schema(), _shape_validator(prompts.get_correct_text_schema())
+    return None
+
+def replay_schema(prompts, mode):
+    """Replay `prompts` with `api.json_schema` = `mode` through the pipeline's own validation and retries.
+
+    Returns per stage the requests sent, answers rejected by validation and prompts that failed every retry.
+    """
+    from core.utils import gpt_cache
+    from core.utils.ask_gpt import ask_gpt_async
+    from core.utils.llm_metrics import LLM_METRICS
+
+    jobs = []
+    for log_title, prompt, _ in prompts:
+        contract = stage_contract(log_title, prompt)
+        if contract:
+            jobs.append((log_title, prompt) + contract)
+
+    async def _replay(job):
+        log_title, prompt, schema, validator = job
+        return await ask_gpt_async(prompt, resp_type='json', valid_def=validator, log_title=f"bench_{log_title}",
+                                   use_cache=False, schema=schema)
+
+    # replayed answers go to a scratch cache, the run's own answers stay as they are
+    cache = gpt_cache._CACHE
+    with tempfile.TemporaryDirectory() as tmp, config_overlay({"api.json_schema": mode}):
+        gpt_cache._CACHE = gpt_cache.GPTCache(os.path.join(tmp, "cache.db"))
+        try:
+            LLM_METRICS.reset()
+            start = time.monotonic()
+            results = llm_map(_replay, jobs, return_exceptions=True)
+            elapsed = time.monotonic() - start
+            stages = LLM_METRICS.snapshot()
+        finally:
+            gpt_cache._CACHE.close()
+            gpt_cache._CACHE = cache
+    rows = {}
+    for job, result in zip(jobs, results):
+        row = rows.setdefault(job[0], {"prompts": 0, "failed": 0})
+        row["prompts"] += 1
+        row["failed"] += isinstance(result, Exception)
+    for log_title, row in rows.items():
+        stage = stages.get(f"bench_{log_title}", {})
+        row.update(requests=stage.get("requests", 0), validation_failures=stage.get("validation_failures", 0),
+                   completion_tokens=stage.get("completion_tokens", 0))
+    return {"seconds": elapsed, "stages": rows}
+
+def bench_schema(prompts):
+    runs = {mode: replay_schema(prompts, mode) for mode in ("off", "on")}
+    table = Table(title="🧩 Constrained decoding")
+    for column in ("Stage", "json_schema", "Prompts", "Requests", "Validation failures", "Failed", "Completion tokens"):
+        table.add_column(column, justify="left" if column == "Stage" else "right")
+    for log_title in sorted(runs["off"]["stages"]):
+        for mode, run in runs.items():
+            row = run["stages"][log_title]
+            table.add_row(log_title, mode, str(row["prompts"]), str(row["requests"]), str(row["validation_failures"]),
+                          str(row["failed"]), str(row["completion_tokens"]))
+    Console().print(table)
+    for mode, run in runs.items():
+        rprint(f"json_schema={mode}: {run['seconds']:.1f}s wall")
+    return runs
+
+# ------------
+# longest-first scheduling: makespan of a recorded run
+# ------------
+
+def simulate_makespan(durations, workers, order=None):
+    """Finish time of `durations` on `workers` slots, each item taking the first free slot in `order`."""
+    slots = [0.0] * max(int(workers), 1)
+    for i in (order if order is not None else range(len(durations))):
+        heapq.heappush(slots, heapq.heappop(slots) + durations[i])
+    return max(slots) if durations else 0.0
+
+def replay_schedule(db_path=CACHE_DB, workers=None, prefill_tps=400.0, decode_tps=25.0):
+    """Replay every stage of a recorded run in recorded order and longest-first.
+
+    A request takes prompt_tokens / prefill_tps + answer_tokens / decode_tps seconds. Longest-first only
+    knows the prompt, as the scheduler does, so the estimate is checked against the real answer lengths.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"{db_path} not found, run the pipeline once before benchmarking")
+    workers = workers or _inflight_limit()
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT log_title, prompt, resp_content FROM responses ORDER BY created_at").fetchall()
+    finally:
+        conn.close()
+    stages = {}
+    for log_title, prompt, resp_content in rows:
+        stages.setdefault(log_title, []).append((estimate_tokens(prompt), estimate_tokens(resp_content or '')))
+    results = {}
+    for log_title, requests in stages.items():
+        durations = [p / prefill_tps + c / decode_tps for p, c in requests]
+        longest_first = sorted(range(len(requests)), key=lambda i: -requests[i][0])
+        results[log_title] = {
+            "requests": len(requests),
+            "recorded_order": simulate_makespan(durations, workers),
+            "longest_first": simulate_makespan(durations, workers, longest_first),
+            "lower_bound": max(sum(durations) / workers, max(durations)),
+        }
+    return results
+
+def bench_schedule(db_path=CACHE_DB, workers=None):
+    results = replay_schedule(db_path, workers)
+    for title, r in results.items():
+        saved = 1 - r["longest_first"] / r["recorded_order"] if r["recorded_order"] else 0.0
+        rprint(f"{title}: {r['requests']} requests, makespan {r['recorded_order']:.0f}s recorded order → "
+               f"{r['longest_first']:.0f}s longest-first ({saved:.0%} shorter, lower bound {r['lower_bound']:.0f}s)")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay prompts of a finished run against the configured LLM server.")
+    parser.add_argument("bench", choices=["prefix", "schema", "schedule"], help="prefix: KV cache reuse of consecutive translation prompts; "
+                        "schema: validation failures and retries without and with the answer schema; "
+                        "schedule: simulated makespan of recorded order vs longest-first, no server needed")
+    parser.add_argument("--db", default=CACHE_DB, help="gpt_log cache of a finished run")
+    parser.add_argument("--limit", type=int, default=40, help="replay at most this many prompts")
+    parser.add_argument("--workers", type=int, default=None, help="schedule: concurrent slots (default: max_workers)")
+    args = parser.parse_args()
+
+    if args.bench == "schedule":
+        bench_schedule(args.db, args.workers)
+    else:
+        from core.utils.local_llm_server import local_llm_server
+        with local_llm_server("bench"):
+            if args.bench == "prefix":
+                bench_prefix(load_recorded_prompts(args.db, TRANSLATE_TITLES, args.limit))
+            else:
+                bench_schema(load_recorded_prompts(args.db, limit=args.limit))
@@ -0,0 +1,64 @@
+import json
+import os
+import random
+import tempfile
+import time
+
+from rich import print as rprint
+
+from core.utils.term_index import load_term_index
+
+# ------------
+# benchmark on a synthetic glossary
+# ------------
+
+def _glossary(size):
+    rng = random.Random(0)
+    syllables = ["ka", "to", "ri", "mu", "ne", "sa", "lo", "vi", "den", "gra", "pho", "tri", "zel", "qua"]
+    srcs = set()
+    while len(srcs) < size:
+        words = [''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 3))]
+        srcs.add(' '.join(words).title())
+    return [{"src": src, "tgt": f"术语{i}", "note": f"glossary entry {i}"} for i, src in enumerate(sorted(srcs))]
+
+def benchmark_term_index(size=10000, chunks=200, lines_per_chunk=8):
+    """Per-chunk lookups against a `size`-term glossary: reparse + substring scan vs the cached automaton."""
+    rng = random.Random(1)
+    terms = _glossary(size)
+    filler = "the speaker then explains how this part of the system works in practice".split()
+    texts = []
+    for _ in range(chunks):
+        lines = [' '.join(rng.choice(filler) for _ in range(10)) + f" {rng.choice(terms)['src']}" for _ in range(lines_per_chunk)]
+        texts.append('\n'.join(lines))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "terminology.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"theme": "", "terms": terms}, f, ensure_ascii=False)
+
+        start = time.perf_counter()
+        naive = []
+        for text in texts:
+            with open(path, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)['terms']
+            naive.append([i for i, term in enumerate(loaded) if term['src'].lower() in text.lower()])
+        naive_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_term_index(path)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        indexed = [load_term_index(path)[1].find(text) for text in texts]
+        lookup_s = time.perf_counter() - start
+        nodes = len(load_term_index(path)[1])
+    return {
+        "terms": size, "chunks": chunks, "same_matches": naive == indexed,
+        "naive_ms_per_chunk": naive_s / chunks * 1000, "build_ms": build_s * 1000,
+        "index_ms_per_chunk": lookup_s / chunks * 1000, "nodes": nodes,
+    }
+
+if __name__ == '__main__':
+    result = benchmark_term_index()
+    rprint(f"{result['terms']} terms x {result['chunks']} chunks, identical matches: {result['same_matches']}")
+    rprint(f"reparse + scan: {result['naive_ms_per_chunk']:.2f} ms/chunk")
+    rprint(f"automaton: {result['nodes']} nodes built once in {result['build_ms']:.0f} ms, {result['index_ms_per_chunk']:.3f} ms/chunk")
@@ -1,10 +1,12 @@
-import concurrent.futures
+import asyncio
 from difflib import SequenceMatcher
 import math
-from core.prompts import get_split_prompt
+from core.prompts import get_split_prompt, get_packed_split_prompt, get_split_schema
 from core.spacy_utils.load_nlp_model import init_nlp
 from core.utils import *
 from core.utils.local_llm_server import local_llm_server
+from core.utils.llm_engine import run_sync, gather_in_order, estimate_tokens
+from core.utils.llm_pack import pack_requests, get_pack_size
 from rich.console import Console
 from rich.table import Table
 from core.utils.models import _3_1_SPLIT_BY_NLP, _3_2_SPLIT_BY_MEANING
@@ -46,21 +48,20 @@ def find_split_positions(original, modified):
 
     return split_positions
 
-def split_sentence(sentence, num_parts, word_limit=20, index=-1, retry_attempt=0):
-    """Split a long sentence using GPT and return the result as a string."""
-    split_prompt = get_split_prompt(sentence, num_parts, word_limit)
-    def valid_split(response_data):
-        choice = response_data["choice"]
-        if f'split{choice}' not in response_data:
-            return {"status": "error", "message": "Missing required key: `split`"}
-        if "[br]" not in response_data[f"split{choice}"]:
-            return {"status": "error", "message": "Split failed, no [br] found"}
-        return {"status": "success", "message": "Split completed"}
-    
-    response_data = ask_gpt(split_prompt + " " * retry_attempt, resp_type='json', valid_def=valid_split, log_title='split_by_meaning')
+def valid_split(response_data):
+    choice = response_data["choice"]
+    if f'split{choice}' not in response_data:
+        return {"status": "error", "message": "Missing required key: `split`"}
+    if "[br]" not in response_data[f"split{choice}"]:
+        return {"status": "error", "message": "Split failed, no [br] found"}
+    return {"status": "success", "message": "Split completed"}
+
+async def _apply_split(sentence, response_data, index=-1):
+    """Turn the model's chosen [br] split into newline split points on the original sentence."""
     choice = response_data["choice"]
     best_split = response_data[f"split{choice}"]
-    split_points = find_split_positions(sentence, best_split)
+    # similarity search is CPU bound, keep it off the event loop
+    split_points = await asyncio.to_thread(find_split_positions, sentence, best_split)
     # split the sentence based on the split points
     for i, split_point in enumerate(split_points):
         if i == 0:
@@ -81,30 +82,75 @@ def split_sentence(sentence, num_parts, word_limit=20, index=-1, retry_attempt=0
     
     return best_split
 
+async def split_sentence_async(sentence, num_parts, word_limit=20, index=-1, retry_attempt=0):
+    """Split a long sentence using GPT and return the result as a string."""
+    split_prompt = get_split_prompt(sentence, num_parts, word_limit)
+    # a retry round asks again instead of replaying the cached answer
+    response_data = await ask_gpt_async(split_prompt, resp_type='json', valid_def=valid_split, log_title='split_by_meaning',
+                                        use_cache=retry_attempt == 0, schema=get_split_schema())
+    return await _apply_split(sentence, response_data, index)
+
+def split_sentence(sentence, num_parts, word_limit=20, index=-1, retry_attempt=0):
+    return run_sync(split_sentence_async(sentence, num_parts, word_limit, index=index, retry_attempt=retry_attempt))
+
+def _split_cost(job):
+    # the sentence is read once and written back about three times (analysis, split1, split2)
+    return estimate_tokens(job[2]) * 4
+
+async def split_sentences_packed(jobs, word_limit=20, retry_attempt=0, return_exceptions=False):
+    """Split `jobs` of (index, num_parts, sentence), `llm_pack_size` sentences per request, longest first."""
+    async def _single(job):
+        index, num_parts, sentence = job
+        return await split_sentence_async(sentence, num_parts, word_limit, index=index, retry_attempt=retry_attempt)
+
+    if get_pack_size() <= 1:
+        return await gather_in_order(_single, jobs, return_exceptions=return_exceptions, cost=_split_cost)
+
+    def build_prompt(pack):
+        return get_packed_split_prompt([(sentence, num_parts) for _, num_parts, sentence in pack], word_limit)
+
+    def valid_item(answer):
+        try:
+            return valid_split(answer)
+        except KeyError as e:
+            return {"status": "error", "message": f"Missing required key: {e}"}
+
+    answers = await pack_requests(jobs, build_prompt, valid_item, 'split_by_meaning', _single, return_exceptions=return_exceptions,
+                                  item_schema=lambda job: get_split_schema(), cost=_split_cost, use_cache=retry_attempt == 0)
+
+    async def _finish(pair):
+        job, answer = pair
+        # already a split string (or an exception) when the item fell back to a single request
+        if not isinstance(answer, dict):
+            if isinstance(answer, Exception) and not return_exceptions:
+                raise answer
+            return answer
+        return await _apply_split(job[2], answer, job[0])
+
+    return await gather_in_order(_finish, list(zip(jobs, answers)), return_exceptions=return_exceptions)
+
 def parallel_split_sentences(sentences, max_length, max_workers, nlp, retry_attempt=0):
-    """Split sentences in parallel using a thread pool."""
+    """Split sentences concurrently on the shared LLM engine, `max_workers` requests in flight."""
     new_sentences = [None] * len(sentences)
-    futures = []
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for index, sentence in enumerate(sentences):
-            # Use tokenizer to split the sentence
-            tokens = tokenize_sentence(sentence, nlp)
-            # print("Tokenization result:", tokens)
-            num_parts = math.ceil(len(tokens) / max_length)
-            if len(tokens) > max_length:
-                future = executor.submit(split_sentence, sentence, num_parts, max_length, index=index, retry_attempt=retry_attempt)
-                futures.append((future, index, num_parts, sentence))
-            else:
-                new_sentences[index] = [sentence]
-
-        for future, index, num_parts, sentence in futures:
-            split_result = future.result()
-            if split_result:
-                split_lines = split_result.strip().split('\n')
-                new_sentences[index] = [line.strip() for line in split_lines]
-            else:
-                new_sentences[index] = [sentence]
+    jobs = []
+
+    for index, sentence in enumerate(sentences):
+        # Use tokenizer to split the sentence
+        tokens = tokenize_sentence(sentence, nlp)
+        # print("Tokenization result:", tokens)
+        num_parts = math.ceil(len(tokens) / max_length)
+        if len(tokens) > max_length:
+            jobs.append((index, num_parts, sentence))
+        else:
+            new_sentences[index] = [sentence]
+
+    split_results = run_sync(split_sentences_packed(jobs, max_length, retry_attempt=retry_attempt))
+    for (index, num_parts, sentence), split_result in zip(jobs, split_results):
+        if split_result:
+            split_lines = split_result.strip().split('\n')
+            new_sentences[index] = [line.strip() for line in split_lines]
+        else:
+            new_sentences[index] = [sentence]
 
     return [sentence for sublist in new_sentences for sentence in sublist]
 
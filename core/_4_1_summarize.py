@@ -1,9 +1,10 @@
 import json
-from core.prompts import get_summary_prompt
+from core.prompts import get_summary_prompt, get_summary_schema
 import pandas as pd
 from core.utils import *
 from core.utils.local_llm_server import local_llm_server
 from core.utils.models import _3_2_SPLIT_BY_MEANING, _4_1_TERMINOLOGY
+from core.utils.term_index import load_term_index
 
 CUSTOM_TERMS_PATH = 'custom_terms.xlsx'
 
@@ -17,15 +18,14 @@ def combine_chunks():
 
 def search_things_to_note_in_prompt(sentence):
     """Search for terms to note in the given sentence"""
-    with open(_4_1_TERMINOLOGY, 'r', encoding='utf-8') as file:
-        things_to_note = json.load(file)
-    things_to_note_list = [term['src'] for term in things_to_note['terms'] if term['src'].lower() in sentence.lower()]
-    if things_to_note_list:
+    # the term index is built once per terminology.json version, a lookup is one pass over the sentence
+    terms, index = load_term_index(_4_1_TERMINOLOGY)
+    matched = index.find(sentence)
+    if matched:
         prompt = '\n'.join(
-            f'{i+1}. "{term["src"]}": "{term["tgt"]}",'
-            f' meaning: {term["note"]}'
-            for i, term in enumerate(things_to_note['terms'])
-            if term['src'] in things_to_note_list
+            f'{i+1}. "{terms[i]["src"]}": "{terms[i]["tgt"]}",'
+            f' meaning: {terms[i]["note"]}'
+            for i in matched
         )
         return prompt
     else:
@@ -61,7 +61,7 @@ def get_summary():
         return {"status": "success", "message": "Summary completed"}
 
     with local_llm_server("summary"):
-        summary = ask_gpt(summary_prompt, resp_type='json', valid_def=valid_summary, log_title='summary')
+        summary = ask_gpt(summary_prompt, resp_type='json', valid_def=valid_summary, log_title='summary', schema=get_summary_schema())
         summary['terms'].extend(custom_terms_json['terms'])
     
     with open(_4_1_TERMINOLOGY, 'w', encoding='utf-8') as f:
@@ -1,7 +1,7 @@
 import pandas as pd
 import json
-import concurrent.futures
-from core.translate_lines import translate_lines
+import re
+from core.translate_lines import translate_lines_async
 from core._4_1_summarize import search_things_to_note_in_prompt
 from core._6_gen_sub import align_timestamp
 from core.utils import *
@@ -10,40 +10,180 @@ from rich.progress import Progress, SpinnerColumn, TextColumn
 from difflib import SequenceMatcher
 from core.utils.models import *
 from core.utils.local_llm_server import local_llm_server
+from core.utils.llm_engine import estimate_tokens
+from core.utils.local_llm_server import local_server_endpoints
+from core.utils.token_count import get_token_counter
+from core.prompts import generate_theme_prompt, generate_shared_prompt, get_prompt_faithfulness, get_prompt_expressiveness
+from core.prompt_context import assemble_context, context_enabled, report_context, theme_digest
+from core.utils.translation_memory import get_translation_memory, normalize_source
 console = Console()
 
-# Function to split text into chunks
-def split_chunks_by_chars(chunk_size, max_i): 
-    """Split text into chunks based on character count, return a list of multi-line text chunks"""
-    with open(_3_2_SPLIT_BY_MEANING, "r", encoding="utf-8") as file:
-        sentences = file.read().strip().split('\n')
+# ------------
+# token-budget chunking
+# ------------
 
-    chunks = []
-    chunk = ''
-    sentence_count = 0
-    for sentence in sentences:
-        if len(chunk) + len(sentence + '\n') > chunk_size or sentence_count == max_i:
-            chunks.append(chunk.strip())
-            chunk = sentence + '\n'
-            sentence_count = 1
-        else:
-            chunk += sentence + '\n'
-            sentence_count += 1
-    chunks.append(chunk.strip())
+# the largest request of a chunk, in copies of its lines: faithfulness sends the lines and the JSON template
+# and gets origin/direct back, expressiveness also sends the faithful result and gets origin/direct/reflect/free
+ANSWER_COPIES = {False: 2, True: 4}
+PEAK_COPIES = {False: 4, True: 7}
+# keys, quotes and numbering around every line of the JSON answer
+LINE_JSON_TOKENS = 12
+
+def _chunk_setting(name, default):
+    try:
+        value = load_key(f"translation_chunk.{name}")
+    except KeyError:
+        return default
+    return default if value in (None, '') else value
+
+def chunk_token_budget():
+    """Tokens one translation request may take: the model context minus the safety margin."""
+    context = _chunk_setting("context_tokens", "auto")
+    if context == "auto":
+        local = local_server_endpoints(load_key("api.base_url"))
+        context = load_key("local_llm.n_ctx") if local else 8192
+    return int(int(context) * (1 - float(_chunk_setting("safety_margin", 0.15))))
+
+def chunk_context(chunk, previous, after, terms):
+    """(previous lines, subsequent lines, notes) for the prompts of `chunk`, relevance-pruned unless disabled."""
+    if context_enabled():
+        return assemble_context(chunk, previous, after, terms)
+    return previous, after, search_things_to_note_in_prompt(chunk)
+
+def chunk_request_tokens(lines, previous, after, theme_prompt, counter, terms=None):
+    """Tokens of the largest request translating `lines`: the assembled prompt plus the expected answer."""
+    reflect = bool(load_key('reflect_translate'))
+    shared_prompt = generate_shared_prompt(*chunk_context(lines, previous, after, terms))
+    if reflect:
+        faith = {str(i): {"origin": line, "direct": line} for i, line in enumerate(lines.split('\n'), 1)}
+        prompt = get_prompt_expressiveness(faith, lines, shared_prompt, theme_prompt)
+    else:
+        prompt = get_prompt_faithfulness(lines, shared_prompt, theme_prompt)
+    answer = ANSWER_COPIES[reflect] * counter.count(lines) + LINE_JSON_TOKENS * len(lines.split('\n'))
+    return counter.count(prompt) + answer
+
+def split_chunks_by_tokens(sentences, theme_prompt, budget=None, max_lines=None, counter=None, terms=None):
+    """Consecutive sentences grouped into chunks as large as `budget` tokens allow (see `chunk_token_budget`).
+
+    A chunk grows on per-line token counts, then its fully assembled prompt (context lines, notes,
+    theme) is counted and the chunk shrinks until it fits. A single line over budget stays on its own.
+    """
+    counter = counter or get_token_counter()
+    budget = budget or chunk_token_budget()
+    max_lines = max_lines or int(_chunk_setting("max_lines", 20))
+    theme_prompt = generate_theme_prompt(theme_prompt)
+    copies = PEAK_COPIES[bool(load_key('reflect_translate'))]
+    line_cost = lambda i: copies * counter.count(sentences[i]) + LINE_JSON_TOKENS
+
+    chunks, largest = [], 0
+    start = 0
+    while start < len(sentences):
+        previous = chunks[-1].split('\n')[-3:] if chunks else None
+
+        def request_tokens(end):
+            return chunk_request_tokens('\n'.join(sentences[start:end]), previous, sentences[end:end + 2] or None, theme_prompt, counter, terms)
+
+        end = start + 1
+        used = request_tokens(end)
+        while end < len(sentences) and end - start < max_lines and used + line_cost(end) <= budget:
+            used += line_cost(end)
+            end += 1
+        used = request_tokens(end)
+        while end - start > 1 and used > budget:
+            end -= 1
+            used = request_tokens(end)
+        if used > budget:
+            rprint(f"[yellow]⚠️ Line {start} alone needs ~{used} tokens, over the {budget} token budget[/yellow]")
+        largest = max(largest, used)
+        chunks.append('\n'.join(sentences[start:end]).strip())
+        start = end
+    console.print(f"[cyan]📦 {len(sentences)} lines in {len(chunks)} chunks, largest request ~{largest}/{budget} tokens "
+                  f"(counted with {counter.source})[/cyan]")
     return chunks
 
+# ------------
+# dedup repeated lines
+# ------------
+
+# a source line is sent ~4 times with faithfulness only (input, JSON template, echoed answer, translation), ~12 with reflection
+LINE_COPIES = {False: 4, True: 12}
+
+def _dedup_key(sentence):
+    return re.sub(r'[\W_]+', ' ', normalize_source(sentence)).strip()
+
+def dedup_sentences(sentences, near_threshold=1.0, near_max_chars=40):
+    """Collapse repeated lines: returns (unique sentences, index of each sentence's representative).
+
+    Lines that only differ in case, punctuation or spacing are repeats. With `near_threshold` < 1,
+    short lines at least that similar to an earlier short line are folded into it as well.
+    The first occurrence stands for every repeat. Chunks and their previous/after context are cut
+    from the unique list, so a line's neighbours in the prompt are the unique lines around its first
+    occurrence, with the repeats in between left out.
+    """
+    unique, mapping, seen = [], [], {}
+    short = []
+    for sentence in sentences:
+        key = _dedup_key(sentence)
+        if key in seen:
+            mapping.append(seen[key])
+            continue
+        if key and near_threshold < 1.0 and len(key) <= near_max_chars:
+            match = next((idx for other, idx in short if SequenceMatcher(None, key, other).ratio() >= near_threshold), None)
+            if match is not None:
+                seen[key] = match
+                mapping.append(match)
+                continue
+            short.append((key, len(unique)))
+        seen[key] = len(unique)
+        mapping.append(len(unique))
+        unique.append(sentence)
+    return unique, mapping
+
+def _dedup_setting(name, default):
+    try:
+        value = load_key(f"translation_dedup.{name}")
+    except KeyError:
+        return default
+    return default if value in (None, '') else value
+
+def chunk_tokens(chunk):
+    """Estimated prompt + completion tokens of translating `chunk`, every line travels LINE_COPIES times."""
+    return estimate_tokens(chunk) * LINE_COPIES[bool(load_key('reflect_translate'))]
+
+def report_dedup(sentences, unique):
+    removed = len(sentences) - len(unique)
+    if not removed:
+        return
+    tokens = (estimate_tokens(*sentences) - estimate_tokens(*unique)) * LINE_COPIES[bool(load_key('reflect_translate'))]
+    console.print(f"[cyan]♻️ {removed} repeated lines translated once ({len(unique)}/{len(sentences)} unique), ~{tokens} LLM tokens saved[/cyan]")
+
 # Get context from surrounding chunks
 def get_previous_content(chunks, chunk_index):
     return None if chunk_index == 0 else chunks[chunk_index - 1].split('\n')[-3:] # Get last 3 lines
 def get_after_content(chunks, chunk_index):
     return None if chunk_index == len(chunks) - 1 else chunks[chunk_index + 1].split('\n')[:2] # Get first 2 lines
 
+def context_report_rows(chunks, theme, digest, terms, counter=None):
+    """Faithfulness prompt tokens of every chunk with the full context and with the pruned one."""
+    counter = counter or get_token_counter()
+    rows = []
+    for i, chunk in enumerate(chunks):
+        previous, after = get_previous_content(chunks, i), get_after_content(chunks, i)
+        full = generate_shared_prompt(previous, after, search_things_to_note_in_prompt(chunk))
+        pruned = generate_shared_prompt(*chunk_context(chunk, previous, after, terms))
+        rows.append({
+            "chunk": i,
+            "lines": len(chunk.split('\n')),
+            "before": counter.count(get_prompt_faithfulness(chunk, full, generate_theme_prompt(theme))),
+            "after": counter.count(get_prompt_faithfulness(chunk, pruned, generate_theme_prompt(digest))),
+        })
+    return rows
+
 # 🔍 Translate a single chunk
-def translate_chunk(chunk, chunks, theme_prompt, i):
-    things_to_note_prompt = search_things_to_note_in_prompt(chunk)
-    previous_content_prompt = get_previous_content(chunks, i)
-    after_content_prompt = get_after_content(chunks, i)
-    translation, english_result = translate_lines(chunk, previous_content_prompt, after_content_prompt, things_to_note_prompt, theme_prompt, i)
+async def translate_chunk(chunk, chunks, theme_prompt, i, terms=None):
+    previous_content_prompt, after_content_prompt, things_to_note_prompt = chunk_context(
+        chunk, get_previous_content(chunks, i), get_after_content(chunks, i), terms)
+    translation, english_result = await translate_lines_async(chunk, previous_content_prompt, after_content_prompt, things_to_note_prompt, theme_prompt, i, terms)
     return i, english_result, translation
 
 # Add similarity calculation function
@@ -55,24 +195,37 @@ def similar(a, b):
 def translate_all():
     with local_llm_server("translate"):
         console.print("[bold green]Start Translating All...[/bold green]")
-        chunks = split_chunks_by_chars(chunk_size=600, max_i=10)
+        with open(_3_2_SPLIT_BY_MEANING, "r", encoding="utf-8") as file:
+            sentences = file.read().strip().split('\n')
+        if _dedup_setting("enabled", True):
+            unique, mapping = dedup_sentences(sentences, near_threshold=float(_dedup_setting("near_threshold", 1.0)))
+            report_dedup(sentences, unique)
+        else:
+            unique, mapping = sentences, list(range(len(sentences)))
         with open(_4_1_TERMINOLOGY, 'r', encoding='utf-8') as file:
-            theme_prompt = json.load(file).get('theme')
+            terminology = json.load(file)
+        terms = terminology.get('terms', [])
+        # one theme digest for every prompt, so the shared prefix stays identical across chunks
+        theme_prompt = theme_digest(terminology.get('theme'), unique)
+        chunks = split_chunks_by_tokens(unique, theme_prompt, terms=terms)
+        if context_enabled():
+            report_context(context_report_rows(chunks, terminology.get('theme'), theme_prompt, terms))
 
         # 🔄 Use concurrent execution for translation
         with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), transient=True) as progress:
             task = progress.add_task("[cyan]Translating chunks...", total=len(chunks))
-            with concurrent.futures.ThreadPoolExecutor(max_workers=load_key("max_workers")) as executor:
-                futures = []
-                for i, chunk in enumerate(chunks):
-                    future = executor.submit(translate_chunk, chunk, chunks, theme_prompt, i)
-                    futures.append(future)
-                results = []
-                for future in concurrent.futures.as_completed(futures):
-                    results.append(future.result())
-                    progress.update(task, advance=1)
+            # the biggest chunks go first so they do not run alone at the end
+            results = llm_map(
+                lambda item: translate_chunk(item[1], chunks, theme_prompt, item[0], terms),
+                enumerate(chunks),
+                on_done=lambda _: progress.update(task, advance=1),
+                cost=lambda item: chunk_tokens(item[1]),
+            )
 
         results.sort(key=lambda x: x[0])  # Sort results based on original order
+        tm = get_translation_memory()
+        if tm is not None:
+            tm.report()
 
         # 💾 Save results to lists and Excel file
         src_text, trans_text = [], []
@@ -95,6 +248,10 @@ def translate_all():
 
             trans_text.extend(best_match[0][2].split('\n'))
 
+        # fan the unique translations back out to every occurrence
+        src_text = sentences
+        trans_text = [trans_text[idx] for idx in mapping]
+
         # Trim long translation text
         df_text = pd.read_excel(_2_CLEANED_CHUNKS)
         df_text['text'] = df_text['text'].str.strip('"').str.strip()
@@ -102,18 +259,17 @@ def translate_all():
         subtitle_output_configs = [('trans_subs_for_audio.srt', ['Translation'])]
         df_time = align_timestamp(df_text, df_translate, subtitle_output_configs, output_dir=None, for_display=False)
         console.print(df_time)
-        # apply check_len_then_trim to df_time['Translation'] only when enabled.
+        # trim over-long df_time['Translation'] in one concurrent batch, only when enabled.
         try:
             enable_audio_trim = bool(load_key("enable_audio_trim"))
         except KeyError:
             enable_audio_trim = True
         if enable_audio_trim:
-            from core._8_1_audio_task import check_len_then_trim
-            df_time['Translation'] = df_time.apply(
-                lambda x: check_len_then_trim(x['Translation'], x['duration'])
-                if x['duration'] > load_key("min_trim_duration")
-                else x['Translation'],
-                axis=1,
+            from core._8_1_audio_task import trim_texts_batch
+            long_rows = df_time.index[df_time['duration'] > load_key("min_trim_duration")]
+            df_time.loc[long_rows, 'Translation'] = trim_texts_batch(
+                df_time.loc[long_rows, 'Translation'].tolist(),
+                df_time.loc[long_rows, 'duration'].tolist(),
             )
         console.print(df_time)
 
@@ -1,15 +1,16 @@
 import pandas as pd
 from typing import List, Tuple
-import concurrent.futures
 
-from core._3_2_split_meaning import split_sentence
-from core.prompts import get_align_prompt
+from core._3_2_split_meaning import split_sentences_packed
+from core.prompts import get_align_prompt, get_packed_align_prompt, get_align_schema
 from rich.panel import Panel
 from rich.console import Console
 from rich.table import Table
 from core.utils import *
 from core.utils.models import *
 from core.utils.local_llm_server import local_llm_server
+from core.utils.llm_engine import run_sync, gather_in_order, estimate_tokens
+from core.utils.llm_pack import pack_requests, get_pack_size
 console = Console()
 
 # ! You can modify your own weights here
@@ -31,16 +32,14 @@ def calc_len(text: str) -> float:
 
     return sum(char_weight(char) for char in text)
 
-def align_subs(src_sub: str, tr_sub: str, src_part: str) -> Tuple[List[str], List[str], str]:
-    align_prompt = get_align_prompt(src_sub, tr_sub, src_part)
-    
-    def valid_align(response_data):
-        if 'align' not in response_data:
-            return {"status": "error", "message": "Missing required key: `align`"}
-        if len(response_data['align']) < 2:
-            return {"status": "error", "message": "Align does not contain more than 1 part as expected!"}
-        return {"status": "success", "message": "Align completed"}
-    parsed = ask_gpt(align_prompt, resp_type='json', valid_def=valid_align, log_title='align_subs')
+def valid_align(response_data):
+    if 'align' not in response_data:
+        return {"status": "error", "message": "Missing required key: `align`"}
+    if len(response_data['align']) < 2:
+        return {"status": "error", "message": "Align does not contain more than 1 part as expected!"}
+    return {"status": "success", "message": "Align completed"}
+
+def _apply_align(src_part: str, parsed: dict) -> Tuple[List[str], List[str], str]:
     align_data = parsed['align']
     src_parts = src_part.split('\n')
     tr_parts = [item[f'target_part_{i+1}'].strip() for i, item in enumerate(align_data)]
@@ -59,6 +58,49 @@ def align_subs(src_sub: str, tr_sub: str, src_part: str) -> Tuple[List[str], Lis
     
     return src_parts, tr_parts, tr_remerged
 
+async def align_subs_async(src_sub: str, tr_sub: str, src_part: str) -> Tuple[List[str], List[str], str]:
+    align_prompt = get_align_prompt(src_sub, tr_sub, src_part)
+    parsed = await ask_gpt_async(align_prompt, resp_type='json', valid_def=valid_align, log_title='align_subs',
+                                 schema=get_align_schema(len(src_part.split('\n'))))
+    return _apply_align(src_part, parsed)
+
+def align_subs(src_sub: str, tr_sub: str, src_part: str) -> Tuple[List[str], List[str], str]:
+    return run_sync(align_subs_async(src_sub, tr_sub, src_part))
+
+def _align_cost(item):
+    # prompt holds both subtitles and the split source, the answer restates the split with its translation
+    src_sub, tr_sub, src_part = item
+    return estimate_tokens(src_sub, tr_sub, src_part) + estimate_tokens(src_part, tr_sub) * 2
+
+async def align_subs_packed(items, return_exceptions=False):
+    """Align `items` of (src_sub, tr_sub, src_part), `llm_pack_size` subtitles per request, longest first."""
+    async def _single(item):
+        return await align_subs_async(*item)
+
+    if get_pack_size() <= 1:
+        return await gather_in_order(_single, items, return_exceptions=return_exceptions, cost=_align_cost)
+
+    def valid_item(answer):
+        result = valid_align(answer)
+        if result['status'] == 'success' and not all(isinstance(part, dict) and isinstance(part.get(f'target_part_{i+1}'), str) for i, part in enumerate(answer['align'])):
+            return {"status": "error", "message": "Missing `target_part_n` in align"}
+        return result
+
+    def _finish(item, answer):
+        # already aligned (or an exception) when the item fell back to a single request
+        if not isinstance(answer, dict):
+            return answer
+        try:
+            return _apply_align(item[2], answer)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return e
+
+    answers = await pack_requests(items, get_packed_align_prompt, valid_item, 'align_subs', _single, return_exceptions=return_exceptions,
+                                  item_schema=lambda item: get_align_schema(len(item[2].split('\n'))), cost=_align_cost)
+    return [_finish(item, answer) for item, answer in zip(items, answers)]
+
 def split_align_subs(src_lines: List[str], tr_lines: List[str]):
     subtitle_set = load_key("subtitle")
     MAX_SUB_LENGTH = subtitle_set["max_length"]
@@ -77,16 +119,23 @@ def split_align_subs(src_lines: List[str], tr_lines: List[str]):
             table.add_row("Target Line", tr)
             console.print(table)
     
-    @except_handler("Error in split_align_subs")
-    def process(i):
-        split_src = split_sentence(src_lines[i], num_parts=2).strip()
-        src_parts, tr_parts, tr_remerged = align_subs(src_lines[i], tr_lines[i], split_src)
-        src_lines[i] = src_parts
-        tr_lines[i] = tr_parts
-        remerged_tr_lines[i] = tr_remerged
+    async def process(indices):
+        # split every long source line first, then align all translations against their splits
+        jobs = [(-1, 2, src_lines[i]) for i in indices]
+        splits = await split_sentences_packed(jobs, return_exceptions=True)
+        split_ok = [(i, split) for i, split in zip(indices, splits) if not isinstance(split, Exception)]
+        aligned = await align_subs_packed([(src_lines[i], tr_lines[i], split.strip()) for i, split in split_ok], return_exceptions=True)
+        failed = [(i, split) for i, split in zip(indices, splits) if isinstance(split, Exception)]
+        for (i, _), result in zip(split_ok, aligned):
+            if isinstance(result, Exception):
+                failed.append((i, result))
+                continue
+            src_lines[i], tr_lines[i], remerged_tr_lines[i] = result
+        return failed
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=load_key("max_workers")) as executor:
-        executor.map(process, to_split)
+    # a failed line is reported and left unsplit for the next attempt
+    for i, error in run_sync(process(to_split)):
+        console.print(f"[red]Error in split_align_subs, line {i}: {error}[/red]")
     
     # Flatten `src_lines` and `tr_lines`
     src_lines = [item for sublist in src_lines for item in (sublist if isinstance(sublist, list) else [sublist])]
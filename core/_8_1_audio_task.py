@@ -3,10 +3,12 @@ import re
 import pandas as pd
 from rich.console import Console
 from rich.panel import Panel
-from core.prompts import get_subtitle_trim_prompt
+from core.prompts import get_subtitle_trim_prompt, get_packed_trim_prompt, get_trim_schema
 from core.tts_backend.estimate_duration import init_estimator, estimate_duration
 from core.utils import *
 from core.utils.models import *
+from core.utils.llm_engine import run_sync
+from core.utils.llm_pack import pack_requests, get_pack_size
 
 console = Console()
 speed_factor = load_key("speed_factor")
@@ -15,7 +17,7 @@ TRANS_SUBS_FOR_AUDIO_FILE = 'output/audio/trans_subs_for_audio.srt'
 SRC_SUBS_FOR_AUDIO_FILE = 'output/audio/src_subs_for_audio.srt'
 ESTIMATOR = None
 
-def check_len_then_trim(text, duration):
+def _needs_trim(text, duration):
     global ESTIMATOR
     if ESTIMATOR is None:
         ESTIMATOR = init_estimator()
@@ -26,22 +28,59 @@ def check_len_then_trim(text, duration):
 
     if estimated_duration > duration:
         rprint(Panel(f"Estimated reading duration {estimated_duration:.2f} seconds exceeds given duration {duration:.2f} seconds, shortening...", title="Processing", border_style="yellow"))
-        original_text = text
-        prompt = get_subtitle_trim_prompt(text, duration)
-        def valid_trim(response):
-            if 'result' not in response:
-                return {'status': 'error', 'message': 'No result in response'}
-            return {'status': 'success', 'message': ''}
-        try:    
-            response = ask_gpt(prompt, resp_type='json', log_title='sub_trim', valid_def=valid_trim)
-            shortened_text = response['result']
-        except Exception:
-            rprint("[bold red]🚫 AI refused to answer due to sensitivity, so manually remove punctuation[/bold red]")
-            shortened_text = re.sub(r'[,.!?;:，。！？；：]', ' ', text).strip()
-        rprint(Panel(f"Subtitle before shortening: {original_text}\nSubtitle after shortening: {shortened_text}", title="Subtitle Shortening Result", border_style="green"))
-        return shortened_text
-    else:
+        return True
+    return False
+
+def valid_trim(response):
+    if 'result' not in response:
+        return {'status': 'error', 'message': 'No result in response'}
+    return {'status': 'success', 'message': ''}
+
+def _fallback_trim(text):
+    rprint("[bold red]🚫 AI refused to answer due to sensitivity, so manually remove punctuation[/bold red]")
+    return re.sub(r'[,.!?;:，。！？；：]', ' ', text).strip()
+
+def _show_trim(original_text, shortened_text):
+    rprint(Panel(f"Subtitle before shortening: {original_text}\nSubtitle after shortening: {shortened_text}", title="Subtitle Shortening Result", border_style="green"))
+
+def check_len_then_trim(text, duration):
+    if not _needs_trim(text, duration):
         return text
+    prompt = get_subtitle_trim_prompt(text, duration)
+    try:    
+        response = ask_gpt(prompt, resp_type='json', log_title='sub_trim', valid_def=valid_trim, schema=get_trim_schema())
+        shortened_text = response['result']
+    except Exception:
+        shortened_text = _fallback_trim(text)
+    _show_trim(text, shortened_text)
+    return shortened_text
+
+def trim_texts_batch(texts, durations):
+    """`check_len_then_trim` for many subtitles at once: over-long ones are trimmed concurrently, `llm_pack_size` per request."""
+    todo = [(i, text, duration) for i, (text, duration) in enumerate(zip(texts, durations)) if _needs_trim(text, duration)]
+    results = list(texts)
+    if not todo:
+        return results
+
+    async def _single(item):
+        _, text, duration = item
+        response = await ask_gpt_async(get_subtitle_trim_prompt(text, duration), resp_type='json', log_title='sub_trim', valid_def=valid_trim,
+                                       schema=get_trim_schema())
+        return response['result']
+
+    async def _packed():
+        if get_pack_size() <= 1:
+            return await gather_in_order(_single, todo, return_exceptions=True)
+        answers = await pack_requests(todo, lambda pack: get_packed_trim_prompt([(text, duration) for _, text, duration in pack]),
+                                      valid_trim, 'sub_trim', _single, return_exceptions=True, item_schema=lambda item: get_trim_schema())
+        return [answer['result'] if isinstance(answer, dict) else answer for answer in answers]
+
+    for (i, text, _), shortened_text in zip(todo, run_sync(_packed())):
+        if isinstance(shortened_text, Exception):
+            shortened_text = _fallback_trim(text)
+        _show_trim(text, shortened_text)
+        results[i] = shortened_text
+    return results
 
 def time_diff_seconds(t1, t2, base_date):
     """Calculate the difference in seconds between two time objects"""
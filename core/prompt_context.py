@@ -0,0 +1,123 @@
+import json
+import os
+import re
+from collections import Counter
+
+from core.utils import *
+from core.utils.term_index import index_for_terms
+from core.utils.token_count import get_token_counter
+
+CONTEXT_REPORT = 'output/log/translate_context.json'
+
+# ------------
+# relevance scoring
+# ------------
+
+_WORD = re.compile(r'\w+')
+_DENSE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+
+def _words(text):
+    """Lowercased words; CJK runs become character bigrams since they have no spaces."""
+    words = []
+    for word in _WORD.findall(str(text).lower()):
+        if _DENSE.search(word):
+            words += [word[i:i + 2] for i in range(max(len(word) - 1, 1))]
+        elif len(word) > 1:
+            words.append(word)
+    return words
+
+def overlap(text, reference):
+    """Share of `text`'s words that also occur in `reference` (a word Counter)."""
+    words = _words(text)
+    return sum(1 for w in words if w in reference) / len(words) if words else 0.0
+
+def _context_setting(name, default):
+    try:
+        value = load_key(f"translation_context.{name}")
+    except KeyError:
+        return default
+    return default if value in (None, '') else value
+
+def context_enabled():
+    return bool(_context_setting("enabled", True))
+
+def _pick(items, cap, counter):
+    """Indices of the best-scoring (score, text) items whose tokens fit `cap`, in their original order."""
+    kept, used = [], 0
+    for i in sorted(range(len(items)), key=lambda i: -items[i][0]):
+        tokens = counter.count(items[i][1])
+        if used + tokens <= cap:
+            kept.append(i)
+            used += tokens
+    return sorted(kept)
+
+# ------------
+# video theme: one digest for every prompt
+# ------------
+
+def theme_digest(theme, sentences, cap=None, counter=None):
+    """The summary sentences most about the transcript, within `cap` tokens.
+
+    The digest is the same for every chunk, so it stays in the prefix a local server can reuse.
+    The first sentence, the gist of the summary, is always kept.
+    """
+    if not theme or not context_enabled():
+        return theme
+    counter = counter or get_token_counter()
+    cap = cap or int(_context_setting("theme_tokens", 150))
+    if counter.count(theme) <= cap:
+        return theme
+    parts = [p for p in re.split(r'(?<=[.!?。！？])\s*', theme.strip()) if p]
+    transcript = Counter(_words(' '.join(sentences)))
+    items = [(float('inf') if i == 0 else overlap(part, transcript), part) for i, part in enumerate(parts)]
+    return ' '.join(parts[i] for i in _pick(items, cap, counter))
+
+# ------------
+# per-chunk context
+# ------------
+
+def _note(term):
+    return f'"{term["src"]}": "{term["tgt"]}", meaning: {term["note"]}'
+
+def assemble_context(chunk, previous, after, terms, cap=None, counter=None):
+    """Neighbouring lines and term notes for `chunk`, ranked by relevance and capped at `cap` tokens.
+
+    Returns (previous lines, subsequent lines, notes prompt) shaped like `get_previous_content`,
+    `get_after_content` and `search_things_to_note_in_prompt`. A term note scores by how often the
+    term occurs in the chunk, a line by its distance to the chunk plus its word overlap with it.
+    """
+    counter = counter or get_token_counter()
+    cap = cap or int(_context_setting("max_tokens", 300))
+    reference = Counter(_words(chunk))
+    found = index_for_terms(terms).count(chunk) if terms else {}
+    matched = sorted(found)
+
+    items = [(1 + found[i], _note(terms[i])) for i in matched]
+    previous, after = list(previous or []), list(after or [])
+    items += [(1 / (len(previous) - i) + overlap(line, reference), line) for i, line in enumerate(previous)]
+    items += [(1 / (i + 1) + overlap(line, reference), line) for i, line in enumerate(after)]
+    kept = set(_pick(items, cap, counter))
+
+    notes = [items[i][1] for i in range(len(matched)) if i in kept]
+    offset = len(matched)
+    kept_previous = [line for i, line in enumerate(previous) if offset + i in kept]
+    offset += len(previous)
+    kept_after = [line for i, line in enumerate(after) if offset + i in kept]
+    notes_prompt = '\n'.join(f'{i}. {note}' for i, note in enumerate(notes, 1)) or None
+    return kept_previous or None, kept_after or None, notes_prompt
+
+# ------------
+# report
+# ------------
+
+def report_context(rows, path=CONTEXT_REPORT):
+    """Print before/after prompt tokens over all chunks and write the per-chunk numbers to `path`."""
+    if not rows:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False)
+    before = sum(r["before"] for r in rows)
+    after = sum(r["after"] for r in rows)
+    rprint(f"[cyan]✂️ Translation prompts: {before} → {after} tokens over {len(rows)} chunks "
+           f"({1 - after / before:.0%} less prompt eval, max {max(r['after'] for r in rows)}/chunk), details in {path}[/cyan]")
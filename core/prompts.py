@@ -125,8 +125,14 @@ Note: Start you answer with ```json and end with ```, do not add any other text.
 
 ## ================================================================
 # @ step5_translate.py & translate_lines.py
-def generate_shared_prompt(previous_content_prompt, after_content_prompt, summary_prompt, things_to_note_prompt):
-    return f'''### Context Information
+# Layout is prefix-stable: role, task, principles and the video theme never change within a run, the
+# per-chunk context, notes and subtitles come last so a local llama.cpp server can reuse the KV cache
+def generate_theme_prompt(summary_prompt):
+    return f'''### Content Summary
+{summary_prompt}'''
+
+def generate_shared_prompt(previous_content_prompt, after_content_prompt, things_to_note_prompt, similar_prompt=None):
+    shared_prompt = f'''### Context Information
 <previous_content>
 {previous_content_prompt}
 </previous_content>
@@ -135,13 +141,17 @@ def generate_shared_prompt(previous_content_prompt, after_content_prompt, summar
 {after_content_prompt}
 </subsequent_content>
 
-### Content Summary
-{summary_prompt}
-
 ### Points to Note
 {things_to_note_prompt}'''
+    if similar_prompt:
+        shared_prompt += f'''
+
+### Similar Past Translations
+These lines resemble the subtitles but may differ in meaning (negation, numbers, names). Use them for terminology and style only.
+{similar_prompt}'''
+    return shared_prompt
 
-def get_prompt_faithfulness(lines, shared_prompt):
+def get_prompt_faithfulness(lines, shared_prompt, theme_prompt):
     TARGET_LANGUAGE = load_key("target_language")
     # Split lines by \n
     line_splits = lines.split('\n')
@@ -164,14 +174,16 @@ We have a segment of original {src_language} subtitles that need to be directly
 2. Ensure the translation is faithful to the original, accurately conveying the original meaning
 3. Consider the context and professional terminology
 
-{shared_prompt}
-
 <translation_principles>
 1. Faithful to the original: Accurately convey the content and meaning of the original text, without arbitrarily changing, adding, or omitting content.
 2. Accurate terminology: Use professional terms correctly and maintain consistency in terminology.
 3. Understand the context: Fully comprehend and reflect the background and contextual relationships of the text.
 </translation_principles>
 
+{theme_prompt}
+
+{shared_prompt}
+
 ## INPUT
 <subtitles>
 {lines}
@@ -187,7 +199,7 @@ Note: Start you answer with ```json and end with ```, do not add any other text.
     return prompt_faithfulness.strip()
 
 
-def get_prompt_expressiveness(faithfulness_result, lines, shared_prompt):
+def get_prompt_expressiveness(faithfulness_result, lines, shared_prompt, theme_prompt):
     TARGET_LANGUAGE = load_key("target_language")
     json_format = {
         key: {
@@ -216,8 +228,6 @@ Your task is to reflect on and improve these direct translations to create more
 4. Do not add comments or explanations in the translation, as the subtitles are for the audience to read
 5. Do not leave empty lines in the free translation, as the subtitles are for the audience to read
 
-{shared_prompt}
-
 <Translation Analysis Steps>
 Please use a two-step thinking process to handle the text line by line:
 
@@ -231,6 +241,10 @@ Please use a two-step thinking process to handle the text line by line:
    - Ensure it's easy for {TARGET_LANGUAGE} audience to understand and accept
    - Adapt the language style to match the theme (e.g., use casual language for tutorials, professional terminology for technical content, formal language for documentaries)
 </Translation Analysis Steps>
+
+{theme_prompt}
+
+{shared_prompt}
    
 ## INPUT
 <subtitles>
@@ -297,16 +311,147 @@ Note: Start you answer with ```json and end with ```, do not add any other text.
 '''.strip()
     return align_prompt
 
+## ================================================================
+# @ llm_pack.py: several independent items answered in one request, keyed "1".."n"
+def get_packed_split_prompt(items, word_limit = 20):
+    """items: list of (sentence, num_parts)"""
+    language = load_key("whisper.detected_language")
+    given = '\n'.join(
+        f'<split_this_sentence id="{i}" parts="{num_parts}">\n{sentence}\n</split_this_sentence>'
+        for i, (sentence, num_parts) in enumerate(items, 1)
+    )
+    json_format = json.dumps({
+        str(i): {
+            "analysis": "Brief description of sentence structure, complexity, and key splitting challenges",
+            "split1": f"First splitting approach with [br] tags at split positions ({num_parts} parts)",
+            "split2": "Alternative splitting approach with [br] tags at split positions",
+            "assess": "Comparison of both approaches highlighting their strengths and weaknesses",
+            "choice": "1 or 2"
+        } for i, (_, num_parts) in enumerate(items, 1)
+    }, indent=4, ensure_ascii=False)
+    return f"""
+## Role
+You are a professional Netflix subtitle splitter in **{language}**.
+
+## Task
+Split each given subtitle text independently into the number of parts given by its `parts` attribute, each part less than **{word_limit}** words.
+
+1. Maintain sentence meaning coherence according to Netflix subtitle standards
+2. MOST IMPORTANT: Keep parts roughly equal in length (minimum 3 words each)
+3. Split at natural points like punctuation marks or conjunctions
+4. If provided text is repeated words, simply split at the middle of the repeated words.
+
+## Steps (for every text)
+1. Analyze the sentence structure, complexity, and key splitting challenges
+2. Generate two alternative splitting approaches with [br] tags at split positions
+3. Compare both approaches highlighting their strengths and weaknesses
+4. Choose the best splitting approach
+
+## Given Texts
+{given}
+
+## Output in only JSON format and no other text, one entry per text id
+```json
+{json_format}
+```
+
+Note: Start you answer with ```json and end with ```, do not add any other text.
+""".strip()
+
+def get_packed_align_prompt(items):
+    """items: list of (src_sub, tr_sub, src_part)"""
+    targ_lang = load_key("target_language")
+    src_lang = load_key("whisper.detected_language")
+    given = []
+    json_format = {}
+    for i, (src_sub, tr_sub, src_part) in enumerate(items, 1):
+        src_splits = src_part.split('\n')
+        given.append(f'''<subtitles id="{i}">
+{src_lang} Original: "{src_sub}"
+{targ_lang} Original: "{tr_sub}"
+Pre-processed {src_lang} Subtitles ([br] indicates split points): {' [br] '.join(src_splits)}
+</subtitles>''')
+        json_format[str(i)] = {
+            "analysis": "Brief analysis of word order, structure, and semantic correspondence between two subtitles",
+            "align": [
+                {f"src_part_{j+1}": part, f"target_part_{j+1}": f"Corresponding aligned {targ_lang} subtitle part"}
+                for j, part in enumerate(src_splits)
+            ]
+        }
+    json_format = json.dumps(json_format, indent=4, ensure_ascii=False)
+    given = '\n'.join(given)
+    return f'''
+## Role
+You are a Netflix subtitle alignment expert fluent in both {src_lang} and {targ_lang}.
+
+## Task
+For each numbered entry we have {src_lang} and {targ_lang} original subtitles for a Netflix program, as well as a pre-processed split version of the {src_lang} subtitle.
+Your task is to create the best splitting scheme for each {targ_lang} subtitle based on this information. Entries are independent of each other.
+
+1. Analyze the word order and structural correspondence between {src_lang} and {targ_lang} subtitles
+2. Split the {targ_lang} subtitles according to the pre-processed {src_lang} split version
+3. Never leave empty lines. If it's difficult to split based on meaning, you may appropriately rewrite the sentences that need to be aligned
+4. Do not add comments or explanations in the translation, as the subtitles are for the audience to read
+
+## INPUT
+{given}
+
+## Output in only JSON format and no other text, one entry per subtitle id
+```json
+{json_format}
+```
+
+Note: Start you answer with ```json and end with ```, do not add any other text.
+'''.strip()
+
+def get_packed_trim_prompt(items):
+    """items: list of (text, duration)"""
+    given = '\n'.join(
+        f'<subtitle id="{i}">\nSubtitle: "{text}"\nDuration: {duration} seconds\n</subtitle>'
+        for i, (text, duration) in enumerate(items, 1)
+    )
+    json_format = json.dumps({
+        str(i): {
+            "analysis": "Brief analysis of the subtitle, including structure, key information, and potential processing locations",
+            "result": "Optimized and shortened subtitle in the original subtitle language"
+        } for i in range(1, len(items) + 1)
+    }, indent=4, ensure_ascii=False)
+    return f'''
+## Role
+You are a professional subtitle editor, editing and optimizing lengthy subtitles that exceed voiceover time before handing them to voice actors. 
+Your expertise lies in cleverly shortening subtitles slightly while ensuring the original meaning and structure remain unchanged.
+
+## INPUT
+{given}
+
+## Processing Rules
+{TRIM_RULE}
+
+## Processing Steps
+Handle every subtitle independently and provide the results in the JSON output:
+1. Analysis: Briefly analyze the subtitle's structure, key information, and filler words that can be omitted.
+2. Trimming: Based on the rules and analysis, optimize the subtitle by making it more concise according to the processing rules.
+
+## Output in only JSON format and no other text, one entry per subtitle id
+```json
+{json_format}
+```
+
+Note: Start you answer with ```json and end with ```, do not add any other text.
+'''.strip()
+
 ## ================================================================
 # @ step8_gen_audio_task.py @ step10_gen_audio.py
-def get_subtitle_trim_prompt(text, duration):
- 
-    rule = '''Consider a. Reducing filler words without modifying meaningful content. b. Omitting unnecessary modifiers or pronouns, for example:
+TRIM_RULE = '''Consider a. Reducing filler words without modifying meaningful content. b. Omitting unnecessary modifiers or pronouns, for example:
     - "Please explain your thought process" can be shortened to "Please explain thought process"
     - "We need to carefully analyze this complex problem" can be shortened to "We need to analyze this problem"
     - "Let's discuss the various different perspectives on this topic" can be shortened to "Let's discuss different perspectives on this topic"
     - "Can you describe in detail your experience from yesterday" can be shortened to "Can you describe yesterday's experience" '''
 
+def get_subtitle_trim_prompt(text, duration):
+ 
+    rule = TRIM_RULE
+
     trim_prompt = f'''
 ## Role
 You are a professional subtitle editor, editing and optimizing lengthy subtitles that exceed voiceover time before handing them to voice actors. 
@@ -362,3 +507,45 @@ Clean the given text by:
 
 Note: Start you answer with ```json and end with ```, do not add any other text.
 '''.strip()
+
+## ================================================================
+# @ ask_gpt(schema=...): JSON schemas of the answers above, local servers turn them into a grammar
+def _json_object(properties):
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+_STRING = {"type": "string"}
+
+def get_split_schema():
+    return _json_object({
+        "analysis": _STRING, "split1": _STRING, "split2": _STRING, "assess": _STRING,
+        "choice": {"type": "string", "enum": ["1", "2"]},
+    })
+
+def get_summary_schema():
+    term = _json_object({"src": _STRING, "tgt": _STRING, "note": _STRING})
+    return _json_object({"theme": _STRING, "terms": {"type": "array", "items": term, "maxItems": 20}})
+
+def get_faithfulness_schema(num_lines):
+    line = _json_object({"origin": _STRING, "direct": _STRING})
+    return _json_object({str(i): line for i in range(1, num_lines + 1)})
+
+def get_expressiveness_schema(num_lines):
+    line = _json_object({"origin": _STRING, "direct": _STRING, "reflect": _STRING, "free": _STRING})
+    return _json_object({str(i): line for i in range(1, num_lines + 1)})
+
+def get_align_schema(num_parts):
+    parts = [_json_object({f"src_part_{i}": _STRING, f"target_part_{i}": _STRING}) for i in range(1, num_parts + 1)]
+    return _json_object({
+        "analysis": _STRING,
+        "align": {"type": "array", "prefixItems": parts, "items": False, "minItems": num_parts, "maxItems": num_parts},
+    })
+
+def get_trim_schema():
+    return _json_object({"analysis": _STRING, "result": _STRING})
+
+def get_correct_text_schema():
+    return _json_object({"text": _STRING})
+
+def get_packed_schema(item_schemas):
+    """Answer of a packed prompt: one entry per item, keyed "1".."n" in pack order."""
+    return _json_object({str(i): schema for i, schema in enumerate(item_schemas, 1)})
@@ -1,9 +1,11 @@
-from core.prompts import generate_shared_prompt, get_prompt_faithfulness, get_prompt_expressiveness
+from core.prompts import generate_theme_prompt, generate_shared_prompt, get_prompt_faithfulness, get_prompt_expressiveness, get_faithfulness_schema, get_expressiveness_schema
 from rich.panel import Panel
 from rich.console import Console
 from rich.table import Table
 from rich import box
 from core.utils import *
+from core.utils.llm_engine import run_sync
+from core.utils.translation_memory import recall_chunk, remember_chunk, similar_translations_prompt
 console = Console()
 
 def valid_translate_result(result: dict, required_keys: list, required_sub_keys: list):
@@ -18,20 +20,46 @@ def valid_translate_result(result: dict, required_keys: list, required_sub_keys:
 
     return {"status": "success", "message": "Translation completed"}
 
-def translate_lines(lines, previous_content_prompt, after_cotent_prompt, things_to_note_prompt, summary_prompt, index = 0):
-    shared_prompt = generate_shared_prompt(previous_content_prompt, after_cotent_prompt, summary_prompt, things_to_note_prompt)
+def valid_translate_prefix(result: dict, required_keys: list, required_sub_keys: list):
+    # Abort only on what ends in a retry anyway: a key the prompt never asked for, or a finished item without its sub-keys.
+    # Keys may still arrive in any order, so a gap is not final.
+    extra = [key for key in result if key not in required_keys]
+    if extra:
+        return {"status": "error", "message": f"Unexpected key(s): {', '.join(extra)}"}
+    for key in result:
+        if not isinstance(result[key], dict) or not all(sub_key in result[key] for sub_key in required_sub_keys):
+            return {"status": "error", "message": f"Missing required sub-key(s) in item {key}"}
+    return {"status": "success", "message": "Prefix ok"}
+
+async def translate_lines_async(lines, previous_content_prompt, after_cotent_prompt, things_to_note_prompt, summary_prompt, index = 0, terms = None):
+    # a chunk whose every line is already in the translation memory skips both LLM calls
+    remembered = recall_chunk(lines, terms)
+    if remembered is not None:
+        console.print(f'[green]📚 Block {index} recalled from translation memory[/green]')
+        return remembered, lines
+
+    theme_prompt = generate_theme_prompt(summary_prompt)
+    shared_prompt = generate_shared_prompt(previous_content_prompt, after_cotent_prompt, things_to_note_prompt,
+                                           similar_translations_prompt(lines, terms))
 
     # Retry translation if the length of the original text and the translated text are not the same, or if the specified key is missing
-    def retry_translation(prompt, length, step_name):
+    async def retry_translation(prompt, length, step_name):
         def valid_faith(response_data):
             return valid_translate_result(response_data, [str(i) for i in range(1, length+1)], ['direct'])
         def valid_express(response_data):
             return valid_translate_result(response_data, [str(i) for i in range(1, length+1)], ['free'])
+        def valid_faith_prefix(response_data):
+            return valid_translate_prefix(response_data, [str(i) for i in range(1, length+1)], ['direct'])
+        def valid_express_prefix(response_data):
+            return valid_translate_prefix(response_data, [str(i) for i in range(1, length+1)], ['free'])
         for retry in range(3):
+            # a retry asks again instead of replaying the cached answer
             if step_name == 'faithfulness':
-                result = ask_gpt(prompt+retry* " ", resp_type='json', valid_def=valid_faith, log_title=f'translate_{step_name}')
+                result = await ask_gpt_async(prompt, resp_type='json', valid_def=valid_faith, log_title=f'translate_{step_name}', valid_prefix_def=valid_faith_prefix,
+                                             use_cache=retry == 0, schema=get_faithfulness_schema(length))
             elif step_name == 'expressiveness':
-                result = ask_gpt(prompt+retry* " ", resp_type='json', valid_def=valid_express, log_title=f'translate_{step_name}')
+                result = await ask_gpt_async(prompt, resp_type='json', valid_def=valid_express, log_title=f'translate_{step_name}', valid_prefix_def=valid_express_prefix,
+                                             use_cache=retry == 0, schema=get_expressiveness_schema(length))
             if len(lines.split('\n')) == len(result):
                 return result
             if retry != 2:
@@ -39,8 +67,8 @@ def translate_lines(lines, previous_content_prompt, after_cotent_prompt, things_
         raise ValueError(f'[red]❌ {step_name.capitalize()} translation of block {index} failed after 3 retries. Please check `output/gpt_log/error.json` for more details.[/red]')
 
     ## Step 1: Faithful to the Original Text
-    prompt1 = get_prompt_faithfulness(lines, shared_prompt)
-    faith_result = retry_translation(prompt1, len(lines.split('\n')), 'faithfulness')
+    prompt1 = get_prompt_faithfulness(lines, shared_prompt, theme_prompt)
+    faith_result = await retry_translation(prompt1, len(lines.split('\n')), 'faithfulness')
 
     for i in faith_result:
         faith_result[i]["direct"] = faith_result[i]["direct"].replace('\n', ' ')
@@ -60,11 +88,12 @@ def translate_lines(lines, previous_content_prompt, after_cotent_prompt, things_
                 table.add_row("[yellow]" + "-" * 50 + "[/yellow]")
         
         console.print(table)
+        remember_chunk(lines, translate_result, terms)
         return translate_result, lines
 
     ## Step 2: Express Smoothly  
-    prompt2 = get_prompt_expressiveness(faith_result, lines, shared_prompt)
-    express_result = retry_translation(prompt2, len(lines.split('\n')), 'expressiveness')
+    prompt2 = get_prompt_expressiveness(faith_result, lines, shared_prompt, theme_prompt)
+    express_result = await retry_translation(prompt2, len(lines.split('\n')), 'expressiveness')
 
     table = Table(title="Translation Results", show_header=False, box=box.ROUNDED)
     table.add_column("Translations", style="bold")
@@ -80,11 +109,15 @@ def translate_lines(lines, previous_content_prompt, after_cotent_prompt, things_
     translate_result = "\n".join([express_result[i]["free"].replace('\n', ' ').strip() for i in express_result])
 
     if len(lines.split('\n')) != len(translate_result.split('\n')):
-        console.print(Panel(f'[red]❌ Translation of block {index} failed, Length Mismatch, Please check `output/gpt_log/translate_expressiveness.json`[/red]'))
+        console.print(Panel(f'[red]❌ Translation of block {index} failed, Length Mismatch, Run `python -m core.utils.gpt_cache export` and check `output/gpt_log/translate_expressiveness.json`[/red]'))
         raise ValueError(f'Origin ···{lines}···,\nbut got ···{translate_result}···')
 
+    remember_chunk(lines, translate_result, terms)
     return translate_result, lines
 
+def translate_lines(lines, previous_content_prompt, after_cotent_prompt, things_to_note_prompt, summary_prompt, index = 0, terms = None):
+    return run_sync(translate_lines_async(lines, previous_content_prompt, after_cotent_prompt, things_to_note_prompt, summary_prompt, index, terms))
+
 
 if __name__ == '__main__':
     # test e.g.
@@ -11,7 +11,7 @@ from core.tts_backend.azure_tts import azure_tts
 from core.tts_backend.edge_tts import edge_tts
 from core.tts_backend.sf_cosyvoice2 import cosyvoice_tts_for_videolingo
 from core.tts_backend.custom_tts import custom_tts
-from core.prompts import get_correct_text_prompt
+from core.prompts import get_correct_text_prompt, get_correct_text_schema
 from core.tts_backend._302_f5tts import f5_tts_for_videolingo
 from core.utils import *
 
@@ -44,7 +44,7 @@ def tts_main(text, save_as, number, task_df):
         try:
             if attempt >= max_retries - 1:
                 print("Asking GPT to correct text...")
-                correct_text = ask_gpt(get_correct_text_prompt(text),resp_type="json", log_title='tts_correct_text')
+                correct_text = ask_gpt(get_correct_text_prompt(text),resp_type="json", log_title='tts_correct_text', schema=get_correct_text_schema())
                 text = correct_text['text']
             if TTS_METHOD == 'openai_tts':
                 openai_tts(text, save_as)
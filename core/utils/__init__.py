@@ -1,10 +1,11 @@
 # use try-except to avoid error when installing
 try:
-    from .ask_gpt import ask_gpt
+    from .ask_gpt import ask_gpt, ask_gpt_async
+    from .llm_engine import llm_map, gather_in_order
     from .decorator import except_handler, check_file_exists
-    from .config_utils import load_key, update_key, get_joiner
+    from .config_utils import load_key, update_key, get_joiner, config_overlay, run_in_context
     from rich import print as rprint
 except ImportError:
     pass
 
-__all__ = ["ask_gpt", "except_handler", "check_file_exists", "load_key", "update_key", "rprint", "get_joiner"]
\ No newline at end of file
+__all__ = ["ask_gpt", "ask_gpt_async", "llm_map", "gather_in_order", "except_handler", "check_file_exists", "load_key", "update_key", "rprint", "get_joiner", "config_overlay", "run_in_context"]
\ No newline at end of file
@@ -1,9 +1,16 @@
-import os
-import json
-from threading import Lock
+import time
 import json_repair
-from openai import OpenAI
 from core.utils.config_utils import load_key
+from core.utils.gpt_cache import get_gpt_cache
+from core.utils.llm_client import client_metrics, print_client_metrics
+from core.utils.llm_router import get_router, print_router_summary
+from core.utils.retry_policy import is_endpoint_failure
+from core.utils.llm_engine import run_sync
+from core.utils.llm_hedge import run_hedged
+from core.utils.local_llm_server import local_server_endpoints, prompt_cache_params
+from core.utils.llm_metrics import LLM_METRICS, report_llm_metrics
+from core.utils.json_stream import JSONStreamWatcher, StreamAborted, STREAM_STATS
+from core.utils.token_count import heuristic_tokens
 from rich import print as rprint
 from core.utils.decorator import except_handler
 
@@ -11,84 +18,210 @@ from core.utils.decorator import except_handler
 # cache gpt response
 # ------------
 
-LOCK = Lock()
-GPT_LOG_FOLDER = 'output/gpt_log'
-
 def _save_cache(model, prompt, resp_content, resp_type, resp, message=None, log_title="default"):
-    with LOCK:
-        logs = []
-        file = os.path.join(GPT_LOG_FOLDER, f"{log_title}.json")
-        os.makedirs(os.path.dirname(file), exist_ok=True)
-        if os.path.exists(file):
-            with open(file, 'r', encoding='utf-8') as f:
-                logs = json.load(f)
-        logs.append({"model": model, "prompt": prompt, "resp_content": resp_content, "resp_type": resp_type, "resp": resp, "message": message})
-        with open(file, 'w', encoding='utf-8') as f:
-            json.dump(logs, f, ensure_ascii=False, indent=4)
-
-def _load_cache(prompt, resp_type, log_title):
-    with LOCK:
-        file = os.path.join(GPT_LOG_FOLDER, f"{log_title}.json")
-        if os.path.exists(file):
-            with open(file, 'r', encoding='utf-8') as f:
-                for item in json.load(f):
-                    if item["prompt"] == prompt and item["resp_type"] == resp_type:
-                        return item["resp"]
+    if log_title == "error":
+        get_gpt_cache().log_error(model, prompt, resp_content, resp_type, resp, message)
+    else:
+        get_gpt_cache().put(model, prompt, resp_content, resp_type, resp, log_title=log_title)
+
+def _load_cache(model, prompt, resp_type):
+    cached = get_gpt_cache().get(model, prompt, resp_type)
+    return cached if cached is not None else False
+
+# ------------
+# streaming
+# ------------
+
+def _stream_enabled():
+    try:
+        return bool(load_key("api.stream"))
+    except KeyError:
         return False
 
+async def _stream_completion(client, params, resp_type, valid_def, valid_prefix_def):
+    """Stream the answer, validating the JSON as it grows; returns (content, chunk count, time to first token)."""
+    started = time.monotonic()
+    ttft = None
+    parts = []
+    watcher = JSONStreamWatcher() if resp_type == "json" else None
+    stream = await client.chat.completions.create(**params, stream=True)
+    try:
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            if ttft is None:
+                ttft = time.monotonic() - started
+            parts.append(delta)
+            if watcher is None:
+                continue
+            events = watcher.feed(delta)
+            for event, text in events:
+                check = valid_def if event == 'done' else valid_prefix_def
+                if check:
+                    valid_resp = check(json_repair.loads(text))
+                    if valid_resp['status'] != 'success':
+                        STREAM_STATS.record(ttft, aborted=True)
+                        raise StreamAborted(valid_resp['message'], ''.join(parts))
+            if watcher.done:
+                # the JSON is complete, skip the closing fence and any chatter after it
+                break
+    finally:
+        await stream.close()
+    STREAM_STATS.record(ttft)
+    return ''.join(parts), len(parts), ttft
+
+# ------------
+# constrained decoding
+# ------------
+
+# the prompts end the answer with a closing fence, anything generated after it is chatter
+JSON_STOP = ["\n```\n"]
+
+def _schema_mode():
+    try:
+        return load_key("api.json_schema") or "auto"
+    except KeyError:
+        return "auto"
+
+def _decoding_params(resp_type, schema, max_tokens, prompt, base_url):
+    """response_format / max_tokens / stop for one request.
+
+    With a schema the answer is generated under a JSON grammar, so it always parses and has every
+    required key. 'auto' only constrains the managed local server (llama.cpp turns the schema into a
+    GBNF grammar), 'on' also sends an OpenAI json_schema response format to other endpoints.
+    """
+    mode = _schema_mode()
+    local = local_server_endpoints(base_url) is not None
+    if resp_type != "json" or not schema or mode == "off" or (mode == "auto" and not local):
+        return {"response_format": {"type": "json_object"}} if resp_type == "json" and load_key("api.llm_support_json") else {}
+    if local:
+        response_format = {"type": "json_object", "schema": schema}
+    else:
+        response_format = {"type": "json_schema", "json_schema": {"name": "answer", "schema": schema}}
+    # answers restate their input at most a few times over, a longer generation is a runaway
+    return {"response_format": response_format, "max_tokens": max_tokens or 512 + len(prompt) // 2, "stop": JSON_STOP}
+
 # ------------
 # ask gpt once
 # ------------
 
 @except_handler("GPT request failed", retry=5)
-def ask_gpt(prompt, resp_type=None, valid_def=None, log_title="default"):
+async def ask_gpt_async(prompt, resp_type=None, valid_def=None, log_title="default", valid_prefix_def=None, use_cache=True,
+                        schema=None, max_tokens=None):
     if not load_key("api.key"):
         raise ValueError("API key is not set")
-    # check cache
-    cached = _load_cache(prompt, resp_type, log_title)
+    model = load_key("api.model")
+    # check cache, `use_cache=False` asks again and overwrites the cached answer
+    cached = _load_cache(model, prompt, resp_type) if use_cache else False
     if cached:
         rprint("use cache response")
+        LLM_METRICS.record_cache_hit(log_title)
         return cached
 
-    model = load_key("api.model")
-    base_url = load_key("api.base_url")
-    if 'ark' in base_url:
-        base_url = "https://ark.cn-beijing.volces.com/api/v3" # huoshan base url
-    elif 'v1' not in base_url:
-        base_url = base_url.strip('/') + '/v1'
-    client = OpenAI(api_key=load_key("api.key"), base_url=base_url)
-    response_format = {"type": "json_object"} if resp_type == "json" and load_key("api.llm_support_json") else None
-
-    messages = [{"role": "user", "content": prompt}]
-
-    params = dict(
-        model=model,
-        messages=messages,
-        response_format=response_format,
-        timeout=300
-    )
-    resp_raw = client.chat.completions.create(**params)
-
-    # process and return full result
-    resp_content = resp_raw.choices[0].message.content
-    if resp_type == "json":
-        resp = json_repair.loads(resp_content)
-    else:
-        resp = resp_content
-    
-    # check if the response format is valid
-    if valid_def:
-        valid_resp = valid_def(resp)
-        if valid_resp['status'] != 'success':
-            _save_cache(model, prompt, resp_content, resp_type, resp, log_title="error", message=valid_resp['message'])
-            raise ValueError(f"❎ API response error: {valid_resp['message']}")
+    router = get_router()
+
+    async def _attempt(race):
+        params = dict(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=300
+        )
+        # endpoints are interchangeable, an unreachable one hands the request to the next before any backoff;
+        # a hedged duplicate prefers an endpoint the original is not waiting on
+        tried = []
+        avoid = list(race.busy) if router.has_alternative(race.busy) else []
+        while True:
+            endpoint = await router.pick(exclude=tried + avoid)
+            race.busy.append(endpoint)
+            params["model"] = endpoint.model or model
+            for key in ("response_format", "max_tokens", "stop"):
+                params.pop(key, None)
+            params.update(_decoding_params(resp_type, schema, max_tokens, prompt, endpoint.base_url))
+            # llama.cpp keeps the KV cache of the shared prompt prefix between requests
+            extra_body = prompt_cache_params(endpoint.base_url)
+            if extra_body:
+                params["extra_body"] = extra_body
+            else:
+                params.pop("extra_body", None)
+            usage, ttft = None, None
+            try:
+                async with endpoint.request() as slot:
+                    race.sent.set()
+                    started = time.monotonic()
+                    if _stream_enabled():
+                        resp_content, slot.tokens, ttft = await _stream_completion(endpoint.client, params, resp_type, valid_def, valid_prefix_def)
+                    else:
+                        resp_raw = await endpoint.client.chat.completions.create(**params)
+                        resp_content = resp_raw.choices[0].message.content
+                        usage = resp_raw.usage
+                        slot.tokens = usage.completion_tokens if usage else None
+                    latency = time.monotonic() - started
+            except StreamAborted as e:
+                endpoint.record_success()
+                LLM_METRICS.record_failure(log_title, "validation")
+                _save_cache(model, prompt, e.content, resp_type, None, log_title="error", message=f"aborted mid-stream: {e.message}")
+                raise ValueError(f"❎ API response error (stream aborted early): {e.message}")
+            except Exception as e:
+                endpoint.record_failure(e)
+                LLM_METRICS.record_failure(log_title, "api")
+                tried.append(endpoint)
+                avoid = []
+                if is_endpoint_failure(e) and router.has_alternative(tried):
+                    rprint(f"[yellow]🔀 {endpoint.base_url} failed ({e.__class__.__name__}), failing over[/yellow]")
+                    continue
+                raise
+            endpoint.record_success()
+            break
+        # streamed answers carry no usage block, estimate from the text
+        LLM_METRICS.record_request(
+            log_title, latency,
+            prompt_tokens=usage.prompt_tokens if usage else heuristic_tokens(prompt),
+            completion_tokens=usage.completion_tokens if usage else heuristic_tokens(resp_content),
+            ttft=ttft,
+        )
 
+        try:
+            # process and return full result
+            if resp_type == "json":
+                resp = json_repair.loads(resp_content)
+            else:
+                resp = resp_content
+
+            # check if the response format is valid
+            if valid_def:
+                valid_resp = valid_def(resp)
+                if valid_resp['status'] != 'success':
+                    _save_cache(model, prompt, resp_content, resp_type, resp, log_title="error", message=valid_resp['message'])
+                    raise ValueError(f"❎ API response error: {valid_resp['message']}")
+        except ValueError:
+            LLM_METRICS.record_failure(log_title, "validation")
+            raise
+        except Exception as e:
+            # a validator tripping over an unexpected answer shape is a bad answer, not a bug, so keep it retryable
+            LLM_METRICS.record_failure(log_title, "validation")
+            raise ValueError(f"❎ API response error: unexpected answer shape ({e.__class__.__name__}: {e})") from e
+        return resp_content, resp
+
+    # a slow answer past the stage's latency percentile gets a duplicate, the first valid one wins
+    resp_content, resp = await run_hedged(_attempt, log_title)
     _save_cache(model, prompt, resp_content, resp_type, resp, log_title=log_title)
     return resp
 
+def ask_gpt(prompt, resp_type=None, valid_def=None, log_title="default", valid_prefix_def=None, use_cache=True,
+            schema=None, max_tokens=None):
+    """Blocking facade over `ask_gpt_async` for callers that are not coroutines."""
+    return run_sync(ask_gpt_async(prompt, resp_type=resp_type, valid_def=valid_def, log_title=log_title,
+                                  valid_prefix_def=valid_prefix_def, use_cache=use_cache, schema=schema, max_tokens=max_tokens))
+
 
 if __name__ == '__main__':
     from rich import print as rprint
     
     result = ask_gpt("""test respond ```json\n{\"code\": 200, \"message\": \"success\"}\n```""", resp_type="json")
     rprint(f"Test json output result: {result}")
+    print_client_metrics()
+    print_router_summary()
+    report_llm_metrics(connections=client_metrics())
+    if _stream_enabled():
+        rprint(f"Stream stats: {STREAM_STATS.snapshot()}")
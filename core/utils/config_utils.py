@@ -1,4 +1,8 @@
 from ruamel.yaml import YAML
+from contextlib import contextmanager
+import contextvars
+import copy
+import os
 import threading
 
 CONFIG_PATH = 'config.yaml'
@@ -8,27 +12,163 @@ yaml = YAML()
 yaml.preserve_quotes = True
 
 # -----------------------
-# load & update config
+# cached config snapshot
 # -----------------------
 
-def load_key(key):
+class ConfigSnapshot:
+    """Parsed config.yaml as plain dict/list/scalar values, tied to the file signature it was read from."""
+    __slots__ = ("data", "signature")
+
+    def __init__(self, data, signature):
+        self.data = data
+        self.signature = signature
+
+    def get(self, key):
+        value = self.data
+        for k in key.split('.'):
+            if isinstance(value, dict) and k in value:
+                value = value[k]
+            else:
+                raise KeyError(f"Key '{k}' not found in configuration")
+        return value
+
+_snapshot = None
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def _to_plain(value):
+    """Convert ruamel round-trip containers and scalar subclasses into builtin types."""
+    if isinstance(value, dict):
+        return {str(k): _to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(v) for v in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    return value
+
+def _read_config():
+    with open(CONFIG_PATH, 'r', encoding='utf-8') as file:
+        return yaml.load(file)
+
+def _get_snapshot():
+    # lock-free fast path: one stat() and an attribute read
+    global _snapshot
+    signature = _file_signature(CONFIG_PATH)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.signature == signature:
+        return snapshot
+    with lock:
+        signature = _file_signature(CONFIG_PATH)
+        if _snapshot is None or _snapshot.signature != signature:
+            _snapshot = ConfigSnapshot(_to_plain(_read_config()), signature)
+        return _snapshot
+
+def reload_config():
+    """Drop the cached snapshot so the next `load_key` re-parses config.yaml."""
+    global _snapshot
     with lock:
-        with open(CONFIG_PATH, 'r', encoding='utf-8') as file:
-            data = yaml.load(file)
+        _snapshot = None
+
+# -----------------------
+# per-job config overlay
+# -----------------------
 
+_overlay = contextvars.ContextVar("config_overlay", default=None)
+
+@contextmanager
+def config_overlay(overrides=None):
+    """Scope dotted-key overrides to the current job instead of rewriting config.yaml.
+
+    Inside the block `load_key` consults the overrides first and `update_key` writes into
+    them, so concurrent jobs never see each other's values. Nested blocks inherit the outer
+    overrides. Worker threads only see the overlay when started through `run_in_context`.
+    """
+    parent = _overlay.get()
+    layer = dict(parent) if parent else {}
+    layer.update(overrides or {})
+    token = _overlay.set(layer)
+    try:
+        yield layer
+    finally:
+        _overlay.reset(token)
+
+def run_in_context(executor, func, *args, **kwargs):
+    """`executor.submit` that carries the caller's config overlay into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+def _overlay_lookup(overlay, key):
+    if key in overlay:
+        return True, overlay[key]
     keys = key.split('.')
-    value = data
-    for k in keys:
-        if isinstance(value, dict) and k in value:
-            value = value[k]
-        else:
-            raise KeyError(f"Key '{k}' not found in configuration")
+    for i in range(len(keys) - 1, 0, -1):
+        parent = '.'.join(keys[:i])
+        if parent in overlay:
+            value = overlay[parent]
+            for k in keys[i:]:
+                if isinstance(value, dict) and k in value:
+                    value = value[k]
+                else:
+                    return False, None
+            return True, value
+    return False, None
+
+def _overlay_merge(overlay, key, value):
+    prefix = key + '.'
+    nested = [(k[len(prefix):], v) for k, v in overlay.items() if k.startswith(prefix)]
+    if not nested or not isinstance(value, dict):
+        return value
+    value = copy.deepcopy(value)
+    for sub_key, sub_value in nested:
+        current = value
+        parts = sub_key.split('.')
+        for k in parts[:-1]:
+            current = current.setdefault(k, {})
+        current[parts[-1]] = sub_value
+    return value
+
+# -----------------------
+# load & update config
+# -----------------------
+
+def load_key(key):
+    overlay = _overlay.get()
+    if overlay:
+        found, value = _overlay_lookup(overlay, key)
+        if not found:
+            value = _overlay_merge(overlay, key, _get_snapshot().get(key))
+    else:
+        value = _get_snapshot().get(key)
+    # containers are shared by every caller, hand out copies so nobody mutates the snapshot
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
     return value
 
 def update_key(key, new_value):
+    global _snapshot
+    overlay = _overlay.get()
+    if overlay is not None:
+        # same contract as writing the file: only keys config.yaml (or the overlay itself) already has
+        if not _overlay_lookup(overlay, key)[0]:
+            keys = key.split('.')
+            parent = _get_snapshot().data
+            for k in keys[:-1]:
+                if not (isinstance(parent, dict) and k in parent):
+                    return False
+                parent = parent[k]
+            if not (isinstance(parent, dict) and keys[-1] in parent):
+                raise KeyError(f"Key '{keys[-1]}' not found in configuration")
+        overlay[key] = new_value
+        return True
     with lock:
-        with open(CONFIG_PATH, 'r', encoding='utf-8') as file:
-            data = yaml.load(file)
+        data = _read_config()
 
         keys = key.split('.')
         current = data
@@ -42,10 +182,11 @@ def update_key(key, new_value):
             current[keys[-1]] = new_value
             with open(CONFIG_PATH, 'w', encoding='utf-8') as file:
                 yaml.dump(data, file)
+            _snapshot = ConfigSnapshot(_to_plain(data), _file_signature(CONFIG_PATH))
             return True
         else:
             raise KeyError(f"Key '{keys[-1]}' not found in configuration")
-        
+
 # basic utils
 def get_joiner(language):
     if language in load_key('language_split_with_space'):
@@ -1,14 +1,42 @@
+import asyncio
 import functools
+import inspect
 import time
 import os
 from rich import print as rprint
+from core.utils.retry_policy import DEFAULT_POLICY
 
 # ------------------------------
 # retry decorator
 # ------------------------------
 
-def except_handler(error_msg, retry=0, delay=1, default_return=None):
+def except_handler(error_msg, retry=0, delay=1, default_return=None, policy=None):
+    """Retry `func` up to `retry` times with the policy's backoff (full jitter, Retry-After aware).
+
+    Errors the policy deems fatal (programming errors, auth/bad request) are raised at once.
+    """
+    policy = policy or DEFAULT_POLICY
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            # coroutines back off with asyncio.sleep, so a waiting retry does not hold a thread
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                last_exception = None
+                for i in range(retry + 1):
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        last_exception = e
+                        fatal = not policy.should_retry(e)
+                        rprint(f"[red]{error_msg}: {e}, retry: {i+1}/{retry}{' (not retryable)' if fatal else ''}[/red]")
+                        if i == retry or fatal:
+                            if default_return is not None:
+                                return default_return
+                            raise last_exception
+                        await asyncio.sleep(policy.backoff(i, delay, e))
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             last_exception = None
@@ -17,12 +45,13 @@ def except_handler(error_msg, retry=0, delay=1, default_return=None):
                     return func(*args, **kwargs)
                 except Exception as e:
                     last_exception = e
-                    rprint(f"[red]{error_msg}: {e}, retry: {i+1}/{retry}[/red]")
-                    if i == retry:
+                    fatal = not policy.should_retry(e)
+                    rprint(f"[red]{error_msg}: {e}, retry: {i+1}/{retry}{' (not retryable)' if fatal else ''}[/red]")
+                    if i == retry or fatal:
                         if default_return is not None:
                             return default_return
                         raise last_exception
-                    time.sleep(delay * (2**i))
+                    time.sleep(policy.backoff(i, delay, e))
         return wrapper
     return decorator
 
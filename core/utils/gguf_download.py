@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from rich import print as rprint
+from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn, TextColumn
+
+PIECE_SIZE = 64 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+# ------------
+# remote metadata
+# ------------
+
+def remote_info(url, timeout=30):
+    """Size, sha256 and range support of a download.
+
+    The Hugging Face `resolve` endpoint answers with a redirect to the CDN and carries the LFS
+    sha256 in `X-Linked-Etag` and the size in `X-Linked-Size`; plain servers only give Content-Length.
+    """
+    head = requests.head(url, allow_redirects=False, timeout=timeout)
+    sha256, size = None, None
+    etag = (head.headers.get("X-Linked-Etag") or head.headers.get("ETag") or "").strip('W/"')
+    if re.fullmatch(r"[0-9a-f]{64}", etag):
+        sha256 = etag
+    if head.headers.get("X-Linked-Size"):
+        size = int(head.headers["X-Linked-Size"])
+    if head.is_redirect:
+        head = requests.head(url, allow_redirects=True, timeout=timeout)
+    head.raise_for_status()
+    if size is None and head.headers.get("Content-Length"):
+        size = int(head.headers["Content-Length"])
+    ranges = head.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return {"url": head.url, "size": size, "sha256": sha256, "ranges": ranges}
+
+# ------------
+# resumable ranged download
+# ------------
+
+class _PieceState:
+    """Finished pieces of `<dest>.part`, persisted next to it so a rerun only fetches what is missing."""
+
+    def __init__(self, path, size, sha256):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.done = set()
+        self._lock = threading.Lock()
+        if path.exists():
+            try:
+                state = json.loads(path.read_text(encoding="utf-8"))
+                if state.get("size") == size and state.get("sha256") == sha256 and state.get("piece_size") == PIECE_SIZE:
+                    self.done = set(state.get("done", []))
+            except (OSError, ValueError):
+                pass
+
+    def mark(self, index):
+        with self._lock:
+            self.done.add(index)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps({"size": self.size, "sha256": self.sha256, "piece_size": PIECE_SIZE,
+                                       "done": sorted(self.done)}), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+class RangeMismatch(IOError):
+    """The server answered a range request with other bytes than asked for."""
+
+def _check_range(response, start, end, size):
+    if response.status_code != 206:
+        raise RangeMismatch(f"server ignored the range request for bytes {start}-{end} (HTTP {response.status_code})")
+    content_range = response.headers.get("Content-Range", "")
+    match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range.strip())
+    if not match or (int(match.group(1)), int(match.group(2))) != (start, end) or match.group(3) not in ("*", str(size)):
+        raise RangeMismatch(f"asked for bytes {start}-{end}/{size}, server sent '{content_range}'")
+
+def _fetch_piece(url, part_path, start, end, size, advance, timeout):
+    headers = {"Range": f"bytes={start}-{end}"}
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        _check_range(response, start, end, size)
+        written = 0
+        with open(part_path, "r+b") as f:
+            f.seek(start)
+            for chunk in response.iter_content(chunk_size=READ_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    written += len(chunk)
+                    advance(len(chunk))
+    if written != end - start + 1:
+        raise IOError(f"Piece {start}-{end} ended after {written} bytes")
+
+def _fetch_stream(url, part_path, advance, timeout):
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(part_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=READ_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    advance(len(chunk))
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_SIZE * 8), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def download_file(url, dest_path, connections=4, sha256=None, timeout=60):
+    """Download `url` to `dest_path` through `<dest>.part`, renamed into place only once complete and verified.
+
+    With range support the file is fetched in 64 MiB pieces over `connections` parallel requests and an
+    interrupted run resumes from the finished pieces. The sha256 comes from the server metadata unless given.
+    """
+    dest_path = Path(dest_path)
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = dest_path.with_name(dest_path.name + ".part")
+    state_path = dest_path.with_name(dest_path.name + ".part.json")
+
+    info = remote_info(url, timeout=timeout)
+    sha256 = (sha256 or info["sha256"] or "").lower() or None
+    size = info["size"]
+
+    with Progress(TextColumn("[cyan]{task.description}"), BarColumn(), DownloadColumn(), TransferSpeedColumn(),
+                  TimeRemainingColumn(), transient=True) as progress:
+        task = progress.add_task(f"⬇️ {dest_path.name}", total=size)
+        advance = lambda n: progress.update(task, advance=n)
+
+        if info["ranges"] and size:
+            state = _PieceState(state_path, size, sha256)
+            if not part_path.exists() or part_path.stat().st_size != size:
+                state.done = set()
+                with open(part_path, "wb") as f:
+                    f.truncate(size)
+            pieces = [(i, start, min(start + PIECE_SIZE, size) - 1) for i, start in enumerate(range(0, size, PIECE_SIZE))]
+            pending = [p for p in pieces if p[0] not in state.done]
+            if len(pending) < len(pieces):
+                rprint(f"[cyan]↩️ Resuming {dest_path.name}: {len(pieces) - len(pending)}/{len(pieces)} pieces already on disk[/cyan]")
+            progress.update(task, completed=sum(end - start + 1 for i, start, end in pieces if i in state.done))
+
+            def _run(piece):
+                index, start, end = piece
+                _fetch_piece(info["url"], part_path, start, end, size, advance, timeout)
+                state.mark(index)
+
+            try:
+                with ThreadPoolExecutor(max_workers=max(int(connections), 1)) as pool:
+                    for future in [pool.submit(_run, piece) for piece in pending]:
+                        future.result()
+            except RangeMismatch as e:
+                # the pieces on disk cannot be trusted to sit at their offsets, fetch the whole file again
+                rprint(f"[yellow]⚠️ {dest_path.name}: {e}, restarting the download from the first byte[/yellow]")
+                state_path.unlink(missing_ok=True)
+                progress.update(task, completed=0)
+                _fetch_stream(info["url"], part_path, advance, timeout)
+        else:
+            _fetch_stream(info["url"], part_path, advance, timeout)
+
+    if size is not None and part_path.stat().st_size != size:
+        raise IOError(f"{dest_path.name}: got {part_path.stat().st_size} bytes, expected {size}")
+    if sha256:
+        actual = file_sha256(part_path)
+        if actual != sha256:
+            part_path.unlink()
+            state_path.unlink(missing_ok=True)
+            raise ValueError(f"{dest_path.name}: sha256 mismatch (expected {sha256}, got {actual}), removed the download")
+        rprint(f"[green]🔒 sha256 verified for {dest_path.name}[/green]")
+    os.replace(part_path, dest_path)
+    state_path.unlink(missing_ok=True)
+    return dest_path
+
+def hf_resolve_url(repo, filename, revision="main"):
+    endpoint = os.environ.get("HF_ENDPOINT", "https://huggingface.co").rstrip("/")
+    return f"{endpoint}/{repo}/resolve/{revision}/{filename}"
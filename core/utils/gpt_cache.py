@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import glob
+import time
+import sqlite3
+import hashlib
+from threading import Lock
+from rich import print as rprint
+from core.utils.config_utils import load_key
+
+GPT_LOG_FOLDER = 'output/gpt_log'
+CACHE_DB = os.path.join(GPT_LOG_FOLDER, 'cache.db')
+EVICT_EVERY = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    prompt TEXT,
+    resp_type TEXT,
+    resp_content TEXT,
+    resp TEXT,
+    log_title TEXT,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created_at);
+CREATE TABLE IF NOT EXISTS errors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT,
+    prompt TEXT,
+    resp_type TEXT,
+    resp_content TEXT,
+    resp TEXT,
+    message TEXT,
+    created_at REAL
+);
+"""
+
+# ------------
+# settings
+# ------------
+
+def _cache_setting(name, default):
+    try:
+        value = load_key(f"gpt_cache.{name}")
+    except KeyError:
+        return default
+    return default if value is None else value
+
+def cache_key(model, prompt, resp_type):
+    """Stable key for one request. Only the logical model name goes in, never the endpoint."""
+    digest = hashlib.sha256()
+    for part in (model, resp_type, prompt):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+# ------------
+# sqlite store
+# ------------
+
+class GPTCache:
+    """Hashed key/value store of validated LLM responses, one SQLite file per output folder.
+
+    Lookups hit the primary key index instead of scanning a JSON list, and writes append a
+    row instead of rewriting the log. The connection is reopened whenever the db file is
+    replaced, e.g. after `output/` is archived or wiped between videos.
+    """
+
+    def __init__(self, path=CACHE_DB):
+        self.path = path
+        self._lock = Lock()
+        self._conn = None
+        self._inode = None
+        self._puts = 0
+
+    def _connect(self):
+        inode = os.stat(self.path).st_ino if os.path.exists(self.path) else None
+        if self._conn is not None and inode == self._inode:
+            return self._conn
+        if self._conn is not None:
+            self._conn.close()
+        fresh = inode is None
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.executescript(_SCHEMA)
+        self._inode = os.stat(self.path).st_ino
+        if fresh:
+            self._import_json_logs(os.path.dirname(self.path))
+        return self._conn
+
+    def get(self, model, prompt, resp_type):
+        ttl_days = _cache_setting("ttl_days", 0)
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT resp, created_at FROM responses WHERE key = ?",
+                (cache_key(model, prompt, resp_type),),
+            ).fetchone()
+        if row is None:
+            return None
+        if ttl_days and row[1] < time.time() - ttl_days * 86400:
+            return None
+        return json.loads(row[0])
+
+    def put(self, model, prompt, resp_content, resp_type, resp, log_title="default"):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(model, prompt, resp_type), model, prompt, resp_type, resp_content,
+                 json.dumps(resp, ensure_ascii=False), log_title, time.time()),
+            )
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict()
+        self._debug_dump(log_title, model, prompt, resp_content, resp_type, resp)
+
+    def log_error(self, model, prompt, resp_content, resp_type, resp, message):
+        """Record a response that failed validation. Failures are rare, so `error.json` stays up to date."""
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO errors (model, prompt, resp_type, resp_content, resp, message, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model, prompt, resp_type, resp_content, json.dumps(resp, ensure_ascii=False), message, time.time()),
+            )
+        self.export_json_logs(only_errors=True)
+
+    def _evict(self):
+        conn = self._connect()
+        ttl_days = _cache_setting("ttl_days", 0)
+        max_entries = _cache_setting("max_entries", 0)
+        if ttl_days:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - ttl_days * 86400,))
+        if max_entries:
+            conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            )
+
+    def _debug_dump(self, log_title, model, prompt, resp_content, resp_type, resp, message=None):
+        """Optional human-readable trail: one JSON object per line, appended in O(1)."""
+        if not _cache_setting("debug_dump", False):
+            return
+        file = os.path.join(os.path.dirname(self.path), f"{log_title}.jsonl")
+        entry = {"model": model, "prompt": prompt, "resp_content": resp_content, "resp_type": resp_type, "resp": resp, "message": message}
+        with self._lock:
+            with open(file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    # ------------
+    # migration & export
+    # ------------
+
+    def _import_json_logs(self, folder):
+        """Load legacy `<log_title>.json` lists so restored runs keep their cache."""
+        imported = 0
+        for file in glob.glob(os.path.join(folder, '*.json')):
+            log_title = os.path.splitext(os.path.basename(file))[0]
+            try:
+                with open(file, 'r', encoding='utf-8') as f:
+                    logs = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for item in logs:
+                if log_title == 'error':
+                    self._conn.execute(
+                        "INSERT INTO errors (model, prompt, resp_type, resp_content, resp, message, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (item.get("model"), item.get("prompt"), item.get("resp_type"), item.get("resp_content"),
+                         json.dumps(item.get("resp"), ensure_ascii=False), item.get("message"), time.time()),
+                    )
+                    continue
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (cache_key(item.get("model"), item["prompt"], item.get("resp_type")), item.get("model"), item["prompt"],
+                     item.get("resp_type"), item.get("resp_content"), json.dumps(item.get("resp"), ensure_ascii=False),
+                     log_title, time.time()),
+                )
+                imported += 1
+        if imported:
+            rprint(f"[cyan]📦 Imported {imported} cached responses from legacy gpt_log files[/cyan]")
+
+    def export_json_logs(self, folder=None, only_errors=False):
+        """Write the classic `<log_title>.json` lists (including `error.json`) for manual inspection."""
+        folder = folder or os.path.dirname(self.path)
+        logs = {}
+        rows = []
+        with self._lock:
+            conn = self._connect()
+            if not only_errors:
+                rows = conn.execute(
+                    "SELECT log_title, model, prompt, resp_content, resp_type, resp FROM responses ORDER BY created_at"
+                ).fetchall()
+            errors = conn.execute(
+                "SELECT model, prompt, resp_content, resp_type, resp, message FROM errors ORDER BY id"
+            ).fetchall()
+        for log_title, model, prompt, resp_content, resp_type, resp in rows:
+            logs.setdefault(log_title, []).append(
+                {"model": model, "prompt": prompt, "resp_content": resp_content, "resp_type": resp_type, "resp": json.loads(resp), "message": None})
+        for model, prompt, resp_content, resp_type, resp, message in errors:
+            logs.setdefault("error", []).append(
+                {"model": model, "prompt": prompt, "resp_content": resp_content, "resp_type": resp_type, "resp": json.loads(resp), "message": message})
+        os.makedirs(folder, exist_ok=True)
+        for log_title, items in logs.items():
+            with open(os.path.join(folder, f"{log_title}.json"), 'w', encoding='utf-8') as f:
+                json.dump(items, f, ensure_ascii=False, indent=4)
+        return list(logs)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._inode = None
+
+_CACHE = None
+_CACHE_LOCK = Lock()
+
+def get_gpt_cache():
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = GPTCache()
+    return _CACHE
+
+if __name__ == '__main__':
+    # python -m core.utils.gpt_cache export [folder]
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        titles = get_gpt_cache().export_json_logs(sys.argv[2] if len(sys.argv) > 2 else None)
+        rprint(f"[green]✅ Exported gpt logs: {', '.join(titles) or 'nothing cached'}[/green]")
+    else:
+        rprint("Usage: python -m core.utils.gpt_cache export [folder]")
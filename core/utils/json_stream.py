@@ -0,0 +1,96 @@
+import threading
+
+# ------------
+# incremental json scanner
+# ------------
+
+class JSONStreamWatcher:
+    """Follows a streamed LLM answer and reports structural milestones of its first JSON value.
+
+    Text before the first `{`/`[` (e.g. a ```json fence) is skipped. `feed()` returns events:
+    ('member', text) once a top-level member is complete, with the value closed so far, and
+    ('done', text) when the top-level value closes. Both texts are valid JSON.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.start = None
+        self.depth = 0
+        self.closer = None
+        self.in_string = False
+        self.escape = False
+        self.done = False
+
+    def feed(self, delta):
+        events = []
+        base = len(self.text)
+        self.text += delta
+        for offset, ch in enumerate(delta):
+            if self.done:
+                break
+            pos = base + offset
+            if self.start is None:
+                if ch in '{[':
+                    self.start = pos
+                    self.depth = 1
+                    self.closer = '}' if ch == '{' else ']'
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+            if ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                self.depth += 1
+            elif ch in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+                    events.append(('done', self.text[self.start:pos + 1]))
+            elif ch == ',' and self.depth == 1:
+                events.append(('member', self.text[self.start:pos] + self.closer))
+        return events
+
+class StreamAborted(ValueError):
+    """Raised when a streamed answer provably fails validation before generation finished."""
+
+    def __init__(self, message, content):
+        super().__init__(message)
+        self.message = message
+        self.content = content
+
+# ------------
+# time to first token
+# ------------
+
+class StreamStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.aborted = 0
+        self.ttft_total = 0.0
+        self.ttft_max = 0.0
+
+    def record(self, ttft, aborted=False):
+        with self._lock:
+            self.streams += 1
+            self.aborted += int(aborted)
+            if ttft is not None:
+                self.ttft_total += ttft
+                self.ttft_max = max(self.ttft_max, ttft)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "streams": self.streams,
+                "aborted": self.aborted,
+                "ttft_avg": self.ttft_total / self.streams if self.streams else 0.0,
+                "ttft_max": self.ttft_max,
+            }
+
+STREAM_STATS = StreamStats()
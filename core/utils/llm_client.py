@@ -0,0 +1,127 @@
+import threading
+from functools import lru_cache
+
+import httpx
+from openai import AsyncOpenAI
+from rich import print as rprint
+
+from core.utils.config_utils import load_key
+
+# ------------
+# base url
+# ------------
+
+@lru_cache(maxsize=None)
+def normalize_base_url(base_url):
+    if 'ark' in base_url:
+        return "https://ark.cn-beijing.volces.com/api/v3" # huoshan base url
+    if 'v1' not in base_url:
+        return base_url.strip('/') + '/v1'
+    return base_url
+
+# ------------
+# connection reuse metrics
+# ------------
+
+class ClientMetrics:
+    """Counts requests against new TCP connections / TLS handshakes, via the httpcore trace hook."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+
+    async def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.on_trace
+
+    async def on_trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(self.requests - self.connections, 0)
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "tls_handshakes": self.tls_handshakes,
+                "reused": reused,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            }
+
+# ------------
+# client registry
+# ------------
+
+_CLIENTS = {}
+_METRICS = {}
+_LOCK = threading.Lock()
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _pool_size():
+    # enough keep-alive connections for the highest concurrency the limiter may reach
+    size = 1
+    for key in ("max_workers", "llm_concurrency.max"):
+        try:
+            size = max(size, int(load_key(key)))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return size
+
+def get_async_client(base_url, api_key):
+    """One AsyncOpenAI client (and one keep-alive connection pool) per (base_url, api_key) for the whole process.
+
+    The clients are bound to the LLM engine loop, only use them from coroutines running there.
+    """
+    key = (normalize_base_url(base_url), api_key)
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            pool = _pool_size()
+            metrics = ClientMetrics()
+            http_client = httpx.AsyncClient(
+                http2=_http2_available(),
+                limits=httpx.Limits(max_connections=pool * 2, max_keepalive_connections=pool, keepalive_expiry=120),
+                timeout=httpx.Timeout(300, connect=10),
+                event_hooks={"request": [metrics.on_request]},
+            )
+            # retries are owned by except_handler's policy and the circuit breaker, not the SDK
+            client = AsyncOpenAI(api_key=api_key, base_url=key[0], http_client=http_client, max_retries=0)
+            _CLIENTS[key] = client
+            _METRICS[key] = metrics
+    return client
+
+def client_metrics():
+    """Connection reuse per endpoint, e.g. {'http://127.0.0.1:8000/v1': {'requests': 120, 'connections': 2, ...}}."""
+    with _LOCK:
+        items = list(_METRICS.items())
+    return {base_url: metrics.snapshot() for (base_url, _), metrics in items}
+
+async def close_clients():
+    with _LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+        _METRICS.clear()
+    for client in clients:
+        await client.close()
+
+def print_client_metrics():
+    for base_url, stats in client_metrics().items():
+        rprint(f"[cyan]🔌 {base_url}: {stats['requests']} requests over {stats['connections']} connections "
+               f"({stats['reuse_ratio']:.0%} reused, {stats['tls_handshakes']} TLS handshakes)[/cyan]")
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from rich import print as rprint
+
+# ------------
+# overload detection
+# ------------
+
+def is_overload_error(exc):
+    """429, 5xx, timeouts and dropped connections mean the endpoint is saturated."""
+    try:
+        import openai
+        if isinstance(exc, (openai.RateLimitError, openai.InternalServerError, openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+        if isinstance(exc, openai.APIStatusError):
+            return exc.status_code == 429 or exc.status_code >= 500
+    except ImportError:
+        pass
+    try:
+        import httpx
+        if isinstance(exc, (httpx.TimeoutException, httpx.NetworkError)):
+            return True
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code == 429 or exc.response.status_code >= 500
+    except ImportError:
+        pass
+    return isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError))
+
+# ------------
+# AIMD limiter
+# ------------
+
+class AIMDLimiter:
+    """Adaptive concurrency limit shared by every LLM caller.
+
+    Additive increase: each healthy response adds 1/limit, i.e. about +1 per round trip.
+    Multiplicative decrease: an overload error halves the limit, and latency per token
+    drifting above `latency_tolerance` x the best observed value shrinks it by 10%.
+    A decrease only reacts to requests started after the previous decrease, so one burst
+    of 429s counts once.
+    """
+
+    def __init__(self, initial=1, minimum=1, maximum=32, latency_tolerance=2.0, adaptive=True, name="llm"):
+        self.minimum = max(int(minimum), 1)
+        self.maximum = max(int(maximum), self.minimum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_tolerance = latency_tolerance
+        self.adaptive = adaptive
+        self.name = name
+        self.in_flight = 0
+        self.history = []
+        self._baseline = None
+        self._smoothed = None
+        self._last_decrease = 0.0
+        self._condition = None
+
+    @property
+    def level(self):
+        return max(int(self.limit), self.minimum)
+
+    async def acquire(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.level)
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started, error=None, tokens=None):
+        if self.adaptive:
+            self._feedback(started, error, tokens)
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _feedback(self, started, error, tokens):
+        before = self.level
+        now = time.monotonic()
+        if error is not None:
+            if is_overload_error(error) and started >= self._last_decrease:
+                self.limit = max(self.minimum, self.limit * 0.5)
+                self._last_decrease = now
+        else:
+            latency = (now - started) / max(tokens or 1, 1)
+            self._smoothed = latency if self._smoothed is None else 0.8 * self._smoothed + 0.2 * latency
+            self._baseline = self._smoothed if self._baseline is None else min(self._baseline, self._smoothed)
+            if self._smoothed > self._baseline * self.latency_tolerance:
+                if started >= self._last_decrease:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        if self.level != before:
+            self.history.append((now, self.level))
+            rprint(f"[cyan]⚖️ {self.name} concurrency {before} → {self.level}[/cyan]")
+
+class _Slot:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.tokens = None
+        self._started = None
+
+    async def __aenter__(self):
+        self._started = await self.limiter.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.limiter.release(self._started, error=exc, tokens=self.tokens)
+        return False
+
+def limiter_slot(limiter):
+    """`async with limiter_slot(l) as slot:`; set `slot.tokens` to normalize latency by response size."""
+    return _Slot(limiter)
@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import threading
+
+from core.utils.config_utils import load_key
+from core.utils.llm_concurrency import AIMDLimiter, limiter_slot
+from core.utils.token_count import heuristic_tokens
+
+# ------------
+# shared event loop
+# ------------
+
+_LOOP = None
+_LOOP_THREAD = None
+_LOOP_LOCK = threading.Lock()
+_LIMITERS = {}
+
+def get_loop():
+    """The process-wide event loop that runs every LLM request, started on first use in a daemon thread."""
+    global _LOOP, _LOOP_THREAD
+    if _LOOP is not None:
+        return _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            _LOOP_THREAD = threading.Thread(target=_run, name="llm-engine", daemon=True)
+            _LOOP_THREAD.start()
+            ready.wait()
+            _LOOP = loop
+    return _LOOP
+
+def in_engine_thread():
+    return _LOOP_THREAD is not None and threading.current_thread() is _LOOP_THREAD
+
+async def _run_in_context(coro, ctx):
+    # tasks start from the loop thread's context; copy the caller's vars (e.g. the config overlay) in
+    for var, value in ctx.items():
+        var.set(value)
+    return await coro
+
+def run_sync(coro):
+    """Sync facade: run `coro` on the engine loop and block the calling thread until it finishes."""
+    if in_engine_thread():
+        coro.close()
+        raise RuntimeError("run_sync() called from the LLM engine loop, await the async API instead")
+    future = asyncio.run_coroutine_threadsafe(_run_in_context(coro, contextvars.copy_context()), get_loop())
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+
+# ------------
+# concurrency limit
+# ------------
+
+def _inflight_limit():
+    try:
+        return max(int(load_key("max_workers")), 1)
+    except (KeyError, TypeError, ValueError):
+        return 1
+
+def _concurrency_setting(name, default):
+    try:
+        value = load_key(f"llm_concurrency.{name}")
+    except KeyError:
+        return default
+    return default if value in (None, '') else value
+
+def get_limiter():
+    """Shared concurrency controller, adaptive (AIMD) unless `llm_concurrency.mode` is 'fixed'.
+
+    One limiter per combination of `max_workers` and `llm_concurrency.*`, so a job overlay or an
+    `update_key` changing them gets a limiter with the new ceiling instead of the first one built.
+    """
+    initial = _inflight_limit()
+    settings = (initial, _concurrency_setting("mode", "adaptive"), int(_concurrency_setting("min", 1)),
+                int(_concurrency_setting("max", 32)), float(_concurrency_setting("latency_tolerance", 2.0)))
+    limiter = _LIMITERS.get(settings)
+    if limiter is None:
+        _, mode, minimum, maximum, latency_tolerance = settings
+        if mode == "fixed":
+            limiter = AIMDLimiter(initial, initial, initial, adaptive=False)
+        else:
+            limiter = AIMDLimiter(initial, minimum=minimum, maximum=maximum, latency_tolerance=latency_tolerance)
+        limiter = _LIMITERS.setdefault(settings, limiter)
+    return limiter
+
+def llm_slot():
+    """Hold one request slot of the shared limiter for the duration of an API call.
+
+    `async with llm_slot() as slot:` then set `slot.tokens` so latency feedback is per token.
+    """
+    return limiter_slot(get_limiter())
+
+# ------------
+# fan out
+# ------------
+
+def estimate_tokens(*texts):
+    """Rough token count of `texts` without calling a tokenizer, good enough to rank work items."""
+    return sum(heuristic_tokens(str(text)) for text in texts)
+
+async def gather_in_order(func, items, on_done=None, return_exceptions=False, cost=None):
+    """Await `func(item)` for every item concurrently and return the results in input order.
+
+    With `cost(item)`, the estimated prompt + completion tokens of an item, the largest items are
+    started first, so a few huge ones do not run alone at the end while the other slots sit idle.
+    """
+    async def _one(item):
+        try:
+            result = await func(item)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            result = e
+        if on_done:
+            on_done(result)
+        return result
+
+    # tasks reach the limiter in creation order, so creating them longest-first schedules them that way
+    order = sorted(range(len(items)), key=lambda i: -cost(items[i])) if cost else range(len(items))
+    tasks = [None] * len(items)
+    for i in order:
+        tasks[i] = asyncio.ensure_future(_one(items[i]))
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+def llm_map(func, items, on_done=None, return_exceptions=False, cost=None):
+    """Sync facade over `gather_in_order` for stage code that is not async itself."""
+    return run_sync(gather_in_order(func, list(items), on_done=on_done, return_exceptions=return_exceptions, cost=cost))
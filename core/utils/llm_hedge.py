@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+from rich import print as rprint
+
+from core.utils.config_utils import load_key
+from core.utils.llm_metrics import LLM_METRICS
+
+# ------------
+# hedge delay and budget
+# ------------
+
+_BUDGET_LOCK = threading.Lock()
+
+def _hedge_setting(name, default):
+    try:
+        value = load_key(f"llm_hedge.{name}")
+    except KeyError:
+        return default
+    return default if value in (None, '') else value
+
+def hedge_delay(log_title):
+    """Seconds after which a request of this stage gets a duplicate, None while hedging is off or the
+    stage has too few finished requests to know its tail."""
+    if not _hedge_setting("enabled", False):
+        return None
+    latency = LLM_METRICS.latency_percentile(log_title, float(_hedge_setting("percentile", 0.95)),
+                                             min_samples=int(_hedge_setting("min_samples", 10)))
+    if latency is None:
+        return None
+    return max(float(_hedge_setting("min_delay", 2)), latency)
+
+def _claim_hedge(log_title):
+    # a duplicate costs a full request, cap them to a share of the stage's traffic
+    with _BUDGET_LOCK:
+        if LLM_METRICS.hedge_share(log_title) >= float(_hedge_setting("max_ratio", 0.1)):
+            return False
+        LLM_METRICS.record_hedge(log_title)
+        return True
+
+# ------------
+# first valid answer wins
+# ------------
+
+class HedgeRace:
+    """State shared by a request and its duplicate: the endpoints they were sent to, so the duplicate
+    can prefer another one, and whether the original has left the queue."""
+
+    def __init__(self):
+        self.busy = []
+        self.sent = asyncio.Event()
+
+async def run_hedged(attempt, log_title):
+    """Await `attempt(race)`; if it has not answered the stage's hedge delay after it was sent, start a
+    second `attempt(race)` and return whichever succeeds first, cancelling the other.
+
+    An attempt appends its endpoint to `race.busy` and sets `race.sent` once it holds a request slot.
+    An attempt that fails (API error or invalid answer) leaves the race to the other one; the first
+    error is raised only when both fail.
+    """
+    race = HedgeRace()
+    if not _hedge_setting("enabled", False):
+        return await attempt(race)
+    tasks = [asyncio.ensure_future(attempt(race))]
+    sent = asyncio.ensure_future(race.sent.wait())
+    try:
+        # the clock starts when the request is sent, waiting for a slot behind max_workers is not slowness
+        await asyncio.wait([tasks[0], sent], return_when=asyncio.FIRST_COMPLETED)
+        delay = hedge_delay(log_title)
+        if tasks[0].done() or delay is None:
+            return await tasks[0]
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not _claim_hedge(log_title):
+            return await tasks[0]
+        rprint(f"[yellow]🐢 {log_title}: no answer after {delay:.1f}s, sending a hedged request[/yellow]")
+        tasks.append(asyncio.ensure_future(attempt(race)))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is tasks[1]:
+                        LLM_METRICS.record_hedge(log_title, won=True)
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks + [sent]:
+            if not task.done():
+                task.cancel()
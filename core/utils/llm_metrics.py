@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+# ------------
+# per-stage LLM telemetry
+# ------------
+
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+METRICS_DIR = "output/log"
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+class StageMetrics:
+    """Counters for one `log_title`. A failed attempt is retried by `ask_gpt` unless it was the last one."""
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.validation_failures = 0
+        self.api_errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = []
+        self.ttfts = []
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    @property
+    def retries(self):
+        return self.validation_failures + self.api_errors
+
+    def observe_latency(self, latency):
+        self.latencies.append(latency)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+
+    def to_dict(self):
+        lookups = self.requests + self.cache_hits
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "retries": self.retries,
+            "validation_failures": self.validation_failures,
+            "api_errors": self.api_errors,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_total": sum(self.latencies),
+            "latency_p50": _percentile(self.latencies, 0.5),
+            "latency_p95": _percentile(self.latencies, 0.95),
+            "ttft_avg": sum(self.ttfts) / len(self.ttfts) if self.ttfts else None,
+        }
+
+class LLMMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.started = time.time()
+
+    def _stage(self, title):
+        if title not in self.stages:
+            self.stages[title] = StageMetrics()
+        return self.stages[title]
+
+    def record_request(self, title, latency, prompt_tokens=0, completion_tokens=0, ttft=None):
+        with self._lock:
+            stage = self._stage(title)
+            stage.requests += 1
+            stage.prompt_tokens += prompt_tokens or 0
+            stage.completion_tokens += completion_tokens or 0
+            stage.observe_latency(latency)
+            if ttft is not None:
+                stage.ttfts.append(ttft)
+
+    def record_cache_hit(self, title):
+        with self._lock:
+            self._stage(title).cache_hits += 1
+
+    def record_failure(self, title, kind):
+        """`kind` is 'validation' (bad answer, incl. aborted streams) or 'api' (the request itself failed)."""
+        with self._lock:
+            stage = self._stage(title)
+            if kind == "validation":
+                stage.validation_failures += 1
+            else:
+                stage.api_errors += 1
+
+    def record_hedge(self, title, won=False):
+        """A duplicate request was sent after the hedge delay (`won`: it answered before the original)."""
+        with self._lock:
+            stage = self._stage(title)
+            if won:
+                stage.hedge_wins += 1
+            else:
+                stage.hedges += 1
+
+    def latency_percentile(self, title, q, min_samples=1):
+        """`q` latency percentile of a stage, None until it has `min_samples` finished requests."""
+        with self._lock:
+            stage = self.stages.get(title)
+            if stage is None or len(stage.latencies) < min_samples:
+                return None
+            return _percentile(stage.latencies, q)
+
+    def hedge_share(self, title):
+        with self._lock:
+            stage = self.stages.get(title)
+            return stage.hedges / max(stage.requests, 1) if stage else 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {title: stage.to_dict() for title, stage in self.stages.items()}
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.started = time.time()
+
+    # ------------
+    # reports
+    # ------------
+
+    def to_prometheus(self):
+        lines = []
+        counters = [
+            ("requests", "LLM requests sent"),
+            ("cache_hits", "Answers served from the response cache"),
+            ("validation_failures", "Answers rejected by validation"),
+            ("api_errors", "Requests that raised"),
+            ("hedges", "Duplicate requests sent after the hedge delay"),
+            ("hedge_wins", "Hedged requests that answered first"),
+            ("prompt_tokens", "Prompt tokens"),
+            ("completion_tokens", "Completion tokens"),
+        ]
+        with self._lock:
+            stages = sorted(self.stages.items())
+            for name, help_text in counters:
+                lines.append(f"# HELP videolingo_llm_{name}_total {help_text}")
+                lines.append(f"# TYPE videolingo_llm_{name}_total counter")
+                for title, stage in stages:
+                    lines.append(f'videolingo_llm_{name}_total{{stage="{title}"}} {getattr(stage, name)}')
+            lines.append("# HELP videolingo_llm_latency_seconds LLM request latency")
+            lines.append("# TYPE videolingo_llm_latency_seconds histogram")
+            for title, stage in stages:
+                for bound, count in zip(LATENCY_BUCKETS, stage.buckets):
+                    lines.append(f'videolingo_llm_latency_seconds_bucket{{stage="{title}",le="{bound}"}} {count}')
+                lines.append(f'videolingo_llm_latency_seconds_bucket{{stage="{title}",le="+Inf"}} {len(stage.latencies)}')
+                lines.append(f'videolingo_llm_latency_seconds_sum{{stage="{title}"}} {sum(stage.latencies):.3f}')
+                lines.append(f'videolingo_llm_latency_seconds_count{{stage="{title}"}} {len(stage.latencies)}')
+        return '\n'.join(lines) + '\n'
+
+    def summary_table(self):
+        table = Table(title="📊 LLM usage by stage")
+        for column in ("Stage", "Requests", "Cache hits", "Retries", "Hedged", "Prompt tok", "Completion tok", "p50 s", "p95 s", "Total s"):
+            table.add_column(column, justify="left" if column == "Stage" else "right")
+        snapshot = self.snapshot()
+        for title, stage in sorted(snapshot.items(), key=lambda item: -item[1]["latency_total"]):
+            table.add_row(
+                title, str(stage["requests"]), f"{stage['cache_hits']} ({stage['cache_hit_rate']:.0%})", str(stage["retries"]),
+                f"{stage['hedges']} ({stage['hedge_wins']} won)" if stage["hedges"] else "0",
+                str(stage["prompt_tokens"]), str(stage["completion_tokens"]),
+                f"{stage['latency_p50']:.1f}", f"{stage['latency_p95']:.1f}", f"{stage['latency_total']:.1f}",
+            )
+        return table
+
+    def export(self, directory=METRICS_DIR, connections=None):
+        os.makedirs(directory, exist_ok=True)
+        report = {"started": self.started, "stages": self.snapshot()}
+        if connections:
+            report["connections"] = connections
+        with open(os.path.join(directory, "llm_metrics.json"), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        with open(os.path.join(directory, "llm_metrics.prom"), 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+
+LLM_METRICS = LLMMetrics()
+
+def report_llm_metrics(directory=METRICS_DIR, connections=None):
+    """Print the per-stage table and write `llm_metrics.json` / `llm_metrics.prom` into `directory`.
+
+    `connections` is `llm_client.client_metrics()`, the connection reuse per endpoint, saved alongside the stages.
+    """
+    if not LLM_METRICS.stages:
+        return
+    Console().print(LLM_METRICS.summary_table())
+    LLM_METRICS.export(directory, connections)
@@ -0,0 +1,67 @@
+from rich import print as rprint
+
+from core.utils.ask_gpt import ask_gpt_async
+from core.utils.config_utils import load_key
+from core.utils.llm_engine import gather_in_order
+from core.prompts import get_packed_schema
+
+# ------------
+# prompt packing
+# ------------
+
+def get_pack_size():
+    try:
+        return max(int(load_key("llm_pack_size")), 1)
+    except (KeyError, TypeError, ValueError):
+        return 1
+
+def _valid_pack(response_data):
+    if not isinstance(response_data, dict):
+        return {"status": "error", "message": "Packed response is not a JSON object"}
+    return {"status": "success", "message": "Packed response parsed"}
+
+async def pack_requests(items, build_prompt, valid_item, log_title, single, pack_size=None, rounds=2, return_exceptions=False,
+                        item_schema=None, cost=None, use_cache=True):
+    """Answer many small independent `items` with one LLM call per `pack_size` items.
+
+    `build_prompt(pack)` renders a prompt whose answer is keyed "1".."n" in pack order and
+    `valid_item(answer)` validates one keyed answer. Items with a missing or invalid answer
+    are re-queued into fresh packs; whatever still fails after `rounds` goes through
+    `single(item)`, the classic one-item-per-request path. Results keep input order.
+    `item_schema(item)` gives the JSON schema of one answer for constrained decoding and
+    `cost(item)` its estimated tokens, so the heaviest packs are sent first. `use_cache=False` asks
+    every pack again, for a caller's retry of answers it already rejected.
+    """
+    pack_size = pack_size or get_pack_size()
+    results = [None] * len(items)
+    pending = list(range(len(items)))
+    if pack_size > 1:
+        for attempt in range(rounds):
+            packs = [pending[i:i + pack_size] for i in range(0, len(pending), pack_size)]
+
+            async def run_pack(pack):
+                prompt = build_prompt([items[i] for i in pack])
+                schema = get_packed_schema([item_schema(items[i]) for i in pack]) if item_schema else None
+                # a re-queued pack may repeat an earlier prompt verbatim, do not replay its cached answer
+                response_data = await ask_gpt_async(prompt, resp_type='json', valid_def=_valid_pack, log_title=f'{log_title}_packed', use_cache=use_cache and attempt == 0,
+                                                   schema=schema)
+                for n, idx in enumerate(pack, 1):
+                    answer = response_data.get(str(n))
+                    if isinstance(answer, dict) and valid_item(answer)['status'] == 'success':
+                        results[idx] = answer
+
+            pack_cost = (lambda pack: sum(cost(items[i]) for i in pack)) if cost else None
+            await gather_in_order(run_pack, packs, return_exceptions=True, cost=pack_cost)
+            failed = [i for i in pending if results[i] is None]
+            if failed:
+                rprint(f"[yellow]⚠️ {log_title}: {len(failed)}/{len(pending)} packed items failed validation, re-queueing[/yellow]")
+            pending = failed
+            if not pending:
+                break
+
+    if pending:
+        answers = await gather_in_order(lambda i: single(items[i]), pending, return_exceptions=return_exceptions,
+                                        cost=(lambda i: cost(items[i])) if cost else None)
+        for idx, answer in zip(pending, answers):
+            results[idx] = answer
+    return results
@@ -0,0 +1,204 @@
+import asyncio
+import contextlib
+import threading
+
+from rich import print as rprint
+
+from core.utils.config_utils import load_key
+from core.utils.llm_client import get_async_client, normalize_base_url
+from core.utils.llm_concurrency import AIMDLimiter, limiter_slot
+from core.utils.llm_engine import llm_slot
+from core.utils.local_llm_server import local_server_endpoints
+from core.utils.retry_policy import get_breaker, is_endpoint_failure
+
+HEALTH_INTERVAL = 30
+
+# ------------
+# endpoints
+# ------------
+
+class Endpoint:
+    """One OpenAI-compatible server. `max_concurrency` gives it its own AIMD limiter capped at that
+    value; without it requests share the global limiter (the single `api.base_url` setup)."""
+
+    def __init__(self, base_url, api_key, model=None, weight=1.0, max_concurrency=None, fallback=False):
+        self.base_url = normalize_base_url(base_url)
+        self.api_key = api_key
+        self.model = model or None
+        self.weight = max(float(weight or 1.0), 0.01)
+        self.fallback = bool(fallback)
+        self.limiter = None
+        if max_concurrency:
+            adaptive = _concurrency_mode() != "fixed"
+            self.limiter = AIMDLimiter(1 if adaptive else max_concurrency, 1, max_concurrency, adaptive=adaptive, name=self.base_url)
+        self.outstanding = 0
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def client(self):
+        return get_async_client(self.base_url, self.api_key)
+
+    @property
+    def breaker(self):
+        return get_breaker(self.base_url)
+
+    @property
+    def available(self):
+        return self.healthy and not self.breaker.is_open()
+
+    def score(self):
+        return (self.outstanding + 1) / self.weight
+
+    @contextlib.asynccontextmanager
+    async def request(self):
+        """Count the request as outstanding (queued ones included) and hold a concurrency slot."""
+        self.outstanding += 1
+        try:
+            probe = await self.breaker.wait_ready()
+            try:
+                async with (limiter_slot(self.limiter) if self.limiter else llm_slot()) as slot:
+                    yield slot
+            except Exception:
+                # the caller records the outcome, which ends the probe
+                raise
+            except BaseException:
+                # a cancelled probe (lost hedge, failed batch, interrupt) never gets an outcome
+                if probe:
+                    self.breaker.release_probe()
+                raise
+        finally:
+            self.outstanding -= 1
+
+    def record_success(self):
+        self.requests += 1
+        self.healthy = True
+        self.breaker.record_success()
+
+    def record_failure(self, exc):
+        self.requests += 1
+        self.failures += 1
+        self.breaker.record_failure(exc)
+        if is_endpoint_failure(exc):
+            self.healthy = False
+
+def _concurrency_mode():
+    try:
+        return load_key("llm_concurrency.mode")
+    except KeyError:
+        return "adaptive"
+
+# ------------
+# router
+# ------------
+
+class LLMRouter:
+    """Least-outstanding-requests routing over weighted endpoints.
+
+    Requests go to the available primary endpoint with the lowest (outstanding + 1) / weight;
+    `fallback` endpoints only receive traffic while no primary is available. An endpoint is
+    unavailable while its circuit breaker is open or its last health check failed.
+    """
+
+    def __init__(self, endpoints, health_interval=HEALTH_INTERVAL):
+        self.endpoints = endpoints
+        self.health_interval = health_interval
+        self._health_task = None
+        self._first_check = None
+
+    def _candidates(self, exclude=()):
+        pool = [e for e in self.endpoints if e not in exclude and e.available]
+        primaries = [e for e in pool if not e.fallback]
+        return primaries or pool
+
+    def has_alternative(self, exclude):
+        return bool(self._candidates(exclude))
+
+    async def pick(self, exclude=()):
+        await self._ensure_health_checks()
+        candidates = self._candidates(exclude)
+        if not candidates:
+            # every endpoint is down: queue on the first untried one, its breaker pauses or gives up for everyone
+            untried = [e for e in self.endpoints if e not in exclude]
+            return (untried or self.endpoints)[0]
+        return min(candidates, key=lambda e: e.score())
+
+    # ------------
+    # health checks
+    # ------------
+
+    async def _ensure_health_checks(self):
+        if len(self.endpoints) < 2 or not self.health_interval:
+            return
+        if self._health_task is None:
+            # the first burst of requests waits for one round of checks instead of hitting a dead endpoint
+            self._first_check = asyncio.ensure_future(self.check_health())
+            self._health_task = asyncio.ensure_future(self._health_loop())
+        await asyncio.shield(self._first_check)
+
+    async def check_health(self):
+        async def _check(endpoint):
+            try:
+                await endpoint.client.models.list(timeout=5)
+                healthy = True
+            except Exception:
+                healthy = False
+            if healthy != endpoint.healthy:
+                rprint(f"[{'green' if healthy else 'red'}]🩺 {endpoint.base_url} is {'healthy' if healthy else 'unreachable'}[/]")
+            endpoint.healthy = healthy
+
+        await asyncio.gather(*[_check(e) for e in self.endpoints])
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_health()
+
+    def summary(self):
+        return {e.base_url: {"requests": e.requests, "failures": e.failures, "healthy": e.healthy,
+                             "limit": e.limiter.level if e.limiter else None} for e in self.endpoints}
+
+_ROUTERS = {}
+_ROUTERS_LOCK = threading.Lock()
+
+def _endpoint_configs():
+    try:
+        configured = load_key("api.endpoints") or []
+    except KeyError:
+        configured = []
+    if not configured:
+        # a pool of local instances, or a llama-server with parallel slots, gets one limiter per instance
+        # sized to its slots instead of max_workers
+        local = local_server_endpoints(load_key("api.base_url"))
+        if local and (len(local) > 1 or local[0][1] > 1):
+            return tuple((base_url, load_key("api.key"), None, 1.0, slots, False) for base_url, slots in local)
+        return ((load_key("api.base_url"), load_key("api.key"), None, 1.0, None, False),)
+    return tuple(
+        (item["base_url"], item.get("key") or load_key("api.key"), item.get("model"), item.get("weight", 1.0),
+         item.get("max_concurrency"), item.get("fallback", False))
+        for item in configured
+    )
+
+def get_router():
+    """Router for the current config; `api.endpoints` replaces `api.base_url` when it is not empty."""
+    configs = _endpoint_configs()
+    router = _ROUTERS.get(configs)
+    if router is not None:
+        return router
+    with _ROUTERS_LOCK:
+        if configs not in _ROUTERS:
+            try:
+                interval = float(load_key("api.health_interval"))
+            except (KeyError, TypeError, ValueError):
+                interval = HEALTH_INTERVAL
+            _ROUTERS[configs] = LLMRouter([Endpoint(*config) for config in configs], health_interval=interval)
+        return _ROUTERS[configs]
+
+def print_router_summary():
+    for router in list(_ROUTERS.values()):
+        if len(router.endpoints) < 2:
+            continue
+        for base_url, stats in router.summary().items():
+            rprint(f"[cyan]🔀 {base_url}: {stats['requests']} requests, {stats['failures']} failures, "
+                   f"{'healthy' if stats['healthy'] else 'down'}[/cyan]")
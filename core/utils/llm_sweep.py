@@ -0,0 +1,234 @@
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from rich import print as rprint
+from rich.console import Console
+from rich.table import Table
+from ruamel.yaml import YAML
+
+from core.utils.config_utils import config_overlay, load_key, update_key
+from core.utils.gpt_cache import CACHE_DB
+from core.utils.llm_metrics import LLM_METRICS
+from core.utils.token_count import heuristic_tokens
+
+PROFILE_PATH = './_model_cache/llm_profile.yaml'
+RESULTS_PATH = 'output/log/llm_sweep.json'
+SERVER_PARAMS = ("n_threads", "n_batch", "n_ctx", "n_parallel", "instances")
+MAX_ERROR_RATE = 0.02
+
+# ------------
+# replayed prompts
+# ------------
+
+def load_sample_prompts(db_path=CACHE_DB, samples=24):
+    """Prompts of a finished run, spread over every stage in proportion to how often it called the LLM."""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"{db_path} not found, run the pipeline once before sweeping")
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT log_title, prompt, resp_type, resp_content FROM responses ORDER BY created_at").fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        raise ValueError(f"{db_path} has no cached responses to replay")
+    by_title = {}
+    for log_title, prompt, resp_type, resp_content in rows:
+        by_title.setdefault(log_title, []).append((prompt, resp_type, heuristic_tokens(resp_content or '')))
+    picked = []
+    for items in by_title.values():
+        share = max(1, round(samples * len(items) / len(rows)))
+        step = max(len(items) // share, 1)
+        picked += items[::step][:share]
+    return picked[:max(samples, len(by_title))]
+
+def _needed_ctx(prompts):
+    # the prompt plus the original answer
+    return max(heuristic_tokens(prompt) + answer_tokens for prompt, _, answer_tokens in prompts)
+
+# ------------
+# one grid point
+# ------------
+
+def _local_managed():
+    try:
+        cfg = load_key("local_llm")
+    except KeyError:
+        return False
+    return bool(cfg and cfg.get("enabled") and cfg.get("manage_server", True))
+
+def _configured_endpoints():
+    try:
+        return load_key("api.endpoints") or []
+    except KeyError:
+        return []
+
+def _local_slots_backend():
+    """True when the managed local server is llama-server, whose requests in flight per instance are `n_parallel`."""
+    return _local_managed() and load_key("local_llm").get("backend") == "llama_server"
+
+def run_point(prompts, concurrency):
+    """Replay `prompts` with `concurrency` requests in flight per server instance; tokens/s, latency
+    percentiles and error rate."""
+    from core.utils import gpt_cache
+    from core.utils.ask_gpt import ask_gpt_async
+    from core.utils.llm_engine import llm_map
+    from core.utils.local_llm_server import local_server_endpoints
+
+    # dedicated endpoint entries get their own fixed limiters, independent of the shared one
+    endpoints = [dict(item, max_concurrency=concurrency) for item in _configured_endpoints()]
+    if not endpoints:
+        base_urls = [url for url, _ in local_server_endpoints(load_key("api.base_url")) or [(load_key("api.base_url"), None)]]
+        endpoints = [{"base_url": url, "key": load_key("api.key"), "max_concurrency": concurrency} for url in base_urls]
+    overrides = {"api.endpoints": endpoints, "llm_concurrency.mode": "fixed", "llm_retry.breaker_give_up": 30}
+
+    async def _replay(item):
+        prompt, resp_type, _ = item
+        return await ask_gpt_async(prompt, resp_type=resp_type, log_title="sweep", use_cache=False)
+
+    # replayed answers go to a scratch cache, the run's own answers stay as they are
+    cache = gpt_cache._CACHE
+    with tempfile.TemporaryDirectory() as tmp, config_overlay(overrides):
+        gpt_cache._CACHE = gpt_cache.GPTCache(os.path.join(tmp, "cache.db"))
+        try:
+            LLM_METRICS.reset()
+            start = time.monotonic()
+            results = llm_map(_replay, prompts, return_exceptions=True)
+            elapsed = time.monotonic() - start
+            stage = LLM_METRICS.snapshot().get("sweep", {})
+        finally:
+            gpt_cache._CACHE.close()
+            gpt_cache._CACHE = cache
+    # rejected attempts count even when a retry later succeeded, a 429 storm is not a healthy setting
+    failed = sum(isinstance(r, Exception) for r in results)
+    attempts = stage.get("requests", 0) + stage.get("api_errors", 0)
+    errors = stage.get("api_errors", 0) + stage.get("validation_failures", 0)
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "tokens_per_s": stage.get("completion_tokens", 0) / elapsed if elapsed else 0.0,
+        "latency_p50": stage.get("latency_p50", 0.0),
+        "latency_p95": stage.get("latency_p95", 0.0),
+        "error_rate": errors / attempts if attempts else 1.0,
+        "failed": failed,
+    }
+
+# ------------
+# sweep
+# ------------
+
+def sweep(prompts, concurrencies=(1, 2, 4, 8), server_grid=None):
+    """Every server parameter combination (managed local server only) crossed with every concurrency level."""
+    from core.utils.local_llm_server import start_local_llm_server, stop_local_llm_server
+
+    server_grid = {k: v for k, v in (server_grid or {}).items() if v} if _local_managed() else {}
+    if server_grid.get("n_ctx"):
+        needed = _needed_ctx(prompts)
+        too_small = [n for n in server_grid["n_ctx"] if n < needed]
+        if too_small:
+            rprint(f"[yellow]Skipping n_ctx {too_small}, the replayed prompts need about {needed} tokens[/yellow]")
+        server_grid["n_ctx"] = [n for n in server_grid["n_ctx"] if n >= needed] or [needed]
+    names = list(server_grid)
+    points = []
+    for values in itertools.product(*[server_grid[name] for name in names]):
+        server = {f"local_llm.{name}": value for name, value in zip(names, values)}
+        # llama-server takes n_parallel requests per instance in production, so a swept value fixes the concurrency
+        levels = [server["local_llm.n_parallel"]] if "local_llm.n_parallel" in server and _local_slots_backend() else concurrencies
+        with config_overlay(server):
+            started = start_local_llm_server() if _local_managed() else False
+            try:
+                for concurrency in levels:
+                    point = run_point(prompts, concurrency)
+                    point["server"] = {name: value for name, value in zip(names, values)}
+                    points.append(point)
+                    rprint(f"[cyan]{point['server'] or 'endpoint'} x {concurrency}: {point['tokens_per_s']:.1f} tok/s, "
+                           f"p95 {point['latency_p95']:.1f}s, {point['error_rate']:.0%} errors[/cyan]")
+            finally:
+                if started:
+                    stop_local_llm_server()
+    return points
+
+def best_point(points, max_error_rate=MAX_ERROR_RATE):
+    """Highest throughput among points within the error budget; ties go to the lower concurrency."""
+    healthy = [p for p in points if p["error_rate"] <= max_error_rate] or points
+    return max(healthy, key=lambda p: (round(p["tokens_per_s"], 1), -p["concurrency"]))
+
+def recommended_settings(point):
+    """Config keys that reproduce `point` in production.
+
+    `max_workers` only limits a single endpoint without slots. `api.endpoints` entries get their own
+    `max_concurrency`, a managed llama-server is driven with `local_llm.n_parallel` requests per
+    instance and a pool of llama-cpp-python instances with one each.
+    """
+    settings = {f"local_llm.{name}": value for name, value in point["server"].items()}
+    concurrency = point["concurrency"]
+    endpoints = _configured_endpoints()
+    with config_overlay(settings):
+        instances = int(load_key("local_llm.instances") or 1) if _local_managed() else 1
+        slots_backend = _local_slots_backend()
+    if endpoints:
+        settings["api.endpoints"] = [dict(item, max_concurrency=concurrency) for item in endpoints]
+    elif slots_backend:
+        settings["local_llm.n_parallel"] = concurrency
+    elif instances == 1:
+        settings["max_workers"] = concurrency
+    return settings
+
+def results_table(points, best):
+    table = Table(title="🔬 LLM throughput sweep")
+    for column in ("Server", "Concurrency/instance", "tok/s", "p50 s", "p95 s", "Errors"):
+        table.add_column(column, justify="left" if column == "Server" else "right")
+    for p in sorted(points, key=lambda p: -p["tokens_per_s"]):
+        server = ', '.join(f"{k}={v}" for k, v in p["server"].items()) or '-'
+        style = "bold green" if p is best else None
+        table.add_row(server, str(p["concurrency"]), f"{p['tokens_per_s']:.1f}", f"{p['latency_p50']:.1f}",
+                      f"{p['latency_p95']:.1f}", f"{p['error_rate']:.0%}", style=style)
+    return table
+
+def write_profile(settings, path=PROFILE_PATH):
+    """The winning settings as a small YAML profile: dotted config keys plus where they were measured."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    profile = {"endpoint": load_key("api.base_url"), "model": load_key("api.model"),
+               "measured_at": time.strftime("%Y-%m-%d %H:%M:%S"), "settings": settings}
+    with open(path, 'w', encoding='utf-8') as f:
+        YAML().dump(profile, f)
+    return path
+
+def apply_profile(settings):
+    """Write the settings into config.yaml, skipping keys the config does not have."""
+    for key, value in settings.items():
+        try:
+            update_key(key, value)
+        except KeyError:
+            rprint(f"[yellow]{key} is not in config.yaml, left out[/yellow]")
+
+def _int_list(text):
+    return [int(v) for v in text.split(',') if v.strip()] if text else []
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay cached prompts over a grid of concurrency and llama.cpp settings.")
+    parser.add_argument("--db", default=CACHE_DB, help="gpt_log cache of a finished run")
+    parser.add_argument("--samples", type=int, default=24)
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    for name in SERVER_PARAMS:
+        parser.add_argument(f"--{name}", default="", help=f"comma separated local_llm.{name} values")
+    parser.add_argument("--apply", action="store_true", help="also write the best settings into config.yaml")
+    args = parser.parse_args()
+
+    prompts = load_sample_prompts(args.db, args.samples)
+    rprint(f"[cyan]Replaying {len(prompts)} prompts from {args.db}[/cyan]")
+    points = sweep(prompts, _int_list(args.concurrency), {name: _int_list(getattr(args, name)) for name in SERVER_PARAMS})
+    best = best_point(points)
+    Console().print(results_table(points, best))
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, 'w', encoding='utf-8') as f:
+        json.dump({"points": points, "best": best}, f, indent=2)
+    settings = recommended_settings(best)
+    rprint(f"[green]✅ Best: {settings}, profile written to {write_profile(settings)}[/green]")
+    if args.apply:
+        apply_profile(settings)
+        rprint("[green]✅ config.yaml updated[/green]")
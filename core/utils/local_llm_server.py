@@ -1,8 +1,11 @@
+import atexit
 import gc
 import os
+import shutil
 import signal
 import subprocess
 import sys
+import threading
 import time
 from contextlib import contextmanager
 from pathlib import Path
@@ -11,8 +14,14 @@ import requests
 from rich import print as rprint
 
 from core.utils.config_utils import load_key
+from core.utils.gguf_download import download_file, hf_resolve_url
+from core.utils.llm_client import client_metrics, normalize_base_url, print_client_metrics
+from core.utils.llm_metrics import report_llm_metrics
 
-_SERVER_PROCESS = None
+_SERVER_PROCESSES = []
+_LOAD_SECONDS = None
+READY_MARKERS = (b"Uvicorn running on", b"Application startup complete", b"server is listening on")
+KEEP_WARM_SCOPES = ("stage", "video", "batch")
 
 
 def _get_local_llm_config():
@@ -26,14 +35,22 @@ def _is_enabled(cfg):
     return bool(cfg and cfg.get("enabled", False))
 
 
-def _server_base_url(cfg):
+def _instances(cfg):
+    return max(int(cfg.get("instances") or 1), 1)
+
+
+def _server_port(cfg, index=0):
+    # a pool of instances listens on consecutive ports starting at server_port
+    return int(cfg.get("server_port", 8000)) + index
+
+
+def _server_base_url(cfg, index=0):
     host = cfg.get("server_host", "127.0.0.1")
-    port = int(cfg.get("server_port", 8000))
-    return f"http://{host}:{port}"
+    return f"http://{host}:{_server_port(cfg, index)}"
 
 
-def _server_ready(cfg):
-    base_url = _server_base_url(cfg)
+def _server_ready(cfg, index=0):
+    base_url = _server_base_url(cfg, index)
     try:
         resp = requests.get(f"{base_url}/v1/models", timeout=2)
         return resp.status_code == 200
@@ -41,16 +58,10 @@ def _server_ready(cfg):
         return False
 
 
-def _download_gguf(repo, filename, dest_path):
-    url = f"https://huggingface.co/{repo}/resolve/main/{filename}"
+def _download_gguf(repo, filename, dest_path, connections=4):
+    url = hf_resolve_url(repo, filename)
     rprint(f"[cyan]⬇️ Downloading GGUF model from {url}[/cyan]")
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    with requests.get(url, stream=True, timeout=60) as response:
-        response.raise_for_status()
-        with open(dest_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
+    download_file(url, dest_path, connections=connections)
 
 
 def _resolve_model_path(cfg):
@@ -71,7 +82,7 @@ def _ensure_model(cfg):
     repo = (cfg.get("model_repo") or "").strip()
     if not repo:
         raise FileNotFoundError(f"Model not found at {model_path} and model_repo is empty")
-    _download_gguf(repo, model_path.name, model_path)
+    _download_gguf(repo, model_path.name, model_path, connections=int(cfg.get("download_connections") or 4))
     return model_path
 
 
@@ -86,7 +97,20 @@ def _clear_cuda_cache():
     gc.collect()
 
 
+def _backend(cfg):
+    return cfg.get("backend") or "llama_cpp_python"
+
+
+def _parallel_slots(cfg):
+    # llama-cpp-python's server decodes one sequence at a time, only llama-server has slots
+    if _backend(cfg) != "llama_server":
+        return 1
+    return max(int(cfg.get("n_parallel") or 1), 1)
+
+
 def _build_server_cmd(cfg, model_path):
+    if _backend(cfg) == "llama_server":
+        return _build_llama_server_cmd(cfg, model_path)
     host = cfg.get("server_host", "127.0.0.1")
     port = str(cfg.get("server_port", 8000))
     cmd = [
@@ -123,88 +147,367 @@ def _build_server_cmd(cfg, model_path):
     if chat_format:
         cmd += ["--chat_format", chat_format]
 
+    if cfg.get("prompt_cache", True):
+        cmd += ["--cache", "true"]
+        cache_size = cfg.get("prompt_cache_size")
+        if cache_size:
+            cmd += ["--cache_size", str(cache_size)]
+
     return cmd
 
 
-def start_local_llm_server():
-    global _SERVER_PROCESS
+def _build_llama_server_cmd(cfg, model_path):
+    """llama.cpp's own server: `n_parallel` slots share one model and decode together (continuous batching)."""
+    slots = _parallel_slots(cfg)
+    cmd = [
+        cfg.get("llama_server_bin") or "llama-server",
+        "--model",
+        str(model_path),
+        "--host",
+        cfg.get("server_host", "127.0.0.1"),
+        "--port",
+        str(cfg.get("server_port", 8000)),
+        "--parallel",
+        str(slots),
+        "--cont-batching",
+    ]
+
+    api_key = (cfg.get("api_key") or "").strip()
+    if api_key:
+        cmd += ["--api-key", api_key]
+
+    model_alias = (cfg.get("model_alias") or "").strip()
+    if model_alias:
+        cmd += ["--alias", model_alias]
+
+    # the context is split evenly between the slots, so every slot keeps n_ctx
+    n_ctx = cfg.get("n_ctx")
+    if n_ctx:
+        cmd += ["--ctx-size", str(int(n_ctx) * slots)]
+
+    n_gpu_layers = cfg.get("n_gpu_layers")
+    if n_gpu_layers is not None and n_gpu_layers != "":
+        cmd += ["--n-gpu-layers", str(999 if int(n_gpu_layers) < 0 else n_gpu_layers)]
+
+    for key, flag in [
+        ("n_threads", "--threads"),
+        ("n_batch", "--batch-size"),
+    ]:
+        value = cfg.get(key)
+        if value is not None and value != "":
+            cmd += [flag, str(value)]
+
+    chat_format = (cfg.get("chat_format") or "").strip()
+    if chat_format:
+        cmd += ["--chat-template", chat_format]
+
+    return cmd
+
+
+def _is_local_server(cfg, base_url):
+    urls = {normalize_base_url(_server_base_url(cfg, i)) for i in range(_instances(cfg))}
+    return normalize_base_url(base_url) in urls
+
+
+def local_server_endpoints(base_url):
+    """(base_url, slots) of every instance when `base_url` is the managed local server, else None."""
     cfg = _get_local_llm_config()
-    if not _is_enabled(cfg):
-        return False
+    if not _is_enabled(cfg) or not _is_local_server(cfg, base_url):
+        return None
+    return [(_server_base_url(cfg, i), _parallel_slots(cfg)) for i in range(_instances(cfg))]
 
-    if _server_ready(cfg):
-        return False
 
-    try:
-        import llama_cpp  # noqa: F401
-    except Exception as exc:
-        raise RuntimeError("llama-cpp-python is not installed. Please install it first.") from exc
+def local_tokenize_url(base_url):
+    """(tokenize url, text field) of the managed local server behind `base_url`, else None."""
+    cfg = _get_local_llm_config()
+    if not _is_enabled(cfg) or not _is_local_server(cfg, base_url):
+        return None
+    if _backend(cfg) == "llama_server":
+        return f"{_server_base_url(cfg)}/tokenize", "content"
+    return f"{_server_base_url(cfg)}/extras/tokenize", "input"
+
+
+def prompt_cache_params(base_url):
+    """Extra request body asking the local server to keep and reuse the prompt's KV cache."""
+    cfg = _get_local_llm_config()
+    if not _is_enabled(cfg) or not cfg.get("prompt_cache", True):
+        return None
+    if not _is_local_server(cfg, base_url):
+        return None
+    return {"cache_prompt": True}
 
-    _clear_cuda_cache()
-    model_path = _ensure_model(cfg)
-    cmd = _build_server_cmd(cfg, model_path)
 
+def _cpu_partitions(cfg):
+    """Disjoint core sets, one per instance, or None per instance when pinning is off or unsupported."""
+    count = _instances(cfg)
+    if count == 1 or not cfg.get("cpu_affinity", True) or not hasattr(os, "sched_setaffinity"):
+        return [None] * count
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < count:
+        return [None] * count
+    size = len(cores) // count
+    return [cores[i * size:(i + 1) * size] for i in range(count)]
+
+
+def _instance_log_path(cfg, index):
     log_path = Path(cfg.get("log_path") or "output/log/local_llm_server.log")
+    if index == 0:
+        return log_path
+    return log_path.with_name(f"{log_path.stem}.{_server_port(cfg, index)}{log_path.suffix}")
+
+
+def _launch_instance(cfg, model_path, index, cores):
+    threads = cfg.get("n_threads")
+    if cores:
+        threads = min(int(threads or len(cores)), len(cores))
+    instance_cfg = {**cfg, "server_port": _server_port(cfg, index), "n_threads": threads}
+    cmd = _build_server_cmd(instance_cfg, model_path)
+
+    log_path = _instance_log_path(cfg, index)
     log_path.parent.mkdir(parents=True, exist_ok=True)
     log_file = open(log_path, "ab")
+    log_offset = log_file.tell()
 
     rprint(f"[cyan]🚀 Starting local LLM server: {' '.join(cmd)}[/cyan]")
-    _SERVER_PROCESS = subprocess.Popen(
+    process = subprocess.Popen(
         cmd,
         stdout=log_file,
         stderr=subprocess.STDOUT,
         start_new_session=True,
         env={**os.environ},
     )
+    if cores:
+        # set before the model loads, so every worker thread the server spawns inherits it
+        os.sched_setaffinity(process.pid, cores)
+    _SERVER_PROCESSES.append(process)
+    return process, log_path, log_offset
+
+
+def start_local_llm_server():
+    """Start every configured instance that is not answering yet; False when all of them already were."""
+    global _LOAD_SECONDS
+    cfg = _get_local_llm_config()
+    if not _is_enabled(cfg):
+        return False
+
+    missing = [i for i in range(_instances(cfg)) if not _server_ready(cfg, i)]
+    if not missing:
+        return False
 
-    for _ in range(180):
-        if _server_ready(cfg):
-            rprint("[green]✅ Local LLM server is ready[/green]")
-            return True
-        if _SERVER_PROCESS.poll() is not None:
-            raise RuntimeError("Local LLM server exited unexpectedly. Check log for details.")
-        time.sleep(1)
+    if _backend(cfg) == "llama_server":
+        if not shutil.which(cfg.get("llama_server_bin") or "llama-server"):
+            raise RuntimeError("llama-server was not found. Build llama.cpp or set local_llm.llama_server_bin.")
+    else:
+        try:
+            import llama_cpp  # noqa: F401
+        except Exception as exc:
+            raise RuntimeError("llama-cpp-python is not installed. Please install it first.") from exc
+
+    _clear_cuda_cache()
+    model_path = _ensure_model(cfg)
+    partitions = _cpu_partitions(cfg)
 
+    started_at = time.monotonic()
+    launched = [(i, *_launch_instance(cfg, model_path, i, partitions[i])) for i in missing]
+    try:
+        for index, process, log_path, log_offset in launched:
+            _wait_until_ready(cfg, index, process, log_path, log_offset)
+    except BaseException:
+        stop_local_llm_server()
+        raise
+    _LOAD_SECONDS = time.monotonic() - started_at
+    pool = f" ({len(launched)} instances)" if len(launched) > 1 else ""
+    rprint(f"[green]✅ Local LLM server is ready{pool} ({_LOAD_SECONDS:.1f}s)[/green]")
+    return True
+
+
+def _log_says_ready(log_path, offset):
+    try:
+        with open(log_path, "rb") as f:
+            f.seek(offset)
+            tail = f.read()
+    except OSError:
+        return False
+    return any(marker in tail for marker in READY_MARKERS)
+
+
+def _wait_until_ready(cfg, index, process, log_path, log_offset, timeout=180):
+    """Probe with a backoff from 50ms up to 1s, and right away once the server log says uvicorn is up."""
+    deadline = time.monotonic() + timeout
+    next_probe, delay = 0.0, 0.05
+    while time.monotonic() < deadline:
+        if time.monotonic() >= next_probe or _log_says_ready(log_path, log_offset):
+            if _server_ready(cfg, index):
+                return
+            next_probe, delay = time.monotonic() + delay, min(delay * 2, 1.0)
+        if process.poll() is not None:
+            raise RuntimeError(f"Local LLM server exited unexpectedly. Check {log_path} for details.")
+        time.sleep(0.05)
     raise TimeoutError("Local LLM server startup timed out. Check log for details.")
 
 
-def stop_local_llm_server():
-    global _SERVER_PROCESS
-    if not _SERVER_PROCESS:
-        return
-    rprint("[cyan]🧹 Stopping local LLM server...[/cyan]")
+def _stop_process(process):
     try:
-        _SERVER_PROCESS.terminate()
-        _SERVER_PROCESS.wait(timeout=15)
+        process.wait(timeout=15)
     except subprocess.TimeoutExpired:
-        _SERVER_PROCESS.kill()
+        process.kill()
     except Exception:
         try:
-            os.killpg(os.getpgid(_SERVER_PROCESS.pid), signal.SIGTERM)
+            os.killpg(os.getpgid(process.pid), signal.SIGTERM)
         except Exception:
             pass
+
+
+def stop_local_llm_server():
+    """Stop every instance this process started, all of them together."""
+    if not _SERVER_PROCESSES:
+        return
+    rprint("[cyan]🧹 Stopping local LLM server...[/cyan]")
+    processes = list(_SERVER_PROCESSES)
+    _SERVER_PROCESSES.clear()
+    try:
+        for process in processes:
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        for process in processes:
+            _stop_process(process)
     finally:
-        _SERVER_PROCESS = None
         _clear_cuda_cache()
 
 
+# ------------
+# warm sessions
+# ------------
+
+class _WarmServer:
+    """Reference count over the managed server.
+
+    Every LLM stage holds a reference while it runs, and `llm_server_session` holds one across several
+    stages, so the model is loaded once per session instead of once per stage. When the last reference
+    goes the server stays up for `local_llm.idle_timeout` seconds in case another stage follows.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.refs = 0
+        self._idle_timer = None
+        self.reuses = 0
+        self.saved_seconds = 0.0
+
+    def _cancel_idle_stop(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _running(self):
+        return any(process.poll() is None for process in _SERVER_PROCESSES)
+
+    def acquire(self, cfg=None):
+        """Take a reference; with `cfg` also make sure the server is up, reusing a warm one."""
+        with self._lock:
+            self._cancel_idle_stop()
+            self.refs += 1
+            if cfg is None:
+                return
+            try:
+                if self._running() and all(_server_ready(cfg, i) for i in range(_instances(cfg))):
+                    self.reuses += 1
+                    self.saved_seconds += _LOAD_SECONDS or 0.0
+                    return
+                start_local_llm_server()
+            except BaseException:
+                self.refs -= 1
+                raise
+
+    def release(self, idle_timeout=0):
+        with self._lock:
+            self.refs = max(self.refs - 1, 0)
+            if self.refs or not self._running():
+                return
+            if idle_timeout <= 0:
+                stop_local_llm_server()
+                return
+            self._idle_timer = threading.Timer(idle_timeout, self._stop_if_idle)
+            self._idle_timer.daemon = True
+            self._idle_timer.start()
+
+    def _stop_if_idle(self):
+        with self._lock:
+            self._idle_timer = None
+            if not self.refs:
+                stop_local_llm_server()
+
+    def shutdown(self):
+        with self._lock:
+            self._cancel_idle_stop()
+            stop_local_llm_server()
+
+_WARM = _WarmServer()
+atexit.register(_WARM.shutdown)
+
+
+def _managed_settings(cfg):
+    if not _is_enabled(cfg) or not cfg.get("manage_server", True):
+        return None
+    keep_warm = cfg.get("keep_warm", "video")
+    if keep_warm not in KEEP_WARM_SCOPES:
+        keep_warm = "video"
+    return keep_warm, float(cfg.get("idle_timeout") or 0)
+
+
+@contextmanager
+def llm_server_session(scope="video"):
+    """Keep the managed server loaded across every LLM stage run inside this block.
+
+    `scope` is 'video' (one video's text pipeline) or 'batch' (all videos); the block only holds the
+    server when `local_llm.keep_warm` is at least that wide. The server is started lazily by the first
+    stage, and the model loads skipped by the following stages are reported on exit.
+    """
+    settings = _managed_settings(_get_local_llm_config())
+    if settings is None or KEEP_WARM_SCOPES.index(settings[0]) < KEEP_WARM_SCOPES.index(scope):
+        yield
+        return
+    reuses, saved = _WARM.reuses, _WARM.saved_seconds
+    _WARM.acquire()
+    try:
+        yield
+    finally:
+        _WARM.release(settings[1])
+        if _WARM.reuses > reuses:
+            rprint(f"[green]♨️ Reused the warm local LLM server {_WARM.reuses - reuses} times this {scope}, "
+                   f"~{_WARM.saved_seconds - saved:.0f}s of model loading saved[/green]")
+
+
 @contextmanager
 def local_llm_server(step_name="step"):
+    try:
+        with _managed_server(step_name):
+            yield
+    finally:
+        # every LLM stage runs inside this block, report its usage when it ends
+        report_llm_metrics(connections=client_metrics())
+        print_client_metrics()
+
+
+@contextmanager
+def _managed_server(step_name):
     cfg = _get_local_llm_config()
     if not _is_enabled(cfg):
         yield
         return
 
-    manage_server = bool(cfg.get("manage_server", True))
-    started = False
-    if manage_server:
-        rprint(f"[blue]🔧 Preparing local LLM for {step_name}[/blue]")
-        started = start_local_llm_server()
-    elif not _server_ready(cfg):
-        raise RuntimeError("Local LLM server is not running. Please start it first.")
+    settings = _managed_settings(cfg)
+    if settings is None:
+        if not _server_ready(cfg):
+            raise RuntimeError("Local LLM server is not running. Please start it first.")
+        yield
+        return
 
+    rprint(f"[blue]🔧 Preparing local LLM for {step_name}[/blue]")
+    _WARM.acquire(cfg)
     try:
         yield
     finally:
-        if manage_server and started:
-            stop_local_llm_server()
+        _WARM.release(settings[1])
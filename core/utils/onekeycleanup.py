@@ -1,6 +1,8 @@
 import os
 import glob
 from core._1_ytdlp import find_video_files
+from core.utils.gpt_cache import get_gpt_cache
+from core.utils.llm_metrics import LLM_METRICS
 import shutil
 
 def cleanup(history_dir="history"):
@@ -23,11 +25,13 @@ def cleanup(history_dir="history"):
         if not file.endswith(('log', 'gpt_log')):
             move_file(file, video_history_dir)
 
-    # Move log files
+    # Move log files, the LLM metrics of this video go with them
     for file in glob.glob("output/log/*"):
         move_file(file, log_dir)
+    LLM_METRICS.reset()
 
-    # Move gpt_log files
+    # Move gpt_log files, release the response cache db first
+    get_gpt_cache().close()
     for file in glob.glob("output/gpt_log/*"):
         move_file(file, gpt_log_dir)
 
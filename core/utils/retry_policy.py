@@ -0,0 +1,207 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from rich import print as rprint
+
+from core.utils.config_utils import load_key
+
+# ------------
+# error classes
+# ------------
+
+# programming and configuration errors, retrying them only delays the traceback
+FATAL_ERRORS = (TypeError, NameError, AttributeError, ImportError, SyntaxError, AssertionError,
+                NotImplementedError, FileNotFoundError, PermissionError)
+
+def _fatal_api_errors():
+    try:
+        import openai
+        # bad key, unknown model, invalid request (e.g. context length), the same call fails again
+        return (openai.AuthenticationError, openai.PermissionDeniedError, openai.NotFoundError,
+                openai.BadRequestError, openai.UnprocessableEntityError)
+    except ImportError:
+        return ()
+
+class CircuitOpenError(RuntimeError):
+    """The endpoint has been failing for longer than the breaker is willing to wait."""
+
+def is_retryable(exc):
+    if isinstance(exc, CircuitOpenError):
+        return False
+    return not isinstance(exc, FATAL_ERRORS + _fatal_api_errors())
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+def is_endpoint_failure(exc):
+    """Connection refused, timeouts and 5xx mean the endpoint is down; a 429 only means it is busy."""
+    from core.utils.llm_concurrency import is_overload_error
+    return is_overload_error(exc) and _status_code(exc) != 429
+
+def retry_after_seconds(exc):
+    """Seconds requested by a `Retry-After` (or `retry-after-ms`) response header, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(float(value) / 1000, 0.0)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        if value.strip().isdigit():
+            return float(value)
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+# ------------
+# backoff
+# ------------
+
+def _retry_setting(name, default):
+    try:
+        value = load_key(f"llm_retry.{name}")
+    except KeyError:
+        return default
+    return default if value in (None, '') else value
+
+class RetryPolicy:
+    """Full-jitter exponential backoff: sleep uniform(0, min(max_delay, delay * 2**attempt)).
+
+    A server-provided `Retry-After` wins over the random draw (still capped at `max_delay`),
+    and fatal errors are raised at once instead of being retried.
+    """
+
+    def __init__(self, max_delay=None):
+        self._max_delay = max_delay
+
+    @property
+    def max_delay(self):
+        return self._max_delay if self._max_delay is not None else float(_retry_setting("max_delay", 30))
+
+    def should_retry(self, exc):
+        return is_retryable(exc)
+
+    def backoff(self, attempt, delay, exc=None):
+        retry_after = retry_after_seconds(exc) if exc is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, delay * (2 ** attempt)))
+
+DEFAULT_POLICY = RetryPolicy()
+
+# ------------
+# circuit breaker
+# ------------
+
+class CircuitBreaker:
+    """Shared per-endpoint breaker so every caller pauses together while the endpoint is down.
+
+    closed: requests flow, `threshold` consecutive endpoint failures open the circuit.
+    open: callers wait until the cooldown ends; the cooldown doubles up to 60s on each re-open.
+    half-open: a single probe goes through, the others keep waiting for its outcome.
+    After `give_up` seconds without a success callers get `CircuitOpenError` instead.
+    """
+
+    def __init__(self, name, threshold=5, cooldown=5.0, give_up=300.0):
+        self.name = name
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.give_up = give_up
+        self.state = "closed"
+        self.failures = 0
+        self.cooldown = cooldown
+        self.opened_at = None
+        self.down_since = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def _ready(self):
+        """(seconds to wait or None to proceed, whether the caller is the half-open probe);
+        raises once the outage is too long."""
+        with self._lock:
+            if self.state == "closed":
+                return None, False
+            now = time.monotonic()
+            if self.down_since is not None and now - self.down_since > self.give_up:
+                raise CircuitOpenError(f"{self.name} has been unreachable for {now - self.down_since:.0f}s, giving up")
+            if self.state == "open":
+                remaining = self.opened_at + self.cooldown - now
+                if remaining > 0:
+                    return remaining, False
+                self.state = "half-open"
+            if not self.probing:
+                self.probing = True
+                return None, True
+            return 0.5, False
+
+    def is_open(self):
+        """True while callers would have to wait, without claiming the half-open probe."""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() < self.opened_at + self.cooldown
+            return self.state == "half-open" and self.probing
+
+    async def wait_ready(self):
+        """Wait until a request may go out; True when it goes out as the half-open probe."""
+        while True:
+            remaining, probe = self._ready()
+            if remaining is None:
+                return probe
+            await asyncio.sleep(min(remaining, 1.0))
+
+    def release_probe(self):
+        """Give up the half-open probe without an outcome (the request was cancelled), so another caller takes it."""
+        with self._lock:
+            if self.state == "half-open":
+                self.probing = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                rprint(f"[green]🔌 {self.name} is reachable again, circuit closed[/green]")
+            self.state = "closed"
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self.down_since = None
+            self.probing = False
+
+    def record_failure(self, exc):
+        with self._lock:
+            if not is_endpoint_failure(exc):
+                self.probing = False
+                return
+            now = time.monotonic()
+            self.failures += 1
+            if self.down_since is None:
+                self.down_since = now
+            if self.state == "half-open" or (self.state == "closed" and self.failures >= self.threshold):
+                if self.state == "half-open":
+                    self.cooldown = min(self.cooldown * 2, 60.0)
+                self.state = "open"
+                self.opened_at = now
+                rprint(f"[red]🔌 {self.name} keeps failing ({exc.__class__.__name__}), pausing all requests for {self.cooldown:.0f}s[/red]")
+            self.probing = False
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+def get_breaker(endpoint):
+    """The process-wide breaker of one endpoint (normalized base url)."""
+    with _BREAKERS_LOCK:
+        if endpoint not in _BREAKERS:
+            _BREAKERS[endpoint] = CircuitBreaker(
+                endpoint,
+                threshold=int(_retry_setting("breaker_threshold", 5)),
+                cooldown=float(_retry_setting("breaker_cooldown", 5)),
+                give_up=float(_retry_setting("breaker_give_up", 300)),
+            )
+        return _BREAKERS[endpoint]
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+from collections import deque
+
+# ------------
+# Aho-Corasick automaton
+# ------------
+
+class TermIndex:
+    """Case-insensitive multi-pattern matcher: one pass over a text finds every pattern it contains.
+
+    Same semantics as `pattern.lower() in text.lower()` for each pattern, but the work per text is
+    linear in its length plus the matches, independent of the number of patterns.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        # an empty pattern is contained in every text
+        self._always = []
+        for idx, pattern in enumerate(patterns):
+            pattern = str(pattern).lower()
+            if not pattern:
+                self._always.append(idx)
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(idx)
+        self._link()
+
+    def _link(self):
+        # breadth first, so the failure target of a node is always finished before the node itself
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def count(self, text):
+        """{pattern index: occurrences in `text`} for every pattern found."""
+        goto, fail, out = self._goto, self._fail, self._out
+        counts = dict.fromkeys(self._always, 1)
+        node = 0
+        for ch in str(text).lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for idx in out[node]:
+                counts[idx] = counts.get(idx, 0) + 1
+        return counts
+
+    def find(self, text):
+        """Sorted indices of the patterns found in `text`."""
+        return sorted(self.count(text))
+
+# ------------
+# cached indexes
+# ------------
+
+_FILE_CACHE = {}
+_LAST_TERMS = (None, None)
+_LOCK = threading.Lock()
+
+def load_term_index(path):
+    """(terms, index over their `src`) of a terminology json, rebuilt only when the file changes."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _FILE_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+    with _LOCK:
+        cached = _FILE_CACHE.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'r', encoding='utf-8') as f:
+                terms = json.load(f).get('terms', [])
+            cached = (mtime, terms, TermIndex([term['src'] for term in terms]))
+            _FILE_CACHE[path] = cached
+    return cached[1], cached[2]
+
+def index_for_terms(terms):
+    """Index over the `src` of an in-memory terms list, kept while the same list is passed in."""
+    global _LAST_TERMS
+    last_terms, index = _LAST_TERMS
+    if last_terms is terms:
+        return index
+    index = TermIndex([term['src'] for term in terms])
+    _LAST_TERMS = (terms, index)
+    return index
@@ -0,0 +1,91 @@
+import re
+import threading
+
+import requests
+from rich import print as rprint
+
+from core.utils.config_utils import load_key
+from core.utils.local_llm_server import local_tokenize_url
+
+CACHE_SIZE = 8192
+
+# kana, CJK ideographs, hangul and fullwidth forms cost about a token per character
+_DENSE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+def heuristic_tokens(text):
+    """Token estimate without a tokenizer: one per CJK character, one per ~4 characters otherwise."""
+    dense = len(_DENSE.findall(text))
+    return dense + (len(text) - dense + 3) // 4
+
+# ------------
+# token counter
+# ------------
+
+class TokenCounter:
+    """Counts tokens with the best tokenizer at hand: the local llama.cpp server's own (exact for the
+    served model), tiktoken's cl100k_base, or the heuristic. A source that fails is dropped for the next."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.sources = []
+        tokenize = local_tokenize_url(base_url)
+        if tokenize:
+            self.sources.append(("server", self._server_counter(*tokenize)))
+        try:
+            import tiktoken
+            self.sources.append(("tiktoken", lambda text, enc=tiktoken.get_encoding("cl100k_base"): len(enc.encode(text))))
+        except Exception:
+            pass
+        self.sources.append(("heuristic", heuristic_tokens))
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _server_counter(url, field):
+        session = requests.Session()
+
+        def count(text):
+            resp = session.post(url, json={field: text}, timeout=10)
+            resp.raise_for_status()
+            return len(resp.json()["tokens"])
+        return count
+
+    @property
+    def source(self):
+        return self.sources[0][0]
+
+    def count(self, text):
+        cached = self._cache.get(text)
+        if cached is not None:
+            return cached
+        while True:
+            name, counter = self.sources[0]
+            try:
+                tokens = counter(text)
+                break
+            except Exception as e:
+                if len(self.sources) == 1:
+                    raise
+                with self._lock:
+                    if self.sources and self.sources[0][0] == name:
+                        self.sources.pop(0)
+                rprint(f"[yellow]🔢 {name} tokenizer failed ({e.__class__.__name__}), counting with {self.source}[/yellow]")
+        with self._lock:
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache.clear()
+            self._cache[text] = tokens
+        return tokens
+
+_COUNTERS = {}
+_COUNTERS_LOCK = threading.Lock()
+
+def get_token_counter():
+    """Counter for the configured `api.base_url`, shared by every caller."""
+    base_url = load_key("api.base_url")
+    with _COUNTERS_LOCK:
+        if base_url not in _COUNTERS:
+            _COUNTERS[base_url] = TokenCounter(base_url)
+        return _COUNTERS[base_url]
+
+def count_tokens(text):
+    return get_token_counter().count(text)
@@ -0,0 +1,215 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import hashlib
+import unicodedata
+from difflib import SequenceMatcher
+from threading import Lock
+from rich import print as rprint
+from core.utils.config_utils import load_key
+
+TM_DB = './_model_cache/translation_memory.db'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    src_norm TEXT,
+    target_language TEXT,
+    terms_fp TEXT,
+    length INTEGER,
+    src TEXT,
+    tgt TEXT,
+    hits INTEGER DEFAULT 0,
+    created_at REAL,
+    PRIMARY KEY (src_norm, target_language, terms_fp)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_scope ON entries(target_language, terms_fp, length);
+"""
+
+# ------------
+# settings & keys
+# ------------
+
+def _tm_setting(name, default):
+    try:
+        value = load_key(f"translation_memory.{name}")
+    except KeyError:
+        return default
+    return default if value in (None, '') else value
+
+def normalize_source(text):
+    """Case, width and whitespace differences do not change a translation."""
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    return re.sub(r'\s+', ' ', text).strip()
+
+def terms_fingerprint(text, terms):
+    """Hash of the glossary entries that apply to `text`, so a changed term never reuses an old translation."""
+    if not terms:
+        return ''
+    lowered = str(text).lower()
+    relevant = sorted({(str(t['src']), str(t['tgt'])) for t in terms if str(t['src']).lower() in lowered})
+    if not relevant:
+        return ''
+    return hashlib.sha1(repr(relevant).encode('utf-8')).hexdigest()[:16]
+
+# ------------
+# sqlite store
+# ------------
+
+class TranslationMemory:
+    """Line-level source → translation pairs shared by every video, kept outside `output/`.
+
+    `lookup` only returns an exact match on the normalized source, which is safe to reuse as is.
+    `similar` returns the closest entry of similar length whose similarity reaches `threshold`;
+    a near match can mean the opposite ("I do" / "I don't", "$300" / "$500"), so it is only a hint.
+    """
+
+    def __init__(self, path=TM_DB):
+        self.path = path
+        self._lock = Lock()
+        self._conn = None
+        self.lookups = 0
+        self.exact_hits = 0
+        self.hints = 0
+        self.chunks = 0
+        self.chunks_skipped = 0
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def lookup(self, text, target_language, terms_fp=''):
+        src_norm = normalize_source(text)
+        with self._lock:
+            self.lookups += 1
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT tgt FROM entries WHERE src_norm = ? AND target_language = ? AND terms_fp = ?",
+                (src_norm, target_language, terms_fp),
+            ).fetchone()
+            if row is None:
+                return None
+            self.exact_hits += 1
+            conn.execute("UPDATE entries SET hits = hits + 1 WHERE src_norm = ? AND target_language = ? AND terms_fp = ?",
+                         (src_norm, target_language, terms_fp))
+            return row[0]
+
+    def similar(self, text, target_language, terms_fp='', threshold=0.9):
+        """(source, translation) of the closest entry at or above `threshold`, or None."""
+        src_norm = normalize_source(text)
+        if threshold >= 1.0 or not src_norm:
+            return None
+        with self._lock:
+            conn = self._connect()
+            # ratio() can only reach `threshold` when the lengths are within this band
+            slack = int(2 * len(src_norm) * (1 - threshold) / threshold) + 1
+            candidates = conn.execute(
+                "SELECT src_norm, src, tgt FROM entries WHERE target_language = ? AND terms_fp = ? AND length BETWEEN ? AND ?",
+                (target_language, terms_fp, len(src_norm) - slack, len(src_norm) + slack),
+            ).fetchall()
+            best, best_ratio = None, threshold
+            for candidate, src, tgt in candidates:
+                matcher = SequenceMatcher(None, src_norm, candidate)
+                if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                    continue
+                ratio = matcher.ratio()
+                if ratio >= best_ratio:
+                    best, best_ratio = (src, tgt), ratio
+            if best is None:
+                return None
+            self.hints += 1
+            return best
+
+    def add(self, pairs, target_language):
+        """Store (source, translation, terms_fp) triples, newer translations replace older ones."""
+        rows = [(normalize_source(src), target_language, terms_fp, len(normalize_source(src)), src, tgt, time.time())
+                for src, tgt, terms_fp in pairs if str(src).strip() and str(tgt).strip()]
+        with self._lock:
+            self._connect().executemany(
+                "INSERT OR REPLACE INTO entries (src_norm, target_language, terms_fp, length, src, tgt, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def record_chunk(self, skipped):
+        with self._lock:
+            self.chunks += 1
+            self.chunks_skipped += int(skipped)
+
+    def report(self):
+        """Print the hit ratio since the last report, then start a new tally for the next video."""
+        if self.lookups:
+            rprint(f"[cyan]📚 Translation memory: {self.exact_hits}/{self.lookups} lines hit ({self.exact_hits / self.lookups:.0%}), "
+                   f"{self.hints} similar past translations shown to the LLM, {self.chunks_skipped}/{self.chunks} chunks skipped the LLM[/cyan]")
+        with self._lock:
+            self.lookups = self.exact_hits = self.hints = self.chunks = self.chunks_skipped = 0
+
+    def stats(self):
+        with self._lock:
+            row = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM entries").fetchone()
+        return {"entries": row[0], "total_hits": row[1]}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+_TM = None
+
+def get_translation_memory():
+    """Process-wide memory, or None when `translation_memory.enabled` is off."""
+    global _TM
+    if not _tm_setting("enabled", False):
+        return None
+    if _TM is None:
+        _TM = TranslationMemory(_tm_setting("path", TM_DB))
+    return _TM
+
+# ------------
+# chunk helpers for translate_lines
+# ------------
+
+def recall_chunk(lines, terms=None):
+    """Translations for every line of a chunk, or None when any line has no exact match in the memory."""
+    tm = get_translation_memory()
+    if tm is None:
+        return None
+    target_language = load_key("target_language")
+    translations = [tm.lookup(line, target_language, terms_fingerprint(line, terms)) for line in lines.split('\n')]
+    skipped = all(tgt is not None for tgt in translations)
+    tm.record_chunk(skipped)
+    return '\n'.join(translations) if skipped else None
+
+def similar_translations_prompt(lines, terms=None):
+    """Past translations of lines close to the chunk's (`fuzzy_threshold`), as a prompt hint or None."""
+    tm = get_translation_memory()
+    threshold = float(_tm_setting("fuzzy_threshold", 1.0))
+    if tm is None or threshold >= 1.0:
+        return None
+    target_language = load_key("target_language")
+    hints = []
+    for line in lines.split('\n'):
+        found = tm.similar(line, target_language, terms_fingerprint(line, terms), threshold)
+        if found is not None and found not in hints:
+            hints.append(found)
+    return '\n'.join(f'{i}. "{src}" was translated as "{tgt}"' for i, (src, tgt) in enumerate(hints, 1)) or None
+
+def remember_chunk(lines, translation, terms=None):
+    tm = get_translation_memory()
+    if tm is None:
+        return
+    src_lines, tgt_lines = lines.split('\n'), translation.split('\n')
+    if len(src_lines) != len(tgt_lines):
+        return
+    tm.add([(src, tgt, terms_fingerprint(src, terms)) for src, tgt in zip(src_lines, tgt_lines)], load_key("target_language"))
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'stats':
+        rprint(TranslationMemory(_tm_setting("path", TM_DB)).stats())
+    else:
+        print("Usage: python -m core.utils.translation_memory stats")
@@ -0,0 +1,18 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """Run in a scratch directory holding a copy of config.yaml, so tests never touch the real one."""
+    from core.utils import config_utils
+    shutil.copy(os.path.join(ROOT, "config.yaml"), tmp_path / "config.yaml")
+    monkeypatch.chdir(tmp_path)
+    config_utils.reload_config()
+    yield tmp_path
+    config_utils.reload_config()
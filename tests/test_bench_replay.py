@@ -0,0 +1,99 @@
+import pytest
+
+from bench.llm_stub import StubServer
+from bench.replay import prompt_eval_counts, replay_prefix, replay_schedule, replay_schema, simulate_makespan, stage_contract
+from core.utils.config_utils import config_overlay
+from core.utils.gpt_cache import GPTCache
+
+@pytest.mark.parametrize("payload, expected", [
+    ({"usage": {"prompt_tokens": 900, "prompt_tokens_details": {"cached_tokens": 768}}}, (900, 768, None)),
+    ({"usage": {"prompt_tokens": 900}, "timings": {"cache_n": 700, "prompt_n": 200, "prompt_ms": 410.5}}, (900, 700, 410.5)),
+    ({"usage": {"prompt_tokens": 900}, "timings": {"prompt_n": 150, "prompt_ms": 300.0}}, (900, 750, 300.0)),
+    ({"timings": {"prompt_n": 150, "cache_n": 50}}, (200, 50, None)),
+    ({"usage": {"prompt_tokens": 900}}, (900, None, None)),
+])
+def test_prompt_eval_counts(payload, expected):
+    assert prompt_eval_counts(payload) == expected
+
+def test_replay_prefix_sends_cache_prompt(config):
+    seen = []
+
+    def responder(prompt, request):
+        seen.append(request["cache_prompt"])
+        return "ok"
+
+    prompts = [("translate_faithfulness", "prompt one", "json"), ("translate_faithfulness", "prompt two", "json")]
+    with StubServer(responder=responder, base_latency=0, with_request=True) as stub, \
+            config_overlay({"api.key": "stub", "api.model": "stub"}):
+        totals = replay_prefix(prompts, cache_prompt=True, base_url=stub.base_url)
+    assert seen == [True, True]
+    # the stub reports no cached tokens, like llama-cpp-python
+    assert totals["requests"] == 2 and not totals["reported"]
+
+@pytest.fixture
+def stage_config(config):
+    with config_overlay({"whisper.detected_language": "en", "target_language": "German"}):
+        yield
+
+def test_stage_contract_matches_translate_prompt(stage_config):
+    pytest.importorskip("spacy")
+    from core.prompts import generate_shared_prompt, generate_theme_prompt, get_prompt_faithfulness
+    prompt = get_prompt_faithfulness("one\ntwo\nthree", generate_shared_prompt(None, None, None), generate_theme_prompt("theme"))
+    schema, valid = stage_contract("translate_faithfulness", prompt)
+    assert schema["required"] == ["1", "2", "3"]
+    answer = {str(i): {"origin": "x", "direct": "y"} for i in (1, 2, 3)}
+    assert valid(answer)["status"] == "success"
+    del answer["3"]
+    assert valid(answer)["status"] == "error"
+
+def test_stage_contract_counts_align_parts(stage_config):
+    pytest.importorskip("spacy")
+    from core.prompts import get_align_prompt
+    schema, _ = stage_contract("align_subs", get_align_prompt("a b c", "x y z", "a\nb\nc"))
+    assert schema["properties"]["align"]["minItems"] == 3
+
+def test_summary_is_held_to_its_schema_keys(stage_config):
+    _, valid = stage_contract("summary", "summary prompt")
+    assert valid({"theme": "t", "terms": [{"src": "a", "tgt": "b", "note": "c"}]})["status"] == "success"
+    assert valid({"theme": "t", "terms": [{"src": "a", "tgt": "b"}]})["message"] == "Missing `terms.0.note`"
+    assert stage_contract("None", "sidebar check") is None
+
+def test_replay_schema_counts_validation_retries(config):
+    from core.prompts import get_correct_text_prompt
+    requests_seen = []
+
+    def responder(prompt, request):
+        requests_seen.append(request.get("response_format"))
+        if "broken" in prompt:
+            return '```json\n{"answer": "cut"}\n```'
+        return '```json\n{"text": "clean"}\n```'
+
+    prompts = [("tts_correct_text", get_correct_text_prompt(text), "json") for text in ("fine line", "broken line")]
+    with StubServer(responder=responder, base_latency=0, with_request=True) as stub, \
+            config_overlay({"api.base_url": stub.base_url, "api.key": "stub", "api.endpoints": [], "local_llm.enabled": False,
+                            "llm_retry.max_delay": 0.01, "llm_concurrency.mode": "fixed", "max_workers": 2}):
+        run = replay_schema(prompts, "on")
+    row = run["stages"]["tts_correct_text"]
+    # the broken answer is asked for again by the pipeline's retries until they run out
+    assert row["prompts"] == 2 and row["failed"] == 1
+    assert row["validation_failures"] == row["requests"] - 1 > 1
+    assert all(fmt["type"] == "json_schema" for fmt in requests_seen)
+
+def test_simulate_makespan():
+    durations = [1, 1, 1, 1, 4]
+    assert simulate_makespan(durations, 2) == 6
+    assert simulate_makespan(durations, 2, order=[4, 0, 1, 2, 3]) == 4
+    assert simulate_makespan(durations, 1) == 8
+    assert simulate_makespan([], 4) == 0.0
+
+def test_replay_schedule_puts_the_long_prompt_first(config):
+    db = config / "gpt_log" / "cache.db"
+    cache = GPTCache(str(db))
+    for i in range(4):
+        cache.put("m", f"short {i}", "ok", "json", {}, log_title="align_subs")
+    cache.put("m", "long " * 400, "ok", "json", {}, log_title="align_subs")
+    cache.close()
+    stage = replay_schedule(str(db), workers=2)["align_subs"]
+    assert stage["requests"] == 5
+    assert stage["longest_first"] < stage["recorded_order"]
+    assert stage["longest_first"] >= stage["lower_bound"]
@@ -0,0 +1,96 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.utils import config_utils
+from core.utils.config_utils import config_overlay, load_key, run_in_context, update_key
+
+def test_snapshot_is_parsed_once(config, monkeypatch):
+    reads = []
+    read_config = config_utils._read_config
+    monkeypatch.setattr(config_utils, "_read_config", lambda: reads.append(1) or read_config())
+    first = load_key("max_workers")
+    for _ in range(50):
+        assert load_key("max_workers") == first
+    assert len(reads) == 1
+
+def test_snapshot_follows_file_edits(config):
+    assert load_key("target_language") != "Klingon"
+    path = config / "config.yaml"
+    text = path.read_text(encoding="utf-8")
+    path.write_text(text.replace(f"target_language: '{load_key('target_language')}'", "target_language: 'Klingon'"), encoding="utf-8")
+    stat = os.stat(path)
+    # a same-second rewrite of equal size is still a new file signature
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert load_key("target_language") == "Klingon"
+
+def test_update_key_writes_through(config):
+    update_key("max_workers", 7)
+    assert load_key("max_workers") == 7
+    config_utils.reload_config()
+    assert load_key("max_workers") == 7
+    with pytest.raises(KeyError):
+        update_key("no_such_key", 1)
+
+def test_containers_are_copies(config):
+    languages = load_key("language_split_with_space")
+    languages.append("xx")
+    assert "xx" not in load_key("language_split_with_space")
+    assert type(load_key("subtitle")) is dict
+
+def test_overlay_overrides_and_nests(config):
+    base = load_key("max_workers")
+    with config_overlay({"max_workers": base + 1}):
+        assert load_key("max_workers") == base + 1
+        with config_overlay({"target_language": "German"}):
+            assert load_key("max_workers") == base + 1
+            assert load_key("target_language") == "German"
+        assert load_key("target_language") != "German"
+    assert load_key("max_workers") == base
+
+def test_overlay_merges_dotted_keys_into_sections(config):
+    subtitle = load_key("subtitle")
+    with config_overlay({"subtitle.max_length": 5}):
+        assert load_key("subtitle") == dict(subtitle, max_length=5)
+    with config_overlay({"subtitle": {"max_length": 9}}):
+        assert load_key("subtitle.max_length") == 9
+        assert load_key("subtitle.target_multiplier") == subtitle["target_multiplier"]
+
+def test_update_key_inside_overlay_leaves_the_file_alone(config):
+    before = (config / "config.yaml").read_text(encoding="utf-8")
+    with config_overlay() as layer:
+        update_key("max_workers", 42)
+        assert load_key("max_workers") == 42 and layer["max_workers"] == 42
+    assert (config / "config.yaml").read_text(encoding="utf-8") == before
+    assert load_key("max_workers") != 42
+
+def test_update_key_inside_overlay_rejects_unknown_keys(config):
+    with config_overlay({"llm_hedge.extra": 1}) as layer:
+        with pytest.raises(KeyError):
+            update_key("max_worker", 4)
+        with pytest.raises(KeyError):
+            update_key("subtitle.max_lenght", 4)
+        assert update_key("no_such_section.key", 4) is False
+        assert update_key("llm_hedge.extra", 2) and load_key("llm_hedge.extra") == 2
+        assert "max_worker" not in layer and "no_such_section.key" not in layer
+
+def test_overlay_is_per_job(config):
+    seen = {}
+
+    def job(name, value):
+        with config_overlay({"target_language": value}):
+            barrier.wait()
+            seen[name] = load_key("target_language")
+
+    barrier = threading.Barrier(2)
+    threads = [threading.Thread(target=job, args=(n, v)) for n, v in (("a", "German"), ("b", "French"))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen == {"a": "German", "b": "French"}
+    with config_overlay({"target_language": "German"}), ThreadPoolExecutor(1) as pool:
+        assert run_in_context(pool, load_key, "target_language").result() == "German"
+        assert pool.submit(load_key, "target_language").result() != "German"
@@ -0,0 +1,127 @@
+import hashlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from core.utils import gguf_download
+from core.utils.gguf_download import download_file
+
+class BlobServer:
+    """Serves one in-memory blob with HF-style redirect + X-Linked-Etag and Range support.
+
+    `fail_after` bytes into the first `failures` responses the connection is dropped, to exercise resume.
+    `range_mode` 'ignore' answers a range request with the whole blob (200), 'shifted' with a 206 whose
+    bytes start at 0 instead of the requested offset.
+    """
+
+    def __init__(self, blob, fail_after=None, failures=0, range_mode="ok"):
+        self.blob = blob
+        self.sha256 = hashlib.sha256(blob).hexdigest()
+        self.fail_after = fail_after
+        self.failures = failures
+        self.range_mode = range_mode
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/repo/resolve/main/model.gguf"
+
+    def __enter__(self):
+        blob_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _headers(self, status, length, extra=()):
+                self.send_response(status)
+                self.send_header("Content-Length", str(length))
+                self.send_header("Accept-Ranges", "bytes")
+                for key, value in extra:
+                    self.send_header(key, value)
+                self.end_headers()
+
+            def _redirect(self):
+                self.send_response(302)
+                self.send_header("Location", "/cdn/model.gguf")
+                self.send_header("X-Linked-Etag", f'"{blob_server.sha256}"')
+                self.send_header("X-Linked-Size", str(len(blob_server.blob)))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_HEAD(self):
+                if "/resolve/" in self.path:
+                    return self._redirect()
+                self._headers(200, len(blob_server.blob))
+
+            def do_GET(self):
+                if "/resolve/" in self.path:
+                    return self._redirect()
+                blob, status, extra = blob_server.blob, 200, ()
+                match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+                if match and blob_server.range_mode != "ignore":
+                    start, end = int(match.group(1)), int(match.group(2))
+                    if blob_server.range_mode == "shifted":
+                        start, end = 0, end - start
+                    blob, status = blob[start:end + 1], 206
+                    extra = (("Content-Range", f"bytes {start}-{end}/{len(blob_server.blob)}"),)
+                with blob_server._lock:
+                    fail = blob_server.failures > 0 and blob_server.fail_after is not None
+                    if fail:
+                        blob_server.failures -= 1
+                self._headers(status, len(blob), extra)
+                data = blob[:blob_server.fail_after] if fail else blob
+                self.wfile.write(data)
+                with blob_server._lock:
+                    blob_server.bytes_sent += len(data)
+                if fail:
+                    self.close_connection = True
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+SIZE = 3 * 1024 * 1024 + 12345
+
+@pytest.fixture
+def blob(monkeypatch):
+    monkeypatch.setattr(gguf_download, "PIECE_SIZE", 1024 * 1024)
+    return bytes(range(256)) * (SIZE // 256) + b"tail"
+
+def test_interrupted_download_resumes_missing_pieces(tmp_path, blob):
+    dest = tmp_path / "model.gguf"
+    with BlobServer(blob, fail_after=1000, failures=2) as server:
+        with pytest.raises((IOError, requests.RequestException)):
+            download_file(server.url, dest, connections=4)
+        assert not dest.exists()
+        sent_before = server.bytes_sent
+        download_file(server.url, dest, connections=4)
+        resumed = server.bytes_sent - sent_before
+    assert dest.read_bytes() == blob
+    assert not (tmp_path / "model.gguf.part").exists() and not (tmp_path / "model.gguf.part.json").exists()
+    assert resumed < len(blob)
+
+@pytest.mark.parametrize("range_mode", ["ignore", "shifted"])
+def test_wrong_range_restarts_from_zero(tmp_path, blob, range_mode):
+    dest = tmp_path / "model.gguf"
+    with BlobServer(blob, range_mode=range_mode) as server:
+        download_file(server.url, dest, connections=2)
+    assert dest.read_bytes() == blob
+
+def test_sha256_mismatch_removes_the_download(tmp_path, blob):
+    with BlobServer(blob) as server:
+        server.sha256 = "0" * 64
+        with pytest.raises(ValueError, match="sha256 mismatch"):
+            download_file(server.url, tmp_path / "bad.gguf")
+    assert list(tmp_path.iterdir()) == []
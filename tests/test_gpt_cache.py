@@ -0,0 +1,63 @@
+import json
+import os
+
+from core.utils import gpt_cache
+from core.utils.config_utils import config_overlay
+from core.utils.gpt_cache import GPTCache, cache_key
+
+
+def test_cache_key_is_stable_and_covers_every_part():
+    key = cache_key("gpt-4o", "translate this", "json")
+    assert key == cache_key("gpt-4o", "translate this", "json")
+    assert len({
+        key,
+        cache_key("gpt-4o-mini", "translate this", "json"),
+        cache_key("gpt-4o", "translate that", "json"),
+        cache_key("gpt-4o", "translate this", None),
+    }) == 4
+
+def test_cache_key_parts_do_not_run_together():
+    assert cache_key("ab", "c", "json") != cache_key("a", "bc", "json")
+    assert cache_key("m", "json", "x") != cache_key("m", "x", "json")
+
+def test_round_trip(config):
+    cache = GPTCache(str(config / "gpt_log" / "cache.db"))
+    try:
+        assert cache.get("m", "p", "json") is None
+        cache.put("m", "p", '{"a": 1}', "json", {"a": 1}, log_title="summary")
+        assert cache.get("m", "p", "json") == {"a": 1}
+        assert cache.get("m", "p", None) is None
+        cache.put("m", "p", '{"a": 2}', "json", {"a": 2}, log_title="summary")
+        assert cache.get("m", "p", "json") == {"a": 2}
+    finally:
+        cache.close()
+
+def test_expired_and_evicted_entries_miss(config, monkeypatch):
+    cache = GPTCache(str(config / "gpt_log" / "cache.db"))
+    monkeypatch.setattr(gpt_cache, "EVICT_EVERY", 3)
+    try:
+        with config_overlay({"gpt_cache.max_entries": 2}):
+            for i in range(3):
+                cache.put("m", f"p{i}", "", "json", i)
+        assert [cache.get("m", f"p{i}", "json") for i in range(3)] == [None, 1, 2]
+        now = gpt_cache.time.time()
+        monkeypatch.setattr(gpt_cache.time, "time", lambda: now + 2 * 86400)
+        with config_overlay({"gpt_cache.ttl_days": 1}):
+            assert cache.get("m", "p2", "json") is None
+    finally:
+        cache.close()
+
+def test_legacy_json_logs_are_imported_and_replaced_db_reopens(config):
+    folder = config / "gpt_log"
+    folder.mkdir()
+    legacy = [{"model": "m", "prompt": "p", "resp_type": "json", "resp_content": "{}", "resp": {"ok": True}}]
+    (folder / "summary.json").write_text(json.dumps(legacy), encoding="utf-8")
+    cache = GPTCache(str(folder / "cache.db"))
+    try:
+        assert cache.get("m", "p", "json") == {"ok": True}
+        cache.close()
+        os.remove(folder / "cache.db")
+        os.remove(folder / "summary.json")
+        assert cache.get("m", "p", "json") is None
+    finally:
+        cache.close()
@@ -0,0 +1,124 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from core.translate_lines import valid_translate_prefix, valid_translate_result
+from core.utils.ask_gpt import _stream_completion
+from core.utils.json_stream import JSONStreamWatcher, StreamAborted
+
+
+def _feed(text, step=1):
+    watcher = JSONStreamWatcher()
+    events = []
+    for i in range(0, len(text), step):
+        events += watcher.feed(text[i:i + step])
+    return watcher, events
+
+@pytest.mark.parametrize("step", [1, 3, 1000])
+def test_members_and_done_after_the_fence(step):
+    answer = {"1": {"direct": "a"}, "2": {"direct": "b"}, "3": {"direct": "c"}}
+    text = "Sure, here it is:\n```json\n" + json.dumps(answer) + "\n```\nanything else?"
+    watcher, events = _feed(text, step)
+    assert [event for event, _ in events] == ["member", "member", "done"]
+    assert [json.loads(part) for _, part in events] == [
+        {"1": {"direct": "a"}}, {"1": {"direct": "a"}, "2": {"direct": "b"}}, answer]
+    assert watcher.done
+
+def test_brackets_commas_and_escapes_inside_strings():
+    answer = {"1": {"direct": 'he said "{a, b}" \\ [ok], fine'}, "2": ["x", {"y": "}"}]}
+    watcher, events = _feed(json.dumps(answer))
+    assert [event for event, _ in events] == ["member", "done"]
+    assert json.loads(events[0][1]) == {"1": answer["1"]}
+    assert json.loads(events[-1][1]) == answer
+
+def test_top_level_array_and_unfinished_value():
+    _, events = _feed('[{"a": 1}, {"b": 2}]')
+    assert events == [("member", '[{"a": 1}]'), ("done", '[{"a": 1}, {"b": 2}]')]
+    watcher, events = _feed('```json\n{"1": {"direct": "a"}, "2": {"dir')
+    assert events == [("member", '{"1": {"direct": "a"}}')] and not watcher.done
+
+KEYS = ["1", "2", "3"]
+
+@pytest.mark.parametrize("prefix, ok", [
+    ({"1": {"direct": "a"}}, True),
+    # out of order is still a valid final answer
+    ({"2": {"direct": "b"}}, True),
+    ({"3": {"direct": "c"}, "1": {"direct": "a"}}, True),
+    ({"4": {"direct": "d"}}, False),
+    ({"1": {"free": "a"}}, False),
+    ({"1": "a"}, False),
+])
+def test_prefix_only_rejects_what_cannot_pass(prefix, ok):
+    assert (valid_translate_prefix(prefix, KEYS, ["direct"])["status"] == "success") is ok
+
+def test_prefix_agrees_with_the_final_validator_on_shuffled_answers():
+    answer = {"3": {"direct": "c"}, "1": {"direct": "a"}, "2": {"direct": "b"}}
+    assert valid_translate_result(answer, KEYS, ["direct"])["status"] == "success"
+    partial = {}
+    for key, value in answer.items():
+        partial[key] = value
+        assert valid_translate_prefix(partial, KEYS, ["direct"])["status"] == "success"
+
+class _Stream:
+    def __init__(self, deltas):
+        self.deltas = list(deltas)
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.sent == len(self.deltas):
+            raise StopAsyncIteration
+        self.sent += 1
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.deltas[self.sent - 1]))])
+
+    async def close(self):
+        self.closed = True
+
+def _client(stream):
+    async def create(**params):
+        return stream
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+def _stream(text):
+    stream = _Stream(text[i:i + 4] for i in range(0, len(text), 4))
+    valid = lambda r: valid_translate_result(r, KEYS, ["direct"])
+    prefix = lambda r: valid_translate_prefix(r, KEYS, ["direct"])
+    try:
+        return asyncio.run(_stream_completion(_client(stream), {}, "json", valid, prefix)), stream
+    finally:
+        assert stream.closed
+
+def test_stream_stops_after_the_json_closes():
+    text = '```json\n{"2": {"direct": "b"}, "1": {"direct": "a"}, "3": {"direct": "c"}}\n```\nHope this helps!'
+    (content, chunks, _), stream = _stream(text)
+    assert content.startswith("```json") and "Hope" not in content
+    assert stream.sent < len(stream.deltas)
+
+def test_stream_aborts_on_an_unrequested_key():
+    text = '{"1": {"direct": "a"}, "7": {"direct": "x"}, "2": {"direct": "b"}, "3": {"direct": "c"}}'
+    with pytest.raises(StreamAborted, match="Unexpected key"):
+        _stream(text)
+
+def test_streamed_answers_count_cjk_tokens(config, monkeypatch):
+    from core.utils import gpt_cache, llm_router
+    from core.utils.ask_gpt import ask_gpt
+    from core.utils.config_utils import config_overlay
+    from core.utils.llm_metrics import LLM_METRICS
+    from core.utils.token_count import heuristic_tokens
+
+    answer = "这是一个很长的中文字幕翻译结果，每个汉字大约就是一个词元。"
+    monkeypatch.setattr(gpt_cache, "_CACHE", None)
+    monkeypatch.setattr(llm_router.Endpoint, "client", property(lambda self: _client(_Stream([answer[:10], answer[10:]]))))
+    LLM_METRICS.reset()
+    with config_overlay({"api.key": "stub", "api.stream": True, "api.endpoints": [], "local_llm.enabled": False}):
+        assert ask_gpt("翻译这句话", log_title="cjk", use_cache=False) == answer
+    stage = LLM_METRICS.snapshot()["cjk"]
+    assert stage["completion_tokens"] == heuristic_tokens(answer) >= len(answer) - 1
+    assert stage["prompt_tokens"] == heuristic_tokens("翻译这句话") == 5
+    LLM_METRICS.reset()
+    gpt_cache.get_gpt_cache().close()
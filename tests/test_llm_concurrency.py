@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from core.utils import llm_concurrency
+from core.utils.llm_concurrency import AIMDLimiter, is_overload_error, limiter_slot
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_concurrency.time, "monotonic", clock)
+    return clock
+
+def _ok(limiter, clock, seconds=1.0, tokens=10):
+    started = clock.now
+    clock.now += seconds
+    limiter._feedback(started, None, tokens)
+
+def test_healthy_responses_add_about_one_per_round_trip(clock):
+    limiter = AIMDLimiter(initial=2, maximum=4)
+    for _ in range(3):
+        _ok(limiter, clock)
+    assert limiter.level == 3
+    for _ in range(20):
+        _ok(limiter, clock)
+    assert limiter.level == 4
+
+def test_a_burst_of_overload_errors_halves_once(clock):
+    limiter = AIMDLimiter(initial=8)
+    started = clock.now
+    clock.now += 1
+    for _ in range(5):
+        limiter._feedback(started, TimeoutError(), None)
+    assert limiter.level == 4
+    clock.now += 1
+    limiter._feedback(clock.now, ConnectionError(), None)
+    assert limiter.level == 2
+    limiter._feedback(clock.now, ConnectionError(), None)
+    limiter._feedback(clock.now + 1, ConnectionError(), None)
+    assert limiter.level == 1
+
+def test_non_overload_errors_keep_the_level(clock):
+    limiter = AIMDLimiter(initial=8)
+    limiter._feedback(clock.now, ValueError("bad json"), None)
+    assert limiter.level == 8 and not is_overload_error(ValueError())
+
+def test_slow_responses_shrink_the_limit(clock):
+    limiter = AIMDLimiter(initial=10, latency_tolerance=2.0)
+    _ok(limiter, clock, seconds=1.0)
+    level = limiter.level
+    for _ in range(10):
+        _ok(limiter, clock, seconds=20.0)
+    assert limiter.level < level
+
+def test_slots_never_exceed_the_level():
+    async def main():
+        limiter = AIMDLimiter(initial=3, maximum=3, adaptive=False)
+        peak = 0
+
+        async def one():
+            nonlocal peak
+            async with limiter_slot(limiter):
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[one() for _ in range(12)])
+        return peak, limiter.in_flight
+
+    assert asyncio.run(main()) == (3, 0)
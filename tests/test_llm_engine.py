@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from core.utils.config_utils import config_overlay, update_key
+from core.utils.llm_engine import gather_in_order, get_limiter
+
+def test_limiter_follows_max_workers_and_mode(config):
+    with config_overlay({"max_workers": 3, "llm_concurrency.mode": "fixed"}):
+        fixed = get_limiter()
+        assert get_limiter() is fixed
+        assert (fixed.level, fixed.adaptive) == (3, False)
+    with config_overlay({"max_workers": 6, "llm_concurrency.mode": "fixed"}):
+        assert get_limiter().level == 6
+    with config_overlay({"max_workers": 3, "llm_concurrency.mode": "adaptive", "llm_concurrency.max": 12}):
+        adaptive = get_limiter()
+        assert adaptive.adaptive and adaptive.maximum == 12
+    update_key("max_workers", 5)
+    update_key("llm_concurrency.mode", "fixed")
+    assert get_limiter().level == 5
+
+def test_gather_keeps_input_order_but_starts_longest_first():
+    started = []
+
+    async def work(item):
+        started.append(item)
+        await asyncio.sleep(0.001 * (5 - len(item)))
+        return item.upper()
+
+    items = ["a", "bbbb", "cc", "ddd"]
+    assert asyncio.run(gather_in_order(work, items, cost=len)) == ["A", "BBBB", "CC", "DDD"]
+    assert started == ["bbbb", "ddd", "cc", "a"]
+    started.clear()
+    assert asyncio.run(gather_in_order(work, items)) == ["A", "BBBB", "CC", "DDD"]
+    assert started == items
+
+def test_gather_returns_or_raises_exceptions():
+    async def work(item):
+        if item == 2:
+            raise ValueError(item)
+        return item
+
+    done = []
+    results = asyncio.run(gather_in_order(work, [1, 2, 3], on_done=done.append, return_exceptions=True))
+    assert results[0] == 1 and isinstance(results[1], ValueError) and results[2] == 3
+    assert len(done) == 3
+    with pytest.raises(ValueError):
+        asyncio.run(gather_in_order(work, [1, 2, 3]))
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from core.utils.config_utils import config_overlay
+from core.utils.llm_hedge import hedge_delay, run_hedged
+from core.utils.llm_metrics import LLM_METRICS
+
+
+@pytest.fixture
+def hedging(config):
+    LLM_METRICS.reset()
+    for _ in range(10):
+        LLM_METRICS.record_request("stage", 0.01)
+    with config_overlay({"llm_hedge.enabled": True, "llm_hedge.min_delay": 0.05, "llm_hedge.min_samples": 10,
+                         "llm_hedge.max_ratio": 1.0}):
+        yield
+    LLM_METRICS.reset()
+
+def _attempts(*behaviours):
+    """attempt(race) running the given behaviours in call order: (seconds, answer or exception)."""
+    calls = []
+
+    async def attempt(race):
+        n = len(calls)
+        calls.append("started")
+        race.busy.append(f"endpoint {n}")
+        race.sent.set()
+        seconds, outcome = behaviours[n]
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            calls[n] = "cancelled"
+            raise
+        calls[n] = "finished"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return attempt, calls
+
+def _hedge(attempt):
+    async def main():
+        result = await run_hedged(attempt, "stage")
+        await asyncio.sleep(0)
+        return result
+    return asyncio.run(main())
+
+def test_hedge_wins_and_the_slow_original_is_cancelled(hedging):
+    attempt, calls = _attempts((5, "original"), (0.01, "hedge"))
+    assert _hedge(attempt) == "hedge"
+    assert calls == ["cancelled", "finished"]
+    stage = LLM_METRICS.snapshot()["stage"]
+    assert (stage["hedges"], stage["hedge_wins"]) == (1, 1)
+
+def test_original_answering_in_time_sends_no_hedge(hedging):
+    attempt, calls = _attempts((0.01, "original"))
+    assert _hedge(attempt) == "original"
+    assert calls == ["finished"] and LLM_METRICS.snapshot()["stage"]["hedges"] == 0
+
+def test_a_failed_attempt_leaves_the_race_to_the_other(hedging):
+    attempt, calls = _attempts((0.2, "original"), (0.01, ValueError("invalid answer")))
+    assert _hedge(attempt) == "original"
+    assert calls == ["finished", "finished"]
+
+def test_error_only_when_both_fail(hedging):
+    attempt, _ = _attempts((0.2, ConnectionError("original")), (0.01, ValueError("hedge")))
+    with pytest.raises(ValueError, match="hedge"):
+        _hedge(attempt)
+
+def test_no_hedge_without_enough_samples_or_budget(hedging):
+    with config_overlay({"llm_hedge.min_samples": 50}):
+        assert hedge_delay("stage") is None
+        attempt, calls = _attempts((0.2, "original"))
+        assert _hedge(attempt) == "original" and calls == ["finished"]
+    with config_overlay({"llm_hedge.max_ratio": 0.0}):
+        attempt, calls = _attempts((0.2, "original"))
+        assert _hedge(attempt) == "original" and calls == ["finished"]
+    assert hedge_delay("stage") == 0.05
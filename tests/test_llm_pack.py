@@ -0,0 +1,63 @@
+import asyncio
+import re
+
+from core.utils import llm_pack
+from core.utils.llm_pack import pack_requests
+
+
+def _build_prompt(pack):
+    return '\n'.join(f'<item id="{n}">{text}</item>' for n, text in enumerate(pack, 1))
+
+def _valid_item(answer):
+    return {"status": "success" if "result" in answer else "error", "message": ""}
+
+def _run(monkeypatch, items, answer, pack_size, rounds=2, use_cache=True):
+    calls = []
+
+    async def fake_ask(prompt, resp_type=None, valid_def=None, log_title=None, use_cache=True, schema=None):
+        texts = re.findall(r'<item id="\d+">(.*?)</item>', prompt)
+        calls.append((texts, use_cache))
+        return {str(n): answer(text, len(calls)) for n, text in enumerate(texts, 1)}
+
+    async def single(text):
+        calls.append(([text], "single"))
+        return {"result": f"single {text}"}
+
+    monkeypatch.setattr(llm_pack, "ask_gpt_async", fake_ask)
+    results = asyncio.run(pack_requests(items, _build_prompt, _valid_item, "test", single, pack_size=pack_size, rounds=rounds,
+                                       use_cache=use_cache))
+    return results, calls
+
+def test_packs_keep_input_order(monkeypatch):
+    items = [f"line {i}" for i in range(7)]
+    results, calls = _run(monkeypatch, items, lambda text, _: {"result": text.upper()}, pack_size=3)
+    assert results == [{"result": text.upper()} for text in items]
+    assert sorted(len(texts) for texts, _ in calls) == [1, 3, 3]
+
+def test_invalid_answers_are_requeued_then_answered_alone(monkeypatch):
+    items = [f"line {i}" for i in range(6)]
+    # "line 1" never gets a valid packed answer, "line 4" only on the second round
+    def answer(text, call):
+        if text == "line 1" or (text == "line 4" and call <= 2):
+            return {"oops": True}
+        return {"result": text}
+
+    results, calls = _run(monkeypatch, items, answer, pack_size=3)
+    assert [r["result"] for r in results] == ["line 0", "single line 1", "line 2", "line 3", "line 4", "line 5"]
+    requeued = [texts for texts, use_cache in calls if use_cache is False]
+    assert requeued == [["line 1", "line 4"]]
+    assert calls[-1] == (["line 1"], "single")
+
+def test_a_retry_never_replays_cached_packs(monkeypatch):
+    results, calls = _run(monkeypatch, ["a", "b", "c"], lambda text, _: {"result": text}, pack_size=2, use_cache=False)
+    assert [r["result"] for r in results] == ["a", "b", "c"]
+    assert [use_cache for _, use_cache in calls] == [False, False]
+
+def test_pack_size_one_skips_packing(monkeypatch):
+    results, calls = _run(monkeypatch, ["a", "b"], lambda text, _: {"result": text}, pack_size=1)
+    assert results == [{"result": "single a"}, {"result": "single b"}]
+    assert all(use_cache == "single" for _, use_cache in calls)
+
+def test_packed_schema_lists_every_item():
+    schema = llm_pack.get_packed_schema([{"type": "object"}] * 2)
+    assert schema["required"] == ["1", "2"]
@@ -0,0 +1,120 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from bench.llm_stub import StubServer
+from core.utils import gpt_cache
+from core.utils.ask_gpt import ask_gpt
+from core.utils.config_utils import config_overlay
+from core.utils.llm_engine import run_sync
+from core.utils.llm_router import Endpoint, LLMRouter
+
+def _half_open(breaker):
+    breaker.state = "open"
+    breaker.opened_at = time.monotonic() - breaker.cooldown - 1
+    breaker.down_since = time.monotonic()
+
+def test_cancelled_probe_releases_half_open_breaker(config):
+    endpoint = Endpoint("http://probe-cancel.test/v1", "key", max_concurrency=2)
+    breaker = endpoint.breaker
+    _half_open(breaker)
+
+    async def probe(started):
+        async with endpoint.request():
+            started.set()
+            await asyncio.sleep(30)
+
+    async def scenario():
+        started = asyncio.Event()
+        task = asyncio.ensure_future(probe(started))
+        await started.wait()
+        assert breaker.state == "half-open" and breaker.probing
+        assert not endpoint.available
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not breaker.probing
+        assert endpoint.available
+        # the next caller becomes the probe instead of waiting for the give-up timeout
+        assert await asyncio.wait_for(breaker.wait_ready(), 1) is True
+
+    asyncio.run(scenario())
+
+def test_failed_probe_is_recorded_by_the_caller(config):
+    endpoint = Endpoint("http://probe-fail.test/v1", "key", max_concurrency=2)
+    breaker = endpoint.breaker
+    _half_open(breaker)
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            async with endpoint.request():
+                raise ValueError("bad answer")
+        # an ordinary error keeps the probe until the caller records the outcome
+        assert breaker.probing
+        endpoint.record_success()
+        assert breaker.state == "closed" and not breaker.probing
+
+    asyncio.run(scenario())
+
+def _dead_url():
+    # a port nobody listens on: connections are refused at once
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1"
+
+def test_pick_weights_outstanding_requests(config):
+    heavy = Endpoint("http://weight-2.test/v1", "key", weight=2)
+    light = Endpoint("http://weight-1.test/v1", "key", weight=1)
+    router = LLMRouter([heavy, light], health_interval=0)
+
+    async def scenario():
+        picks = []
+        for _ in range(6):
+            endpoint = await router.pick()
+            endpoint.outstanding += 1
+            picks.append(endpoint)
+        return picks
+
+    picks = asyncio.run(scenario())
+    assert picks.count(heavy) == 4 and picks.count(light) == 2
+    assert asyncio.run(router.pick(exclude=[heavy])) is light
+
+def test_fallback_only_while_every_primary_is_down(config):
+    primaries = [Endpoint(f"http://primary-{i}.test/v1", "key") for i in range(2)]
+    backup = Endpoint("http://backup.test/v1", "key", fallback=True)
+    router = LLMRouter(primaries + [backup], health_interval=0)
+    primaries[0].outstanding = 50
+    assert asyncio.run(router.pick()) is primaries[1]
+    primaries[1].healthy = False
+    assert asyncio.run(router.pick()) is primaries[0]
+    primaries[0].healthy = False
+    assert asyncio.run(router.pick()) is backup
+    primaries[1].healthy = True
+    assert asyncio.run(router.pick()) is primaries[1]
+
+def test_unreachable_endpoint_fails_over_without_backoff(config, monkeypatch):
+    monkeypatch.setattr(gpt_cache, "_CACHE", None)
+    dead = _dead_url()
+    with StubServer(responder=lambda prompt: "answer", base_latency=0) as stub, \
+            config_overlay({"api.key": "stub", "api.health_interval": 0, "local_llm.enabled": False,
+                            "api.endpoints": [{"base_url": dead, "weight": 10}, {"base_url": stub.base_url}]}):
+        started = time.monotonic()
+        assert ask_gpt("failover prompt", log_title="failover", use_cache=False) == "answer"
+        elapsed = time.monotonic() - started
+        assert stub.requests == 1
+    # one refused connection and one answer, the retry decorator never slept
+    assert elapsed < 1.0
+    gpt_cache.get_gpt_cache().close()
+
+def test_health_checks_restore_endpoints(config):
+    with StubServer(base_latency=0) as stub:
+        live = Endpoint(stub.base_url, "key")
+        dead = Endpoint(_dead_url(), "key")
+        router = LLMRouter([live, dead], health_interval=0)
+        live.healthy = False
+        run_sync(router.check_health())
+        assert live.healthy and not dead.healthy
+        assert run_sync(router.pick()) is live
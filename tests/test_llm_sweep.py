@@ -0,0 +1,52 @@
+import sqlite3
+
+from core.utils.config_utils import config_overlay
+from core.utils.llm_sweep import recommended_settings
+
+POINT = {"concurrency": 4, "server": {"n_batch": 256}}
+LOCAL = {"api.endpoints": [], "local_llm.enabled": True, "local_llm.manage_server": True}
+
+def test_llama_server_gets_parallel_slots(config):
+    with config_overlay(dict(LOCAL, **{"local_llm.backend": "llama_server", "local_llm.instances": 2})):
+        assert recommended_settings(POINT) == {"local_llm.n_batch": 256, "local_llm.n_parallel": 4}
+
+def test_single_endpoint_gets_max_workers(config):
+    with config_overlay(dict(LOCAL, **{"local_llm.backend": "llama_cpp_python", "local_llm.instances": 1})):
+        assert recommended_settings(POINT) == {"local_llm.n_batch": 256, "max_workers": 4}
+    with config_overlay({"api.endpoints": [], "local_llm.enabled": False}):
+        assert recommended_settings({"concurrency": 3, "server": {}}) == {"max_workers": 3}
+
+def test_llama_cpp_python_pool_runs_one_request_per_instance(config):
+    with config_overlay(dict(LOCAL, **{"local_llm.backend": "llama_cpp_python", "local_llm.instances": 1})):
+        settings = recommended_settings({"concurrency": 4, "server": {"instances": 3}})
+    assert settings == {"local_llm.instances": 3}
+
+def test_configured_endpoints_get_max_concurrency(config):
+    endpoints = [{"base_url": "http://a:8000", "weight": 2}, {"base_url": "http://b:8000", "max_concurrency": 1}]
+    with config_overlay({"api.endpoints": endpoints, "local_llm.enabled": False}):
+        settings = recommended_settings({"concurrency": 6, "server": {}})
+    assert settings == {"api.endpoints": [{"base_url": "http://a:8000", "weight": 2, "max_concurrency": 6},
+                                          {"base_url": "http://b:8000", "max_concurrency": 6}]}
+
+def test_run_point_leaves_the_recorded_run_alone(config, monkeypatch):
+    from core.utils import gpt_cache
+    from bench.llm_stub import StubServer
+    from core.utils.llm_sweep import load_sample_prompts, run_point
+
+    monkeypatch.setattr(gpt_cache, "_CACHE", None)
+    cache = gpt_cache.get_gpt_cache()
+    cache.put("stub", "summarize this", '{"theme": "t"}', "json", {"theme": "t"}, log_title="summary")
+    prompts = load_sample_prompts(gpt_cache.CACHE_DB)
+    with StubServer(responder=lambda prompt: '{"bad": 1}', base_latency=0) as stub, \
+            config_overlay({"api.base_url": stub.base_url, "api.key": "stub", "api.model": "stub", "api.endpoints": [],
+                            "local_llm.enabled": False}):
+        point = run_point(prompts, concurrency=2)
+    assert point["failed"] == 0
+    assert gpt_cache.get_gpt_cache() is cache
+    assert cache.get("stub", "summarize this", "json") == {"theme": "t"}
+    conn = sqlite3.connect(gpt_cache.CACHE_DB)
+    try:
+        assert conn.execute("SELECT log_title, resp_content FROM responses").fetchall() == [("summary", '{"theme": "t"}')]
+    finally:
+        conn.close()
+    cache.close()
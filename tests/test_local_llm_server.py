@@ -0,0 +1,69 @@
+from core.utils import local_llm_server as server
+from core.utils.config_utils import config_overlay, load_key
+
+
+def _flag(cmd, flag):
+    return cmd[cmd.index(flag) + 1] if flag in cmd else None
+
+def test_llama_server_gets_slots_and_per_slot_context(config):
+    with config_overlay({"local_llm.backend": "llama_server", "local_llm.n_parallel": 3, "local_llm.n_ctx": 4096}):
+        cfg = load_key("local_llm")
+        cmd = server._build_server_cmd(cfg, "model.gguf")
+    assert cmd[0] == cfg["llama_server_bin"] and "--cont-batching" in cmd
+    assert _flag(cmd, "--parallel") == "3"
+    assert _flag(cmd, "--ctx-size") == str(3 * 4096)
+    assert _flag(cmd, "--n-gpu-layers") == "999"
+
+def test_llama_cpp_python_decodes_one_request_at_a_time(config):
+    with config_overlay({"local_llm.backend": "llama_cpp_python", "local_llm.n_parallel": 4}):
+        cfg = load_key("local_llm")
+        cmd = server._build_server_cmd(cfg, "model.gguf")
+    assert cmd[1:3] == ["-m", "llama_cpp.server"] and "--parallel" not in cmd
+    assert server._parallel_slots(cfg) == 1
+
+def test_managed_server_reports_its_slots(config):
+    with config_overlay({"local_llm.backend": "llama_server", "local_llm.n_parallel": 4}):
+        assert server.local_server_endpoints("http://127.0.0.1:8000/v1") == [("http://127.0.0.1:8000", 4)]
+        assert server.local_server_endpoints("https://api.example.com/v1") is None
+        assert server.local_tokenize_url("http://127.0.0.1:8000") == ("http://127.0.0.1:8000/tokenize", "content")
+
+def test_instances_listen_on_consecutive_ports(config):
+    with config_overlay({"local_llm.backend": "llama_cpp_python", "local_llm.instances": 3}):
+        cfg = load_key("local_llm")
+        assert server.local_server_endpoints("http://127.0.0.1:8001/v1") == [
+            (f"http://127.0.0.1:{8000 + i}", 1) for i in range(3)]
+        assert str(server._instance_log_path(cfg, 2)).endswith("local_llm_server.8002.log")
+
+def test_cpu_partitions_are_disjoint(config, monkeypatch):
+    monkeypatch.setattr(server.os, "sched_getaffinity", lambda pid: set(range(10)), raising=False)
+    monkeypatch.setattr(server.os, "sched_setaffinity", lambda pid, cores: None, raising=False)
+    with config_overlay({"local_llm.instances": 3}):
+        assert server._cpu_partitions(load_key("local_llm")) == [[0, 1, 2], [3, 4, 5], [6, 7, 8]]
+    with config_overlay({"local_llm.instances": 3, "local_llm.cpu_affinity": False}):
+        assert server._cpu_partitions(load_key("local_llm")) == [None] * 3
+    with config_overlay({"local_llm.instances": 12}):
+        assert server._cpu_partitions(load_key("local_llm")) == [None] * 12
+
+def test_stage_report_includes_connection_reuse(config, monkeypatch):
+    import json
+
+    from bench.llm_stub import StubServer
+    from core.utils import gpt_cache
+    from core.utils.ask_gpt import ask_gpt
+    from core.utils.llm_metrics import LLM_METRICS
+
+    monkeypatch.setattr(gpt_cache, "_CACHE", None)
+    LLM_METRICS.reset()
+    with StubServer(responder=lambda prompt: "ok", base_latency=0) as stub, \
+            config_overlay({"api.base_url": stub.base_url, "api.key": "stub", "api.endpoints": [], "local_llm.enabled": False}):
+        with server.local_llm_server("test"):
+            for i in range(3):
+                ask_gpt(f"prompt {i}", log_title="reuse", use_cache=False)
+        base_url = stub.base_url
+    with open(config / "output" / "log" / "llm_metrics.json", encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["stages"]["reuse"]["requests"] == 3
+    connections = report["connections"][base_url]
+    assert connections["requests"] == 3 and connections["connections"] == 1
+    LLM_METRICS.reset()
+    gpt_cache.get_gpt_cache().close()
@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import pytest
+
+from core.utils import retry_policy
+from core.utils.retry_policy import CircuitBreaker, CircuitOpenError, RetryPolicy, is_endpoint_failure, is_retryable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry_policy.time, "monotonic", clock)
+    return clock
+
+def _status_error(status, headers=None):
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+def _open(breaker):
+    for _ in range(breaker.threshold):
+        breaker.record_failure(ConnectionError())
+    assert breaker.state == "open"
+
+def test_consecutive_failures_open_the_circuit(clock):
+    breaker = CircuitBreaker("llm", threshold=3, cooldown=5)
+    breaker.record_failure(ConnectionError())
+    breaker.record_failure(_status_error(503))
+    assert breaker.state == "closed" and breaker._ready() == (None, False)
+    breaker.record_failure(TimeoutError())
+    assert breaker.state == "open" and breaker.is_open()
+    assert breaker._ready() == (5, False)
+
+def test_busy_and_bad_requests_do_not_count(clock):
+    breaker = CircuitBreaker("llm", threshold=1)
+    for exc in (_status_error(429), _status_error(400), ValueError("bad json")):
+        assert not is_endpoint_failure(exc)
+        breaker.record_failure(exc)
+    assert breaker.state == "closed"
+
+def test_half_open_lets_a_single_probe_through(clock):
+    breaker = CircuitBreaker("llm", threshold=1, cooldown=5)
+    _open(breaker)
+    clock.now += 5
+    assert breaker._ready() == (None, True)
+    assert breaker.state == "half-open" and breaker.is_open()
+    assert breaker._ready() == (0.5, False)
+    breaker.release_probe()
+    assert breaker._ready() == (None, True)
+
+def test_failed_probe_reopens_with_doubled_cooldown(clock):
+    breaker = CircuitBreaker("llm", threshold=1, cooldown=5)
+    _open(breaker)
+    for cooldown in (10, 20, 40, 60, 60):
+        clock.now += breaker.cooldown
+        assert breaker._ready() == (None, True)
+        breaker.record_failure(ConnectionError())
+        assert breaker.state == "open" and breaker.cooldown == cooldown and not breaker.probing
+
+def test_successful_probe_closes_and_resets(clock):
+    breaker = CircuitBreaker("llm", threshold=2, cooldown=5)
+    _open(breaker)
+    clock.now += 5
+    breaker._ready()
+    breaker.record_failure(ConnectionError())
+    clock.now += 10
+    assert breaker._ready() == (None, True)
+    breaker.record_success()
+    assert (breaker.state, breaker.failures, breaker.cooldown, breaker.probing) == ("closed", 0, 5, False)
+    breaker.record_failure(ConnectionError())
+    assert breaker.state == "closed"
+
+def test_long_outage_gives_up(clock):
+    breaker = CircuitBreaker("llm", threshold=1, cooldown=5, give_up=30)
+    _open(breaker)
+    clock.now += 31
+    with pytest.raises(CircuitOpenError):
+        breaker._ready()
+    assert not is_retryable(CircuitOpenError("down"))
+
+def test_wait_ready_returns_once_the_cooldown_ends(clock, monkeypatch):
+    breaker = CircuitBreaker("llm", threshold=1, cooldown=3)
+    _open(breaker)
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(retry_policy.asyncio, "sleep", fake_sleep)
+    assert asyncio.run(breaker.wait_ready()) is True
+    assert slept == [1.0, 1.0, 1.0]
+
+def test_backoff_prefers_retry_after(config):
+    policy = RetryPolicy(max_delay=10)
+    assert policy.backoff(0, 1, _status_error(429, {"retry-after": "3"})) == 3
+    assert policy.backoff(0, 1, _status_error(429, {"retry-after-ms": "250"})) == 0.25
+    assert policy.backoff(0, 1, _status_error(429, {"retry-after": "120"})) == 10
+    assert all(0 <= policy.backoff(attempt, 1) <= min(10, 2 ** attempt) for attempt in range(8))
+    assert not policy.should_retry(TypeError()) and policy.should_retry(ConnectionError())
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("spacy")
+
+from core import _5_split_sub
+from core.utils.config_utils import config_overlay
+
+ITEMS = [("Hello there, friend", "Hallo, Freund", "Hello there,\nfriend"),
+         ("Good morning to you", "Guten Morgen", "Good morning\nto you")]
+ANSWERS = [{"align": [{"src_part_1": "Hello there,", "target_part_1": "Hallo,"}, {"src_part_2": "friend", "target_part_2": "Freund"}]},
+           {"align": [{"src_part_1": "Good morning", "target_part_1": None}, {"src_part_2": "to you", "target_part_2": "Morgen"}]}]
+
+@pytest.fixture
+def packed(config, monkeypatch):
+    async def fake_pack_requests(items, *args, **kwargs):
+        return ANSWERS
+    monkeypatch.setattr(_5_split_sub, "pack_requests", fake_pack_requests)
+    monkeypatch.setattr(_5_split_sub, "get_pack_size", lambda: 2)
+    with config_overlay({"whisper.language": "en"}):
+        yield
+
+def test_bad_packed_answer_is_returned_not_raised(packed):
+    results = asyncio.run(_5_split_sub.align_subs_packed(ITEMS, return_exceptions=True))
+    assert results[0] == (["Hello there,", "friend"], ["Hallo,", "Freund"], "Hallo, Freund")
+    assert isinstance(results[1], AttributeError)
+
+def test_bad_packed_answer_raises_without_return_exceptions(packed):
+    with pytest.raises(AttributeError):
+        asyncio.run(_5_split_sub.align_subs_packed(ITEMS))
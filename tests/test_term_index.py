@@ -0,0 +1,74 @@
+import json
+import os
+import random
+
+import pytest
+
+from core.utils import term_index
+from core.utils.term_index import TermIndex, index_for_terms, load_term_index
+
+
+def _naive_count(patterns, text):
+    text = text.lower()
+    counts = {}
+    for idx, pattern in enumerate(patterns):
+        pattern = pattern.lower()
+        if not pattern:
+            counts[idx] = 1
+            continue
+        n = sum(text.startswith(pattern, i) for i in range(len(text)))
+        if n:
+            counts[idx] = n
+    return counts
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_the_naive_scan(seed):
+    rng = random.Random(seed)
+    alphabet = "abcAB "
+    patterns = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 4))) for _ in range(rng.randint(1, 30))]
+    index = TermIndex(patterns)
+    for _ in range(20):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        assert index.count(text) == _naive_count(patterns, text)
+        assert index.find(text) == sorted(_naive_count(patterns, text))
+
+def test_overlapping_nested_and_repeated_patterns():
+    patterns = ["he", "she", "his", "hers", "", "HE", "she"]
+    index = TermIndex(patterns)
+    assert index.count("ushers") == {0: 1, 1: 1, 3: 1, 4: 1, 5: 1, 6: 1}
+    assert index.count("aaaa") == {4: 1}
+    assert TermIndex(["aa"]).count("aaaa") == {0: 3}
+    assert TermIndex(["Machine Learning"]).find("so MACHINE learning it is") == [0]
+    assert TermIndex(["术语"]).find("这是术语表") == [0]
+
+def test_file_index_is_rebuilt_only_when_the_file_changes(tmp_path, monkeypatch):
+    path = str(tmp_path / "terminology.json")
+
+    def write(srcs):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"theme": "", "terms": [{"src": s, "tgt": s, "note": ""} for s in srcs]}, f)
+
+    builds = []
+
+    class CountingIndex(TermIndex):
+        def __init__(self, patterns):
+            builds.append(list(patterns))
+            super().__init__(patterns)
+
+    monkeypatch.setattr(term_index, "TermIndex", CountingIndex)
+    monkeypatch.setattr(term_index, "_FILE_CACHE", {})
+    write(["Alpha"])
+    terms, index = load_term_index(path)
+    assert load_term_index(path)[1] is index and len(builds) == 1
+    write(["Alpha", "Beta"])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    terms, index = load_term_index(path)
+    assert [t["src"] for t in terms] == ["Alpha", "Beta"] and index.find("beta") == [1]
+    assert len(builds) == 2
+
+def test_in_memory_index_follows_the_list():
+    terms = [{"src": "Alpha"}]
+    index = index_for_terms(terms)
+    assert index_for_terms(terms) is index
+    assert index_for_terms([{"src": "Beta"}]).find("beta") == [0]
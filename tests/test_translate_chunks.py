@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip("autocorrect_py")
+
+from core._4_2_translate import chunk_request_tokens, dedup_sentences, split_chunks_by_tokens
+from core.prompts import generate_theme_prompt
+from core.utils.config_utils import config_overlay
+
+class WordCounter:
+    source = "words"
+
+    def count(self, text):
+        return len(text.split())
+
+@pytest.fixture
+def overlay(config):
+    with config_overlay({"reflect_translate": True, "translation_context.enabled": False,
+                         "whisper.detected_language": "en", "target_language": "German"}):
+        yield
+
+def _sentences():
+    return [f"line {i}" + " word" * (3 + i % 7) for i in range(60)]
+
+def test_chunks_keep_order_and_fit_the_budget(overlay, monkeypatch):
+    monkeypatch.setattr("core._4_2_translate.search_things_to_note_in_prompt", lambda chunk: None)
+    sentences, counter, budget = _sentences(), WordCounter(), 1200
+    chunks = split_chunks_by_tokens(sentences, "theme", budget=budget, max_lines=20, counter=counter)
+    assert '\n'.join(chunks).split('\n') == sentences
+    assert len(chunks) > 1
+    theme_prompt, previous, start = generate_theme_prompt("theme"), None, 0
+    for chunk in chunks:
+        n = len(chunk.split('\n'))
+        assert n <= 20
+        after = sentences[start + n:start + n + 2] or None
+        assert chunk_request_tokens(chunk, previous, after, theme_prompt, counter) <= budget
+        previous, start = chunk.split('\n')[-3:], start + n
+
+def test_bigger_budget_means_fewer_chunks(overlay, monkeypatch):
+    monkeypatch.setattr("core._4_2_translate.search_things_to_note_in_prompt", lambda chunk: None)
+    small = split_chunks_by_tokens(_sentences(), "theme", budget=1200, max_lines=50, counter=WordCounter())
+    large = split_chunks_by_tokens(_sentences(), "theme", budget=4000, max_lines=50, counter=WordCounter())
+    assert len(large) < len(small)
+
+def test_line_over_budget_stays_alone(overlay, monkeypatch):
+    monkeypatch.setattr("core._4_2_translate.search_things_to_note_in_prompt", lambda chunk: None)
+    sentences = ["short one", "huge" + " huge" * 2000, "short two"]
+    chunks = split_chunks_by_tokens(sentences, "theme", budget=1200, counter=WordCounter())
+    assert chunks == sentences
+
+def test_dedup_maps_every_line_to_its_first_occurrence():
+    sentences = ["Hello!", "How are you?", "hello", "Fine.", "HOW ARE YOU", "Hello"]
+    unique, mapping = dedup_sentences(sentences)
+    assert unique == ["Hello!", "How are you?", "Fine."]
+    assert mapping == [0, 1, 0, 2, 1, 0]
+    # fanning the translations back out restores the original order
+    translated = [f"<{s}>" for s in unique]
+    assert [translated[i] for i in mapping] == ["<Hello!>", "<How are you?>", "<Hello!>", "<Fine.>", "<How are you?>", "<Hello!>"]
+
+def test_near_duplicates_fold_only_when_enabled():
+    sentences = ["Thank you so much.", "Thanks you so much.", "Something else entirely."]
+    assert dedup_sentences(sentences)[1] == [0, 1, 2]
+    unique, mapping = dedup_sentences(sentences, near_threshold=0.9)
+    assert unique == ["Thank you so much.", "Something else entirely."]
+    assert mapping == [0, 0, 1]
@@ -0,0 +1,37 @@
+import pytest
+
+from core.utils import translation_memory
+from core.utils.config_utils import config_overlay
+from core.utils.translation_memory import TranslationMemory, recall_chunk, remember_chunk, similar_translations_prompt
+
+@pytest.fixture
+def tm(config, monkeypatch):
+    memory = TranslationMemory(str(config / "tm.db"))
+    monkeypatch.setattr(translation_memory, "_TM", memory)
+    with config_overlay({"translation_memory.enabled": True, "target_language": "German"}):
+        remember_chunk("I don't want to go there\nIt costs $300", "Ich will da nicht hin\nEs kostet 300 $")
+        yield memory
+    memory.close()
+
+def test_exact_recall_ignores_case_and_spacing(tm):
+    assert recall_chunk("i don't  want to go THERE\nIt costs $300") == "Ich will da nicht hin\nEs kostet 300 $"
+
+@pytest.mark.parametrize("threshold", [1.0, 0.8])
+def test_near_match_never_skips_the_llm(tm, threshold):
+    with config_overlay({"translation_memory.fuzzy_threshold": threshold}):
+        assert recall_chunk("I do want to go there") is None
+        assert recall_chunk("It costs $500") is None
+    assert tm.chunks_skipped == 0
+
+def test_near_match_is_only_a_prompt_hint(tm):
+    lines = "I do want to go there\nIt costs $500"
+    with config_overlay({"translation_memory.fuzzy_threshold": 1.0}):
+        assert similar_translations_prompt(lines) is None
+    with config_overlay({"translation_memory.fuzzy_threshold": 0.8}):
+        hint = similar_translations_prompt(lines)
+    assert hint == ('1. "I don\'t want to go there" was translated as "Ich will da nicht hin"\n'
+                    '2. "It costs $300" was translated as "Es kostet 300 $"')
+
+def test_changed_term_translation_misses(tm):
+    terms = [{"src": "costs", "tgt": "kostet", "note": ""}]
+    assert recall_chunk("It costs $300", terms) is None